@@ -1,15 +1,50 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, Response
+from flask import Flask, request, jsonify, render_template, send_file, Response, g
 from flask_cors import CORS
 import mysql.connector
+from mysql.connector import errorcode
 import json
+import gzip
+import logging
+import math
 import os
-from datetime import datetime
-import requests
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+from db_pool import ConnectionPool, PoolError, PoolTimeout
+from image_proxy import DiskCache, ImageProxy, ImageProxyError
+from static_assets import StaticAssets
+import image_pipeline
+import menu_bulk
+from menu_cache import MenuCache
+from cart_cache import CartCache, LocalCartBackend, RedisCartBackend
+from passwords import HasherBusy, PasswordHasher, VerifyCache
+from ratelimit import LocalBuckets, RateLimiter, RedisBuckets
+from tokens import RevocationList, TokenError, TokenSigner
+from jobs import JobQueue
+from order_events import OrderEvents, format_sse
+from queries import run_plan, cart_items_plan, order_history_plan, decode_order_cursor
+import metrics
+import applog
+
 load_dotenv()
 
-app = Flask(__name__, static_folder='static', template_folder='templates')
+applog.configure(level=os.getenv('LOG_LEVEL', 'INFO'), sample_rate=float(os.getenv('LOG_SAMPLE_RATE', '0.1')))
+log = logging.getLogger(__name__)
+
+# Static files go through StaticAssets (fingerprinting, cache headers) instead of Flask's default view
+app = Flask(__name__, static_folder=None, template_folder='templates')
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
 
 CORS(app)  # Enable CORS for all routes
 
@@ -21,21 +56,236 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME')
 }
 
+# Per-process metrics, exposed at /metrics; DB connections are wrapped so every query is timed
+metrics_registry = metrics.Registry()
+db_metrics = metrics.DBMetrics(metrics_registry, slow_query_seconds=float(os.getenv('SLOW_QUERY_MS', '200')) / 1000)
 
+db_pool = ConnectionPool(
+    lambda: db_metrics.instrument(mysql.connector.connect(**DB_CONFIG)),
+    size=int(os.getenv('DB_POOL_SIZE', '5')),
+    max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+)
+
+
+@contextmanager
 def get_db_connection():
+    # Use as `with get_db_connection() as conn:`; the connection goes back to the pool on exit
+    start = time.perf_counter()
+    with db_pool.connection() as conn:
+        stats = metrics.current_request.get()
+        if stats is not None:
+            stats.pool_wait_seconds += time.perf_counter() - start
+        yield conn
+
+
+def db_error_response(err):
+    if isinstance(err, PoolTimeout):
+        log.warning("DB pool exhausted", extra=applog.fields(error=str(err)))
+        return jsonify({"status": "error", "message": "Database busy, please retry"}), 503, {"Retry-After": "1"}
+    log.error("DB connection failed", extra=applog.fields(error=str(err)))
+    return jsonify({"status": "error", "message": "Database connection failed"}), 500
+
+
+# Resized/WebP variants produced by `python image_pipeline.py build`
+image_manifest = image_pipeline.ImageManifest()
+image_build_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def load_menu():
+    with get_db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM menu ORDER BY item_id")
+        items = cursor.fetchall()
+        cursor.close()
+    for item in items:
+        item['images'] = image_manifest.images_for(item.get('image'))
+    return items
+
+
+def rebuild_menu_image(image):
+    # Runs on image_build_executor, off the request thread
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        print("✅ DB connection succeeded")  # Add this
-        return conn
-    except mysql.connector.Error as err:
-        print("❌ DB connection failed:", err)  # Add this
-        return None
+        if image_pipeline.build_one(image):
+            menu_cache.invalidate()
+    except ImportError:
+        log.warning("Pillow not installed; no variants built", extra=applog.fields(image=image))
+    except Exception:
+        log.exception("Image build failed", extra=applog.fields(image=image))
+
+
+def schedule_image_build(image):
+    if not image or os.path.basename(image) != image:
+        return
+    if not image.lower().endswith(image_pipeline.SOURCE_EXTENSIONS):
+        return
+    if os.path.isfile(os.path.join(image_pipeline.SOURCE_DIR, image)):
+        image_build_executor.submit(rebuild_menu_image, image)
+
+
+# Full menu kept in memory; the admin write routes invalidate it
+menu_cache = MenuCache(
+    load_menu,
+    ttl=float(os.getenv('MENU_CACHE_TTL', '300')),
+    version_file=os.getenv('MENU_CACHE_VERSION_FILE'),
+)
+
+request_seconds = metrics_registry.histogram(
+    'http_request_duration_seconds', 'Time to build a response (streamed bodies excluded)',
+    ('method', 'route', 'status'))
+request_db_queries = metrics_registry.histogram(
+    'http_request_db_queries', 'DB statements per request', ('route',), buckets=metrics.COUNT_BUCKETS)
+request_db_seconds = metrics_registry.histogram(
+    'http_request_db_seconds', 'Time in DB statements per request', ('route',))
+
+
+def observe_request(method, route, status, stats):
+    request_seconds.observe(stats.elapsed(), method=method, route=route, status=str(status))
+    request_db_queries.observe(stats.queries, route=route)
+    request_db_seconds.observe(stats.db_seconds, route=route)
+
+
+@app.before_request
+def start_request_metrics():
+    request.environ['metrics.stats'], request.environ['metrics.token'] = metrics.start_request()
+    request.environ['request_id.token'] = applog.request_id.set(
+        applog.new_request_id(request.headers.get('X-Request-ID')))
+
+
+def log_request(method, route, status, stats):
+    # Successful requests are the bulk of traffic, so only a sample of them is logged
+    extra = dict(method=method, route=route, status=status, ms=round(stats.elapsed() * 1000, 1),
+                 db_queries=stats.queries)
+    if status >= 500:
+        log.error("Request failed", extra=applog.fields(**extra))
+    elif status >= 400:
+        log.info("Request rejected", extra=applog.fields(**extra))
+    else:
+        log.info("Request", extra=applog.sampled(**extra))
+
+
+@app.after_request
+def record_request_metrics(response):
+    stats = request.environ.get('metrics.stats')
+    if stats is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(request.method, route, response.status_code, stats)
+        log_request(request.method, route, response.status_code, stats)
+        response.headers['Server-Timing'] = stats.server_timing()
+    response.headers['X-Request-ID'] = applog.request_id.get() or ''
+    return response
+
+
+@app.teardown_request
+def end_request_metrics(exc):
+    token = request.environ.pop('metrics.token', None)
+    if token is not None:
+        metrics.end_request(token)
+    token = request.environ.pop('request_id.token', None)
+    if token is not None:
+        applog.request_id.reset(token)
+
+
+MENU_ENCODINGS = ['br', 'gzip', 'identity'] if brotli else ['gzip', 'identity']
+SEARCH_ENCODINGS = ['gzip', 'identity']
+
+
+MENU_SORTS = ('price', '-price', 'name', '-name')
+
+
+def parse_menu_query(args):
+    """Validated /api/menu filters as a hashable tuple of (name, value) pairs."""
+    def price(name):
+        value = args.get(name)
+        return float(value) if value not in (None, '') else None
+
+    available = args.get('available')
+    if available not in (None, ''):
+        available = available.lower() in ('1', 'true', 'yes')
+    else:
+        available = None
+    sort = args.get('sort') or None
+    if sort and sort not in MENU_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(MENU_SORTS)}")
+    return (
+        ('category', (args.get('category') or 'all').lower()),
+        ('q', ' '.join((args.get('q') or '').lower().split())[:100] or None),
+        ('min_price', price('min_price')),
+        ('max_price', price('max_price')),
+        ('available', available),
+        ('sort', sort),
+    )
+
+
+def menu_json(menu, query):
+    return app.json.dumps({"status": "success", "items": menu.filter(**dict(query))}).encode()
+
+
+def is_category_view(menu, query):
+    # Plain category pages (optionally sorted) are a small, fixed set per menu version
+    filters = dict(query)
+    return (filters['category'] in menu.category_keys and filters['q'] is None
+            and filters['min_price'] is None and filters['max_price'] is None and filters['available'] is None)
 
 
-# Serve static files
+def encoded_menu(menu, query):
+    # Serialized + compressed bodies for a category view, built once per menu version
+    def build():
+        body = menu_json(menu, query)
+        bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=6)}
+        if brotli:
+            bodies['br'] = brotli.compress(body)
+        return bodies
+    return menu.memo(('encoded', query), build, keep=True)
+
+
+def menu_response(menu, query):
+    if is_category_view(menu, query):
+        encoding = request.accept_encodings.best_match(MENU_ENCODINGS, default='identity')
+        body = encoded_menu(menu, query)[encoding]
+    else:
+        # Searches and price filters are open-ended: keep only the JSON (LRU) and compress cheaply per request
+        encoding = request.accept_encodings.best_match(SEARCH_ENCODINGS, default='identity')
+        body = menu.memo(('json', query), lambda: menu_json(menu, query))
+        if encoding == 'gzip':
+            body = gzip.compress(body, compresslevel=1)
+    response = Response(body, mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Let browsers keep the body but revalidate each time; a 304 is a few bytes
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(f"{menu.version}-{encoding}")
+    response.last_modified = menu.loaded_at
+    return response.make_conditional(request)
+
+
+static_assets = StaticAssets(
+    os.path.join(app.root_path, 'static'),
+    immutable_prefixes=('images/menu/variants/',),
+    accel_redirect_prefix=os.getenv('STATIC_ACCEL_REDIRECT_PREFIX'),
+)
+
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    # url_for('static', filename=...) gets ?v=<content hash> so the file can be cached forever
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = static_assets.fingerprint(values['filename'])
+        if version:
+            values['v'] = version
+
+
+@app.route('/static/<path:filename>', endpoint='static')
+def serve_asset(filename):
+    return static_assets.serve(filename)
+
+
+# Serve static files (from the static folder only, never the project root)
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory('.', path)
+    return static_assets.serve(path)
 
 @app.route('/')
 def index():
@@ -46,30 +296,183 @@ def index():
 @app.route('/api/menu', methods=['GET'])
 def get_menu():
     try:
-        category = request.args.get('category', 'all')
+        # category, q (text search), min_price, max_price, available, sort
+        try:
+            query = parse_menu_query(request.args)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": f"Invalid menu filter: {e}"}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        if category and category != 'all':
-            cursor.execute("SELECT * FROM menu WHERE category LIKE %s", (f"%{category}%",))
-        else:
-            cursor.execute("SELECT * FROM menu")
-            
-        menu_items = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        return jsonify({"status": "success", "items": menu_items})
+        return menu_response(menu_cache.get(), query)
     
-    except Exception as e:
-        print(f"Menu fetch error: {str(e)}")
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Menu fetch error")
         return jsonify({"status": "error", "message": "An error occurred while fetching menu"}), 500
 
+# scrypt work factor: n = 2 ** PASSWORD_SCRYPT_LOG2_N; raising it rehashes users on their next login
+password_hasher = PasswordHasher(
+    log2_n=int(os.getenv('PASSWORD_SCRYPT_LOG2_N', '14')),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', '0')) or None,
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', '0')) or None,
+    cache=VerifyCache(ttl=float(os.getenv('PASSWORD_VERIFY_CACHE_TTL', '300'))),
+)
+
+
+def hasher_busy_response():
+    log.warning("Password hashing pool saturated")
+    return jsonify({"status": "error", "message": "Server busy, please retry"}), 503, {"Retry-After": "1"}
+
+
+def make_token_signer():
+    secrets = [s for s in os.getenv('SESSION_SECRETS', '').split(',') if s]
+    if not secrets:
+        # Fine for one process (or gunicorn preload, where workers inherit it); set SESSION_SECRETS otherwise
+        log.warning("SESSION_SECRETS not set; using a random per-process secret")
+        secrets = [os.urandom(32)]
+    return TokenSigner(
+        secrets,
+        ttl=int(os.getenv('SESSION_TTL', str(24 * 3600))),
+        revocations=RevocationList(
+            path=os.getenv('REVOKED_TOKENS_FILE',
+                           os.path.join(tempfile.gettempdir(), 'mirch_masala_revoked_tokens')),
+        ),
+    )
+
+
+session_tokens = make_token_signer()
+
+
+class AuthError(Exception):
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.status = status
+
+
+def authorize(header, owner=None, admin=False):
+    """Claims for a valid ``Authorization: Bearer`` header, else AuthError.
+
+    Non-admin tokens may only act for their own user: ``owner`` is the
+    user_id the request targets, if any.
+    """
+    scheme, _, token = (header or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        raise AuthError("Authentication required")
+    try:
+        claims = session_tokens.verify(token.strip())
+    except TokenError as e:
+        raise AuthError(f"Invalid session: {e}")
+    is_admin = claims.get('typ') == 'admin'
+    if admin and not is_admin:
+        raise AuthError("Admin access required", 403)
+    if not is_admin and owner is not None and str(owner) != str(claims['sub']):
+        raise AuthError("Not allowed for this user", 403)
+    return claims
+
+
+def request_auth_header(query_token=False):
+    # EventSource can't send headers, so stream routes also take ?access_token=
+    header = request.headers.get('Authorization')
+    if not header and query_token and request.args.get('access_token'):
+        header = f"Bearer {request.args['access_token']}"
+    return header
+
+
+def require_auth(admin=False, query_token=False):
+    """Route decorator: checks the session token against a user_id in the path or JSON body."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            owner = kwargs.get('user_id')
+            # Admin tokens act for anyone, so admin routes don't need the body (or consume its stream)
+            if owner is None and not admin and request.is_json:
+                body = request.get_json(silent=True)
+                owner = body.get('user_id') if isinstance(body, dict) else None
+            try:
+                g.session = authorize(request_auth_header(query_token), owner, admin)
+            except AuthError as e:
+                return jsonify({"status": "error", "message": str(e)}), e.status
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def make_rate_limit_backend():
+    # Set RATE_LIMIT_REDIS_URL to share limits between workers; otherwise each process counts separately
+    redis_url = os.getenv('RATE_LIMIT_REDIS_URL')
+    if not redis_url:
+        return LocalBuckets(max_keys=int(os.getenv('RATE_LIMIT_MAX_CLIENTS', '100000')))
+    import redis
+    # Short timeout: when Redis is slow the limiter lets requests through rather than stalling them
+    return RedisBuckets(redis.Redis.from_url(redis_url, socket_timeout=0.25, socket_connect_timeout=0.25))
+
+
+# Per client, as "<count>/<seconds>[:<burst>]"; override with e.g. RATE_LIMIT_LOGIN=5/60, or "off"
+RATE_LIMITS = {
+    'login': '10/60',
+    'signup': '5/300',
+    'orders': '30/60',
+    'image_proxy': '120/60:60',
+}
+
+
+def make_rate_limiter():
+    limiter = RateLimiter(make_rate_limit_backend())
+    for name, default in RATE_LIMITS.items():
+        limiter.configure(name, os.getenv(f'RATE_LIMIT_{name.upper()}', default))
+    return limiter
+
+
+rate_limiter = make_rate_limiter()
+
+# Reverse proxies in front of the app that append to X-Forwarded-For; 0 uses the socket address.
+# Behind nginx (or any proxy) set it, or every client shares the proxy's address and its rate limits.
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+untrusted_proxy_warning = threading.Event()  # set once the warning below has been logged
+
+
+def client_address(remote_addr, forwarded_for=None):
+    # The address our outermost trusted proxy saw; entries left of it are client-supplied and spoofable
+    if forwarded_for and not TRUSTED_PROXY_COUNT and not untrusted_proxy_warning.is_set():
+        untrusted_proxy_warning.set()
+        log.warning("X-Forwarded-For received but TRUSTED_PROXY_COUNT is 0; all clients behind the proxy "
+                    "share its address and rate limits. Set TRUSTED_PROXY_COUNT to the number of proxies",
+                    extra=applog.fields(remote_addr=remote_addr))
+    if TRUSTED_PROXY_COUNT:
+        hops = [hop.strip() for hop in (forwarded_for or '').split(',') if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_COUNT:
+            return hops[-TRUSTED_PROXY_COUNT]
+    return remote_addr or 'unknown'
+
+
+def rate_limited_response(wait):
+    return (jsonify({"status": "error", "message": "Too many requests, please retry later"}), 429,
+            {"Retry-After": str(max(1, math.ceil(wait)))})
+
+
+def rate_limit(name):
+    """Route decorator applying limit ``name`` per client.
+
+    Signed-in clients are counted by user (list it below require_auth), others by address.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            session = g.get('session')
+            if session:
+                client = f"user:{session['sub']}"
+            else:
+                client = f"ip:{client_address(request.remote_addr, request.headers.get('X-Forwarded-For'))}"
+            wait = rate_limiter.check(name, client)
+            if wait:
+                return rate_limited_response(wait)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 @app.route('/api/login', methods=['POST'])
+@rate_limit('login')
 def login():
     try:
         data = request.json
@@ -80,30 +483,51 @@ def login():
         if not email or not password:
             return jsonify({"status": "error", "message": "Email and password are required"}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE email=%s AND password=%s AND user_type=%s", 
-                      (email, password, user_type))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if user:
-            # Don't send password back to client
-            if 'password' in user:
-                user.pop('password')
-            return jsonify({"status": "success", "user": user})
-        else:
+        with get_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM users WHERE email=%s AND user_type=%s", (email, user_type))
+            user = cursor.fetchone()
+            cursor.close()
+
+        # Verified outside the `with`, so no pooled connection is held during the KDF
+        stored = user.pop('password', None) if user else None
+        ok, needs_rehash = password_hasher.verify(password, stored)
+        if not ok:
             return jsonify({"status": "error", "message": "Invalid credentials"}), 401
+
+        if needs_rehash:
+            # Plaintext or old-cost row: upgrade it now that we know the password
+            new_hash = password_hasher.hash(password)
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE users SET password=%s WHERE user_id=%s AND password=%s",
+                               (new_hash, user['user_id'], stored))
+                conn.commit()
+                cursor.close()
+            log.info("Password rehashed", extra=applog.fields(user_id=user['user_id']))
+
+        token, claims = session_tokens.issue(user['user_id'], user.get('user_type', 'customer'))
+        return jsonify({"status": "success", "user": user, "token": token, "expires_at": claims['exp']})
     
-    except Exception as e:
-        print(f"Login error: {str(e)}")
+    except HasherBusy:
+        return hasher_busy_response()
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Login error")
         return jsonify({"status": "error", "message": "An error occurred during login"}), 500
 
+@app.route('/api/logout', methods=['POST'])
+@require_auth()
+def logout():
+    if not session_tokens.revoke(g.session):
+        # Revoked in this worker only; the others would still accept the token until it expires
+        log.error("Logout not shared with other workers", extra=applog.fields(user_id=g.session['sub']))
+        return jsonify({"status": "error", "message": "Could not log out, please retry"}), 503
+    return jsonify({"status": "success", "message": "Logged out"})
+
 @app.route('/api/signup', methods=['POST'])
+@rate_limit('signup')
 def signup():
     try:
         data = request.json
@@ -112,42 +536,59 @@ def signup():
         phone = data.get('phone')
         password = data.get('password')
         address = data.get('address')
-        user_type = data.get('userType', 'customer')
         
         if not all([name, email, phone, password, address]):
             return jsonify({"status": "error", "message": "All fields are required"}), 400
+
+        password_hash = password_hasher.hash(password)
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        # Check if email already exists
-        cursor.execute("SELECT * FROM users WHERE email=%s", (email,))
-        if cursor.fetchone():
-            cursor.close()
-            conn.close()
-            return jsonify({"status": "error", "message": "Email already registered"}), 409
+            # Check if email already exists
+            cursor.execute("SELECT * FROM users WHERE email=%s", (email,))
+            if cursor.fetchone():
+                cursor.close()
+                return jsonify({"status": "error", "message": "Email already registered"}), 409
         
-        # Insert new user
-        cursor.execute("""
-            INSERT INTO users (name, email, phone_number, password, address, user_type) 
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (name, email, phone, password, address, user_type))
+            # Self sign-up always makes a customer; admins are promoted out of band
+            # (UPDATE users SET user_type = 'admin' WHERE email = ...)
+            cursor.execute("""
+                INSERT INTO users (name, email, phone_number, password, address, user_type) 
+                VALUES (%s, %s, %s, %s, %s, 'customer')
+            """, (name, email, phone, password_hash, address))
         
-        user_id = cursor.lastrowid
-        conn.commit()
-        cursor.close()
-        conn.close()
+            user_id = cursor.lastrowid
+            conn.commit()
+            cursor.close()
         
-        return jsonify({"status": "success", "message": "Registration successful", "user_id": user_id})
+            return jsonify({"status": "success", "message": "Registration successful", "user_id": user_id})
     
-    except Exception as e:
-        print(f"Signup error: {str(e)}")
+    except HasherBusy:
+        return hasher_busy_response()
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Signup error")
         return jsonify({"status": "error", "message": "An error occurred during registration"}), 500
 
+image_proxy_service = ImageProxy(
+    DiskCache(
+        os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.image_cache')),
+        max_bytes=int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+    ),
+    allowed_hosts=[h.strip() for h in os.getenv('IMAGE_PROXY_ALLOWED_HOSTS', '').split(',') if h.strip()],
+    connect_timeout=float(os.getenv('IMAGE_PROXY_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('IMAGE_PROXY_READ_TIMEOUT', '10')),
+    max_bytes=int(os.getenv('IMAGE_PROXY_MAX_BYTES', str(5 * 1024 * 1024))),
+    # Each upstream fetch holds a worker thread until the body is sent; keep some for everything else
+    max_in_flight=int(os.getenv('IMAGE_PROXY_MAX_IN_FLIGHT', str(max(int(os.getenv('WEB_THREADS', '4')) // 2, 1)))),
+)
+IMAGE_CACHE_MAX_AGE = int(os.getenv('IMAGE_CACHE_MAX_AGE', '86400'))
+
+
 @app.route('/api/image-proxy')
+@rate_limit('image_proxy')
 def image_proxy():
     # Get the external image URL from the query parameter
     url = request.args.get('url')
@@ -155,22 +596,107 @@ def image_proxy():
         return 'Image URL not provided', 400
 
     try:
-        # Fetch the image from the external URL
-        response = requests.get(url, stream=True)
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+        image_proxy_service.check_url(url)
+
+        # Served from the on-disk cache when we've fetched this URL before
+        cached = image_proxy_service.cached(url)
+        if cached:
+            path, content_type = cached
+            return send_file(path, mimetype=content_type, max_age=IMAGE_CACHE_MAX_AGE, conditional=True)
+
+        chunks, content_type = image_proxy_service.fetch(url)
+        response = Response(chunks, content_type=content_type)
+        # Frees the fetch slot even if the client disconnects before the body starts
+        response.call_on_close(image_proxy_service.end_fetch)
+        response.cache_control.public = True
+        response.cache_control.max_age = IMAGE_CACHE_MAX_AGE
+        return response
+
+    except ImageProxyError as e:
+        log.warning("Image proxy failed", extra=applog.fields(status=e.status, error=str(e)))
+        headers = {"Retry-After": "1"} if e.status == 503 else {}
+        return str(e) if e.status < 500 else 'Failed to fetch image', e.status, headers
+
+
+def load_cart(user_id):
+    with get_db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cart_items = run_plan(cart_items_plan(user_id), cursor)
+        cursor.close()
+    return cart_items
+
+
+def make_cart_backend():
+    # Set CART_CACHE_REDIS_URL to share carts between workers; otherwise each process keeps its own
+    redis_url = os.getenv('CART_CACHE_REDIS_URL')
+    if not redis_url:
+        return LocalCartBackend(max_users=int(os.getenv('CART_CACHE_MAX_USERS', '10000')))
+    import redis
+    return RedisCartBackend(redis.Redis.from_url(redis_url), ttl=int(os.getenv('CART_CACHE_TTL', '3600')))
+
+
+cart_cache = CartCache(load_cart, menu_version=lambda: menu_cache.get().version, backend=make_cart_backend())
+
+
+# One round trip per add, race-free under concurrent clicks thanks to the unique
+# (user_id, item_id) key; LAST_INSERT_ID(cart_id) makes lastrowid the row's id on both paths
+CART_UPSERT_SQL = """
+    INSERT INTO cart (user_id, item_id, quantity) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE cart_id = LAST_INSERT_ID(cart_id), quantity = quantity + VALUES(quantity)
+"""
+MAX_CART_BATCH = 100
+
+# Whether cart has the unique (user_id, item_id) key the upsert needs (migrations/0002); None until checked
+cart_unique_key = None
+
+
+def has_cart_unique_key(cursor):
+    global cart_unique_key
+    if cart_unique_key is None:
+        cursor.execute("SHOW INDEX FROM cart")
+        keys = {}
+        for row in cursor.fetchall():  # Table, Non_unique, Key_name, Seq_in_index, Column_name, ...
+            if not int(row[1]):
+                keys.setdefault(row[2], set()).add(row[4])
+        cart_unique_key = {'user_id', 'item_id'} in keys.values()
+        if not cart_unique_key:
+            log.warning("cart has no unique (user_id, item_id) key; adding lines with locking reads "
+                        "until `python migrate.py up` adds it")
+    return cart_unique_key
+
+
+def add_cart_lines(cursor, user_id, quantities):
+    """Add ``{item_id: quantity}`` to the user's cart lines (caller commits); returns ``{item_id: cart_id}``."""
+    if has_cart_unique_key(cursor):
+        if len(quantities) == 1:
+            item_id, quantity = next(iter(quantities.items()))
+            cursor.execute(CART_UPSERT_SQL, (user_id, item_id, quantity))
+            return {item_id: cursor.lastrowid}
+        cursor.executemany(CART_UPSERT_SQL, [(user_id, item_id, quantity)
+                                             for item_id, quantity in quantities.items()])
+        # lastrowid only covers the last row of a batch
+        placeholders = ', '.join(['%s'] * len(quantities))
+        cursor.execute(f"SELECT item_id, cart_id FROM cart WHERE user_id = %s AND item_id IN ({placeholders})",
+                       (user_id, *quantities))
+        return dict(cursor.fetchall())
+    # Without the key the upsert would insert a duplicate row on every add, so find existing lines first
+    cart_ids = {}
+    for item_id, quantity in quantities.items():
+        cursor.execute("SELECT cart_id FROM cart WHERE user_id = %s AND item_id = %s FOR UPDATE",
+                       (user_id, item_id))
+        row = cursor.fetchone()
+        if row:
+            cart_ids[item_id] = row[0]
+            cursor.execute("UPDATE cart SET quantity = quantity + %s WHERE cart_id = %s", (quantity, row[0]))
+        else:
+            cursor.execute("INSERT INTO cart (user_id, item_id, quantity) VALUES (%s, %s, %s)",
+                           (user_id, item_id, quantity))
+            cart_ids[item_id] = cursor.lastrowid
+    return cart_ids
 
-        # Get the content type of the image (e.g., 'image/jpeg')
-        content_type = response.headers['content-type']
-        
-        # Stream the image content back to the user's browser
-        return Response(response.iter_content(chunk_size=1024), content_type=content_type)
-    
-    except requests.exceptions.RequestException as e:
-        # If the request fails, return an error
-        print(f"Error proxying image: {e}")
-        return 'Failed to fetch image', 500
 
 @app.route('/api/cart', methods=['POST'])
+@require_auth()
 def add_to_cart():
     try:
         data = request.json
@@ -180,72 +706,102 @@ def add_to_cart():
         
         if not user_id or not item_id:
             return jsonify({"status": "error", "message": "User ID and Item ID are required"}), 400
+        user_id, item_id, quantity = int(user_id), int(item_id), int(quantity)
+        if quantity <= 0:
+            return jsonify({"status": "error", "message": "Quantity must be positive"}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor()
-        
-        # Check if item already in cart
-        cursor.execute("SELECT * FROM cart WHERE user_id=%s AND item_id=%s", (user_id, item_id))
-        existing_item = cursor.fetchone()
-        
-        if existing_item:
-            # Update quantity
-            cursor.execute("UPDATE cart SET quantity=quantity+%s WHERE user_id=%s AND item_id=%s", 
-                          (quantity, user_id, item_id))
-        else:
-            # Add new item to cart
-            cursor.execute("INSERT INTO cart (user_id, item_id, quantity) VALUES (%s, %s, %s)", 
-                          (user_id, item_id, quantity))
+        # Write-through: the cached cart is patched once the row is committed instead of reloaded
+        with cart_cache.write(user_id) as cart_write, get_db_connection() as conn:
+            cursor = conn.cursor()
+            cart_ids = add_cart_lines(cursor, user_id, {item_id: quantity})
+            conn.commit()
+            cursor.close()
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            menu_item = menu_cache.get().by_id.get(item_id)
+            if menu_item:
+                cart_write.add(menu_item, quantity, cart_ids[item_id])
+            else:
+                cart_write.clear()
+        log.info("Cart item added", extra=applog.sampled(user_id=user_id, item_id=item_id, quantity=quantity))
         
         return jsonify({"status": "success", "message": "Item added to cart"})
     
-    except Exception as e:
-        print(f"Add to cart error: {str(e)}")
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Add to cart error")
         return jsonify({"status": "error", "message": "An error occurred while adding to cart"}), 500
 
-@app.route('/api/cart/<int:user_id>', methods=['GET'])
-def get_cart(user_id):
+@app.route('/api/cart/batch', methods=['POST'])
+@require_auth()
+def add_to_cart_batch():
+    # Sync several lines at once: {"user_id", "items": [{"item_id", "quantity"}], "replace": bool}
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
+        data = request.json
+        user_id = data.get('user_id')
+        lines = data.get('items') or []
+        replace = bool(data.get('replace', False))
         
-        cursor = conn.cursor(dictionary=True)
+        if not user_id or not isinstance(lines, list) or (not lines and not replace):
+            return jsonify({"status": "error", "message": "User ID and items are required"}), 400
+        if len(lines) > MAX_CART_BATCH:
+            return jsonify({"status": "error", "message": f"At most {MAX_CART_BATCH} items per batch"}), 400
+        user_id = int(user_id)
         
-        # Get cart items with details
-        cursor.execute("""
-            SELECT c.cart_id, c.item_id, m.item_name as name, m.description, m.category, m.price, c.quantity, 
-                   (m.price * c.quantity) as subtotal
-            FROM cart c
-            JOIN menu m ON c.item_id = m.item_id
-            WHERE c.user_id = %s
-        """, (user_id,))
-        
-        cart_items = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        # Merge repeated item_ids so each row is upserted once
+        quantities = {}
+        for line in lines:
+            item_id, quantity = int(line['item_id']), int(line.get('quantity', 1))
+            if quantity <= 0:
+                return jsonify({"status": "error", "message": "Quantities must be positive"}), 400
+            quantities[item_id] = quantities.get(item_id, 0) + quantity
         
-        # Calculate total
-        total = sum(item['subtotal'] for item in cart_items)
+        with cart_cache.write(user_id) as cart_write, get_db_connection() as conn:
+            cursor = conn.cursor()
+            if replace:
+                cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
+            cart_ids = add_cart_lines(cursor, user_id, quantities) if quantities else {}
+            conn.commit()
+            cursor.close()
+        
+            menu = menu_cache.get()
+            if replace or any(item_id not in menu.by_id for item_id in quantities):
+                cart_write.clear()
+            else:
+                for item_id, quantity in quantities.items():
+                    cart_write.add(menu.by_id[item_id], quantity, cart_ids[item_id])
+        
+        return jsonify({"status": "success", "message": "Cart updated", "items": len(quantities)})
+    
+    except PoolError as e:
+        return db_error_response(e)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Each item needs a numeric item_id and quantity"}), 400
+    except Exception:
+        log.exception("Batch add to cart error")
+        return jsonify({"status": "error", "message": "An error occurred while updating cart"}), 500
+
+@app.route('/api/cart/<int:user_id>', methods=['GET'])
+@require_auth()
+def get_cart(user_id):
+    try:
+        # Items and running total come from the cart cache; the DB is only read on a miss
+        cart = cart_cache.get(user_id)
         
         return jsonify({
             "status": "success", 
-            "items": cart_items,
-            "total": total
+            "items": cart['items'],
+            "total": cart['total']
         })
     
-    except Exception as e:
-        print(f"Get cart error: {str(e)}")
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Get cart error")
         return jsonify({"status": "error", "message": "An error occurred while fetching cart"}), 500
 
 @app.route('/api/cart/<int:user_id>/update', methods=['POST'])
+@require_auth()
 def update_cart_item(user_id):
     try:
         data = request.json
@@ -254,178 +810,338 @@ def update_cart_item(user_id):
         
         if not item_id or quantity is None:
             return jsonify({"status": "error", "message": "Item ID and quantity are required"}), 400
+        item_id, quantity = int(item_id), int(quantity)
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        if quantity > 0:
-            cursor.execute("UPDATE cart SET quantity=%s WHERE user_id=%s AND item_id=%s", 
-                          (quantity, user_id, item_id))
-        else:
-            cursor.execute("DELETE FROM cart WHERE user_id=%s AND item_id=%s", (user_id, item_id))
+            if quantity > 0:
+                cursor.execute("UPDATE cart SET quantity=%s WHERE user_id=%s AND item_id=%s", 
+                              (quantity, user_id, item_id))
+            else:
+                cursor.execute("DELETE FROM cart WHERE user_id=%s AND item_id=%s", (user_id, item_id))
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
+            # Dropped, not patched: absolute quantities from concurrent requests could land out of order
+            cart_cache.clear(user_id)
         
-        return jsonify({"status": "success", "message": "Cart updated"})
+            return jsonify({"status": "success", "message": "Cart updated"})
     
-    except Exception as e:
-        print(f"Update cart error: {str(e)}")
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Update cart error")
         return jsonify({"status": "error", "message": "An error occurred while updating cart"}), 500
 
+# Map payment method correctly
+PAYMENT_MAP = {
+    'cod': 'Cash on Delivery',
+    'online': 'Online Payment',
+    'upi': 'Online Payment'  # map UPI under Online for now
+}
+
+# Order side effects the customer doesn't wait for; journalled so they survive a crash
+job_queue = JobQueue(
+    path=os.getenv('JOB_JOURNAL'),
+    workers=int(os.getenv('JOB_WORKERS', '2')),
+    max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '8')),
+    synchronous=os.getenv('JOB_JOURNAL_SYNCHRONOUS', 'NORMAL'),
+)
+
+DELIVERY_BASE_MINUTES = int(os.getenv('DELIVERY_BASE_MINUTES', '30'))
+DELIVERY_MINUTES_PER_ITEM = int(os.getenv('DELIVERY_MINUTES_PER_ITEM', '2'))
+
+
+def delivery_estimate(order_date, quantity):
+    return order_date + timedelta(minutes=DELIVERY_BASE_MINUTES + DELIVERY_MINUTES_PER_ITEM * min(quantity, 20))
+
+
+@job_queue.handler('order_placed')
+def order_placed_job(payload):
+    # Activity log entry; nothing reads it back, so a schema without the table skips it
+    order_id = payload['order_id']
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT log_id FROM logs WHERE order_id = %s AND action = %s",
+                           (order_id, 'Placed an order'))
+        except mysql.connector.ProgrammingError as e:
+            if e.errno != errorcode.ER_NO_SUCH_TABLE:
+                raise
+            # Schema older than migrations/0003 (run `python migrate.py up`)
+            log.warning("logs table missing; skipping activity log", extra=applog.fields(order_id=order_id))
+            cursor.close()
+            return
+        if cursor.fetchall():
+            cursor.close()
+            return
+        cursor.execute("""
+            INSERT INTO logs (user_id, action, order_id, timestamp)
+            VALUES (%s, %s, %s, %s)
+        """, (payload['user_id'], 'Placed an order', order_id, datetime.fromisoformat(payload['order_date'])))
+        conn.commit()
+        cursor.close()
+
+
 @app.route('/api/orders', methods=['POST'])
+@require_auth()
+@rate_limit('orders')
 def place_order():
     try:
         data = request.json
-        print("📥 Received order payload:", data)
 
         user_id = data.get('user_id')
         delivery_address = data.get('deliveryAddress')
         payment_method = data.get('paymentMethod')
+        # Clients send the same key when retrying, so a retry can't create a second order
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotencyKey')
 
         if not all([user_id, delivery_address, payment_method]):
             return jsonify({"status": "error", "message": "All fields are required"}), 400
+        if idempotency_key and len(idempotency_key) > 64:
+            return jsonify({"status": "error", "message": "Idempotency key is too long"}), 400
 
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
+        with get_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        cursor = conn.cursor(dictionary=True)
+            if idempotency_key:
+                # The unique (user_id, idempotency_key) row is committed with the order;
+                # a concurrent retry blocks here until the first attempt finishes.
+                try:
+                    cursor.execute("""
+                        INSERT INTO order_requests (user_id, idempotency_key, created_at)
+                        VALUES (%s, %s, %s)
+                    """, (user_id, idempotency_key, datetime.now()))
+                except mysql.connector.ProgrammingError as e:
+                    if e.errno != errorcode.ER_NO_SUCH_TABLE:
+                        raise
+                    # Schema older than migrations/0001 (run `python migrate.py up`): no replay protection
+                    log.warning("order_requests table missing; ignoring idempotency key")
+                    idempotency_key = None
+                except mysql.connector.IntegrityError:
+                    conn.rollback()
+                    cursor.execute("""
+                        SELECT order_id FROM order_requests
+                        WHERE user_id = %s AND idempotency_key = %s
+                    """, (user_id, idempotency_key))
+                    original = cursor.fetchone()
+                    cursor.close()
+                    log.info("Order replayed", extra=applog.fields(order_id=original['order_id'], user_id=user_id))
+                    return jsonify({"status": "success", "message": "Order already placed",
+                                    "order_id": original['order_id'], "replayed": True})
 
-        # Fetch cart
-        cursor.execute("""
-            SELECT c.item_id, m.price, c.quantity, (m.price * c.quantity) as subtotal
-            FROM cart c
-            JOIN menu m ON c.item_id = m.item_id
-            WHERE c.user_id = %s
-        """, (user_id,))
-        cart_items = cursor.fetchall()
-
-        if not cart_items:
-            cursor.close()
-            conn.close()
-            return jsonify({"status": "error", "message": "Cart is empty"}), 400
+            # Lock the cart rows so a double submit waits and then finds the cart empty
+            cursor.execute("SELECT item_id, quantity FROM cart WHERE user_id = %s FOR UPDATE", (user_id,))
+            cart_items = cursor.fetchall()
 
-        total_price = sum(item['subtotal'] for item in cart_items)
+            if not cart_items:
+                cursor.close()
+                return jsonify({"status": "error", "message": "Cart is empty"}), 400
 
-        # Map payment method correctly
-        payment_map = {
-            'cod': 'Cash on Delivery',
-            'online': 'Online Payment',
-            'upi': 'Online Payment'  # map UPI under Online for now
-}
-        payment_method_db = payment_map.get(payment_method.lower(), 'Cash on Delivery')
+            # Prices read separately so the menu rows are not locked by every checkout
+            placeholders = ', '.join(['%s'] * len(cart_items))
+            cursor.execute(f"SELECT item_id, price FROM menu WHERE item_id IN ({placeholders})",
+                           tuple(item['item_id'] for item in cart_items))
+            prices = {row['item_id']: row['price'] for row in cursor.fetchall()}
+            cart_items = [item for item in cart_items if item['item_id'] in prices]
+            if not cart_items:
+                cursor.close()
+                return jsonify({"status": "error", "message": "Cart is empty"}), 400
+            for item in cart_items:
+                item['subtotal'] = prices[item['item_id']] * item['quantity']
 
-        transaction_status = 'pending' if payment_method == 'cod' else 'successful'
+            total_price = sum(item['subtotal'] for item in cart_items)
 
-        # Insert into orders
-        cursor.execute("""
-            INSERT INTO orders (user_id, order_date, total_price, payment_mode, status)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (user_id, datetime.now(), total_price, payment_method_db, 'pending'))
-        order_id = cursor.lastrowid
+            payment_method_db = PAYMENT_MAP.get(payment_method.lower(), 'Cash on Delivery')
+
+            transaction_status = 'pending' if payment_method == 'cod' else 'successful'
 
-        # Order items
-        for item in cart_items:
+            # Insert into orders
+            now = datetime.now()
             cursor.execute("""
+                INSERT INTO orders (user_id, order_date, total_price, payment_mode, status)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (user_id, now, total_price, payment_method_db, 'pending'))
+            order_id = cursor.lastrowid
+
+            # Order items, sent as one multi-row INSERT
+            cursor.executemany("""
                 INSERT INTO order_items (order_id, item_id, quantity, subtotal)
                 VALUES (%s, %s, %s, %s)
-            """, (order_id, item['item_id'], item['quantity'], item['subtotal']))
+            """, [(order_id, item['item_id'], item['quantity'], item['subtotal']) for item in cart_items])
 
-        # Payment record
-        cursor.execute("""
-            INSERT INTO payments (order_id, amount, payment_method, transaction_status)
-            VALUES (%s, %s, %s, %s)
-        """, (order_id, total_price, payment_method_db, transaction_status))
+            # Payment record
+            cursor.execute("""
+                INSERT INTO payments (order_id, amount, payment_method, transaction_status)
+                VALUES (%s, %s, %s, %s)
+            """, (order_id, total_price, payment_method_db, transaction_status))
 
-        # Delivery
-        cursor.execute("""
-            INSERT INTO delivery_info (order_id, delivery_address, delivery_status, estimated_time)
-            VALUES (%s, %s, %s, %s)
-        """, (order_id, delivery_address, 'pending', datetime.now()))
+            # Delivery row, committed with the order: it holds the address
+            cursor.execute("""
+                INSERT INTO delivery_info (order_id, delivery_address, delivery_status, estimated_time)
+                VALUES (%s, %s, %s, %s)
+            """, (order_id, delivery_address, 'pending',
+                  delivery_estimate(now, sum(item['quantity'] for item in cart_items))))
 
-        # Clear cart
-        cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
+            # Clear cart
+            cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
 
-        # Log
-#        cursor.execute("""
-#           INSERT INTO logs (user_id, action, order_id, timestamp)
-#           VALUES (%s, %s, %s, %s)
-#        """, (user_id, 'Placed an order', order_id, datetime.now()))
+            if idempotency_key:
+                cursor.execute("""
+                    UPDATE order_requests SET order_id = %s
+                    WHERE user_id = %s AND idempotency_key = %s
+                """, (order_id, user_id, idempotency_key))
 
-        print("✅ Order inserted successfully. Cart cleared.")
+            conn.commit()
+            cursor.close()
+            cart_cache.clear(int(user_id))
 
+            # The activity log can wait; it runs in the background once the order is committed
+            try:
+                job_queue.enqueue('order_placed', {
+                    "order_id": order_id, "user_id": user_id, "order_date": now.isoformat(),
+                })
+            except Exception:
+                log.exception("Could not queue order follow-up", extra=applog.fields(order_id=order_id))
+            order_events.publish({"order_id": order_id, "user_id": int(user_id), "status": 'pending',
+                                  "updated_at": now.isoformat()})
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+            log.info("Order placed", extra=applog.fields(order_id=order_id, user_id=user_id, items=len(cart_items),
+                                                         total=total_price, payment_method=payment_method_db))
 
-        return jsonify({"status": "success", "message": "Order placed successfully", "order_id": order_id})
+            return jsonify({"status": "success", "message": "Order placed successfully", "order_id": order_id})
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Place order error")
         return jsonify({"status": "error", "message": "An error occurred while placing order"}), 500
 
 
+ORDER_PAGE_SIZE = 20
+MAX_ORDER_PAGE_SIZE = 100
+
+
 @app.route('/api/orders/<int:user_id>', methods=['GET'])
+@require_auth()
 def get_orders(user_id):
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get orders
-        cursor.execute("""
-            SELECT order_id, order_date, total_price, payment_mode, status
-            FROM orders
-            WHERE user_id = %s
-            ORDER BY order_date DESC
-        """, (user_id,))
-        
-        orders = cursor.fetchall()
-        
-        # Get order items for each order
-        for order in orders:
-            cursor.execute("""
-                SELECT oi.item_id, m.item_name, oi.quantity, oi.subtotal
-                FROM order_items oi
-                JOIN menu m ON oi.item_id = m.item_id
-                WHERE oi.order_id = %s
-            """, (order['order_id'],))
-            
-            order['items'] = cursor.fetchall()
-            
-            # Get payment info
-            cursor.execute("""
-                SELECT payment_method, transaction_status
-                FROM payments
-                WHERE order_id = %s
-            """, (order['order_id'],))
-            
-            payment = cursor.fetchone()
-            if payment:
-                order['payment'] = payment
-        
-        cursor.close()
-        conn.close()
+        limit = min(max(request.args.get('limit', ORDER_PAGE_SIZE, type=int), 1), MAX_ORDER_PAGE_SIZE)
+        page_cursor = request.args.get('cursor')
+        try:
+            before = decode_order_cursor(page_cursor) if page_cursor else None
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid cursor"}), 400
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            orders, next_cursor = run_plan(order_history_plan(user_id, limit, before), cursor)
+            cursor.close()
         
-        return jsonify({"status": "success", "orders": orders})
+            return jsonify({"status": "success", "orders": orders, "next_cursor": next_cursor})
     
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Place order error: {str(e)}")
-        return jsonify({"status": "error", "message": "An error occurred while placing order"}), 500
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Get orders error")
+        return jsonify({"status": "error", "message": "An error occurred while fetching orders"}), 500
+
+
+ORDER_STATUSES = ('pending', 'preparing', 'out_for_delivery', 'delivered', 'cancelled')
+
+# Status changes pushed to open streams; the file relays them between worker processes
+order_events = OrderEvents(
+    path=os.getenv('ORDER_EVENTS_FILE', os.path.join(tempfile.gettempdir(), 'mirch_masala_order_events')),
+    max_queued=int(os.getenv('ORDER_STREAM_BUFFER', '100')),
+)
+ORDER_STREAM_HEARTBEAT = float(os.getenv('ORDER_STREAM_HEARTBEAT', '15'))
+# Streams are reopened by the browser after this, so threads aren't held forever
+ORDER_STREAM_MAX_SECONDS = float(os.getenv('ORDER_STREAM_MAX_SECONDS', '300'))
+# Each open stream holds a server thread in WSGI mode; keep some threads for normal requests
+order_stream_slots = threading.BoundedSemaphore(
+    int(os.getenv('ORDER_STREAM_MAX_OPEN', str(max(int(os.getenv('WEB_THREADS', '4')) // 2, 1)))))
+
+
+def order_event_stream(user_id):
+    """Server-Sent Events response with status changes for user_id's orders (None: all orders)."""
+    if not order_stream_slots.acquire(blocking=False):
+        return jsonify({"status": "error", "message": "Too many open streams, please retry"}), 503, \
+            {"Retry-After": "5"}
+    wakeup = threading.Event()
+    subscription = order_events.subscribe(user_id, notify=wakeup.set)
+
+    def generate():
+        yield "retry: 3000\n\n"
+        deadline = time.monotonic() + ORDER_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            wakeup.wait(ORDER_STREAM_HEARTBEAT)
+            wakeup.clear()
+            events = subscription.drain()
+            if subscription.overflowed:
+                # Fell behind; the client refetches its orders and reconnects
+                yield format_sse('reset', {"reason": "buffer overflow"})
+                return
+            for event in events:
+                yield format_sse('order_status', event)
+            if not events:
+                yield ": ping\n\n"
+
+    def close():
+        # Runs when the server closes the response, even if the body was never started
+        order_events.unsubscribe(subscription)
+        order_stream_slots.release()
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(close)
+    return response
+
+
+@app.route('/api/orders/<int:user_id>/events', methods=['GET'])
+@require_auth(query_token=True)
+def stream_user_orders(user_id):
+    return order_event_stream(user_id)
+
+
+@app.route('/api/admin/orders/events', methods=['GET'])
+@require_auth(admin=True, query_token=True)
+def stream_all_orders():
+    return order_event_stream(None)
+
+
+@app.route('/api/admin/orders/<int:order_id>/status', methods=['PUT'])
+@require_auth(admin=True)
+def update_order_status(order_id):
+    try:
+        status = (request.get_json(silent=True) or {}).get('status')
+        if status not in ORDER_STATUSES:
+            return jsonify({"status": "error", "message": f"Status must be one of {', '.join(ORDER_STATUSES)}"}), 400
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT user_id FROM orders WHERE order_id = %s", (order_id,))
+            order = cursor.fetchone()
+            if not order:
+                cursor.close()
+                return jsonify({"status": "error", "message": "Order not found"}), 404
+            cursor.execute("UPDATE orders SET status = %s WHERE order_id = %s", (status, order_id))
+            conn.commit()
+            cursor.close()
+
+        order_events.publish({"order_id": order_id, "user_id": order['user_id'], "status": status,
+                              "updated_at": datetime.now().isoformat()})
+        return jsonify({"status": "success", "message": "Order status updated"})
+
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Update order status error")
+        return jsonify({"status": "error", "message": "An error occurred while updating order status"}), 500
 
 
 @app.route('/api/admin/menu', methods=['POST'])
+@require_auth(admin=True)
 def add_menu_item():
     try:
         data = request.json
@@ -437,77 +1153,72 @@ def add_menu_item():
         if not all([item_name, description, category, price]):
             return jsonify({"status": "error", "message": "All fields are required"}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            INSERT INTO menu (item_name, description, category, price, availability) 
-            VALUES (%s, %s, %s, %s, %s)
-        """, (item_name, description, category, price, True))
+            cursor.execute("""
+                INSERT INTO menu (item_name, description, category, price, availability) 
+                VALUES (%s, %s, %s, %s, %s)
+            """, (item_name, description, category, price, True))
         
-        item_id = cursor.lastrowid
-        conn.commit()
-        cursor.close()
-        conn.close()
+            item_id = cursor.lastrowid
+            conn.commit()
+            cursor.close()
+            menu_cache.invalidate()
         
-        return jsonify({
-            "status": "success", 
-            "message": "Menu item added successfully", 
-            "item_id": item_id
-        })
+            return jsonify({
+                "status": "success", 
+                "message": "Menu item added successfully", 
+                "item_id": item_id
+            })
     
-    except Exception as e:
-        print(f"Add menu item error: {str(e)}")
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Add menu item error")
         return jsonify({"status": "error", "message": "An error occurred while adding menu item"}), 500
 
 @app.route('/api/admin/menu/<int:item_id>', methods=['DELETE'])
+@require_auth(admin=True)
 def delete_menu_item(item_id):
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor = conn.cursor()
+            cursor.execute("DELETE FROM menu WHERE item_id = %s", (item_id,))
         
-        cursor.execute("DELETE FROM menu WHERE item_id = %s", (item_id,))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
+            menu_cache.invalidate()
         
-        return jsonify({
-            "status": "success", 
-            "message": "Menu item deleted successfully"
-        })
+            return jsonify({
+                "status": "success", 
+                "message": "Menu item deleted successfully"
+            })
     
-    except Exception as e:
-        print(f"Delete menu item error: {str(e)}")
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Delete menu item error")
         return jsonify({"status": "error", "message": "An error occurred while deleting menu item"}), 500
 
 @app.route('/api/admin/menu/<int:item_id>', methods=['GET'])
+@require_auth(admin=True)
 def get_menu_item(item_id):
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM menu WHERE item_id = %s", (item_id,))
-        item = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        item = menu_cache.get().by_id.get(item_id)
         
         if item:
             return jsonify({"status": "success", "item": item})
         else:
             return jsonify({"status": "error", "message": "Item not found"}), 404
+    except PoolError as e:
+        return db_error_response(e)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/api/admin/menu/<int:item_id>', methods=['PUT'])
+@require_auth(admin=True)
 def update_menu_item(item_id):
     try:
         data = request.json
@@ -517,50 +1228,198 @@ def update_menu_item(item_id):
         price = data.get('price')
         image = data.get('image')
 
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE menu 
-            SET item_name = %s, description = %s, category = %s, price = %s, image = %s
-            WHERE item_id = %s
-        """, (item_name, description, category, price, image, item_id))
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE menu 
+                SET item_name = %s, description = %s, category = %s, price = %s, image = %s
+                WHERE item_id = %s
+            """, (item_name, description, category, price, image, item_id))
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
+            menu_cache.invalidate()
+            schedule_image_build(image)
 
-        return jsonify({"status": "success", "message": "Menu item updated successfully"})
+            return jsonify({"status": "success", "message": "Menu item updated successfully"})
+    except PoolError as e:
+        return db_error_response(e)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+
+MENU_IMPORT_MAX_ROWS = int(os.getenv('MENU_IMPORT_MAX_ROWS', '50000'))
+MENU_IMPORT_BATCH_ROWS = int(os.getenv('MENU_IMPORT_BATCH_ROWS', '500'))
+MENU_IMPORT_MAX_ERRORS = 50
+
+# New items (item_id NULL) get an auto id; rows with an id update that item in place
+MENU_UPSERT_SQL = """
+    INSERT INTO menu (item_id, item_name, description, category, price, availability, image)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE item_name = VALUES(item_name), description = VALUES(description),
+        category = VALUES(category), price = VALUES(price), availability = VALUES(availability),
+        image = VALUES(image)
+"""
+
+
+def menu_bulk_format(default='csv'):
+    fmt = request.args.get('format')
+    if not fmt:
+        mimetype = request.mimetype or ''
+        fmt = 'json' if 'json' in mimetype else 'csv' if 'csv' in mimetype else default
+    return fmt if fmt in ('csv', 'json') else None
+
+
+@app.route('/api/admin/menu/import', methods=['POST'])
+@require_auth(admin=True)
+def import_menu():
+    fmt = menu_bulk_format(default=None)
+    if not fmt:
+        return jsonify({"status": "error", "message": "Send text/csv or application/json, or ?format=csv|json"}), 400
+
+    # Parse and validate the whole upload before taking a DB connection, so a slow
+    # client never holds a pooled connection (or row locks) while it uploads
+    rows, errors = [], []
+    try:
+        parse = menu_bulk.parse_csv if fmt == 'csv' else menu_bulk.parse_json
+        for number, raw in enumerate(parse(request.stream), 1):
+            if number > MENU_IMPORT_MAX_ROWS:
+                return jsonify({"status": "error",
+                                "message": f"At most {MENU_IMPORT_MAX_ROWS} rows per import"}), 413
+            try:
+                row = menu_bulk.clean_row(raw)
+            except ValueError as e:
+                errors.append({"row": number, "error": str(e)})
+                if len(errors) >= MENU_IMPORT_MAX_ERRORS:
+                    break
+                continue
+            if not errors:
+                rows.append(row)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Could not parse {fmt.upper()}: {e}"}), 400
+    if errors:
+        return jsonify({"status": "error", "message": "Nothing imported; fix these rows", "errors": errors}), 400
+    if not rows:
+        return jsonify({"status": "error", "message": "No rows to import"}), 400
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            # One transaction, one multi-row upsert per batch
+            for start in range(0, len(rows), MENU_IMPORT_BATCH_ROWS):
+                cursor.executemany(MENU_UPSERT_SQL, rows[start:start + MENU_IMPORT_BATCH_ROWS])
+            conn.commit()
+            cursor.close()
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Menu import error")
+        return jsonify({"status": "error", "message": "An error occurred while importing the menu"}), 500
+
+    menu_cache.invalidate()
+    for image in {row[-1] for row in rows if row[-1]}:
+        schedule_image_build(image)
+    log.info("Menu imported", extra=applog.fields(rows=len(rows), format=fmt))
+    return jsonify({"status": "success", "message": f"Imported {len(rows)} menu items", "rows": len(rows)})
+
+
+@app.route('/api/admin/menu/export', methods=['GET'])
+@require_auth(admin=True)
+def export_menu():
+    fmt = menu_bulk_format(default='csv')
+    if not fmt:
+        return jsonify({"status": "error", "message": "format must be csv or json"}), 400
+    try:
+        items = menu_cache.get().items
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Menu export error")
+        return jsonify({"status": "error", "message": "An error occurred while exporting the menu"}), 500
+
+    body = menu_bulk.export_csv(items) if fmt == 'csv' else menu_bulk.export_json(items)
+    return Response(body, mimetype='text/csv' if fmt == 'csv' else 'application/json',
+                    headers={"Content-Disposition": f"attachment; filename=menu.{fmt}"})
+
+
+def cache_counts(attr):
+    return {"menu": getattr(menu_cache, attr), "cart": getattr(cart_cache, attr),
+            "image": getattr(image_proxy_service.cache, attr), "password": getattr(password_hasher.cache, attr)}
+
+
+def cache_hit_ratios():
+    hits, misses = cache_counts('hits'), cache_counts('misses')
+    return {name: hits[name] / (hits[name] + misses[name]) for name in hits if hits[name] + misses[name]}
+
+
+def pool_stat(key):
+    return lambda: db_pool.stats()[key]
+
+
+metrics_registry.gauge('db_pool_connections', 'Pooled DB connections by state',
+                       lambda: {state: db_pool.stats()[state] for state in ('open', 'idle', 'in_use')}, 'state')
+metrics_registry.gauge('db_pool_checkouts_total', 'Connections handed out', pool_stat('checkouts'), type='counter')
+metrics_registry.gauge('db_pool_waits_total', 'Checkouts that had to wait', pool_stat('waits'), type='counter')
+metrics_registry.gauge('db_pool_wait_seconds_total', 'Time spent waiting for a connection',
+                       pool_stat('wait_time_seconds'), type='counter')
+metrics_registry.gauge('db_pool_timeouts_total', 'Checkouts that timed out', pool_stat('timeouts'), type='counter')
+metrics_registry.gauge('cache_hits_total', 'Cache hits', lambda: cache_counts('hits'), 'cache', type='counter')
+metrics_registry.gauge('cache_misses_total', 'Cache misses', lambda: cache_counts('misses'), 'cache', type='counter')
+metrics_registry.gauge('log_records_dropped_total', 'Log records dropped because the log queue was full',
+                       applog.dropped, type='counter')
+metrics_registry.gauge('cache_hit_ratio', 'Hits / lookups since start', cache_hit_ratios, 'cache')
+metrics_registry.gauge('order_event_streams', 'Open order status streams', order_events.subscriber_count)
+metrics_registry.gauge('order_events_published_total', 'Order status events published by this process',
+                       lambda: order_events.published, type='counter')
+metrics_registry.gauge('order_event_stream_overflows_total', 'Streams closed because the client fell behind',
+                       lambda: order_events.overflows, type='counter')
+metrics_registry.gauge('background_jobs', 'Jobs in the journal by state (all processes)', job_queue.counts, 'state')
+metrics_registry.gauge('background_jobs_processed_total', 'Job runs in this process by outcome',
+                       lambda: {"completed": job_queue.completed, "retried": job_queue.retried,
+                                "failed": job_queue.failed}, 'outcome', type='counter')
+metrics_registry.gauge('rate_limited_total', 'Requests refused with 429 by limit',
+                       lambda: dict(rate_limiter.limited), 'limit', type='counter')
+metrics_registry.gauge('rate_limit_backend_errors_total', 'Limit checks let through because the backend failed',
+                       lambda: rate_limiter.errors, type='counter')
+metrics_registry.gauge('image_proxy_fetches_in_flight', 'Upstream image fetches in progress',
+                       lambda: image_proxy_service.in_flight)
+metrics_registry.gauge('image_proxy_rejected_total', 'Image fetches refused because the in-flight cap was reached',
+                       lambda: image_proxy_service.rejected, type='counter')
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/db-pool', methods=['GET'])
+@require_auth(admin=True)
+def get_db_pool_stats():
+    return jsonify({"status": "success", "pool": db_pool.stats()})
+
 @app.route('/api/user/<int:user_id>', methods=['GET'])
+@require_auth()
 def get_user(user_id):
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor(dictionary=True)
+        with get_db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("SELECT user_id, name, email, phone_number, address, user_type FROM users WHERE user_id = %s", (user_id,))
+            cursor.execute("SELECT user_id, name, email, phone_number, address, user_type FROM users WHERE user_id = %s", (user_id,))
         
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+            user = cursor.fetchone()
+            cursor.close()
         
-        if not user:
-            return jsonify({"status": "error", "message": "User not found"}), 404
+            if not user:
+                return jsonify({"status": "error", "message": "User not found"}), 404
         
-        return jsonify({
-            "status": "success", 
-            "user": user
-        })
+            return jsonify({
+                "status": "success", 
+                "user": user
+            })
     
-    except Exception as e:
-        print(f"Get user error: {str(e)}")
+    except PoolError as e:
+        return db_error_response(e)
+    except Exception:
+        log.exception("Get user error")
         return jsonify({"status": "error", "message": "An error occurred while fetching user"}), 500
 '''   
 @app.route('/api/image-proxy')
@@ -577,5 +1436,46 @@ def image_proxy():
         print(f"Error proxying image: {e}")
         return 'Failed to fetch image', 500
 '''
+def warm_up(pool_connections=None):
+    """Load the menu, pre-encode the default menu bodies and open pool connections.
+
+    Under a preloading server (gunicorn preload_app) the menu part runs once
+    in the master and workers inherit it; the pool part, and starting the
+    background job workers, runs per worker.
+    """
+    started = datetime.now()
+    try:
+        menu = menu_cache.get()
+        encoded_menu(menu, parse_menu_query({}))
+        log.info("Menu warmed", extra=applog.fields(items=len(menu.items), version=menu.version))
+    except Exception as e:
+        log.warning("Menu warm-up failed; will load on first request", extra=applog.fields(error=str(e)))
+    if pool_connections:
+        try:
+            opened = db_pool.warm(pool_connections)
+            log.info("DB pool warmed", extra=applog.fields(connections=opened))
+        except PoolError as e:
+            log.warning("DB pool warm-up failed", extra=applog.fields(error=str(e)))
+        job_queue.start()
+    log.info("Warm-up done", extra=applog.fields(seconds=round((datetime.now() - started).total_seconds(), 3)))
+
+
+def create_app(warm=True):
+    """Entry point for WSGI servers (see wsgi.py and gunicorn.conf.py).
+
+    Also starts this process's background job workers, so jobs left in the
+    journal by a crash run without waiting for the next order. Set
+    JOB_AUTOSTART=0 where the process forks workers afterwards (gunicorn's
+    preloading master; its workers start their own in warm_up).
+    """
+    if warm:
+        warm_up()
+    if os.getenv('JOB_AUTOSTART', '1').lower() in ('1', 'true', 'yes'):
+        job_queue.start()
+    return app
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; production runs through gunicorn.conf.py or serve.py
+    create_app().run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')),
+                     debug=os.getenv('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes'))
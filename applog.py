@@ -0,0 +1,183 @@
+"""Structured, non-blocking logging.
+
+Request threads only put records on a bounded in-memory queue; a single
+listener thread formats them as JSON lines and writes them out, so a slow
+stdout or log collector never stalls a request (when the queue is full,
+records are dropped and counted instead). Every record carries the
+current request ID.
+
+Structured fields go in ``extra``::
+
+    log.info("Order placed", extra=applog.fields(order_id=order_id))
+    log.info("Cart item added", extra=applog.sampled(user_id=user_id))
+
+``sampled`` records are kept with probability LOG_SAMPLE_RATE, for
+high-volume success messages. Fields named like personal data (see
+PII_FIELDS) are redacted, as are email addresses and phone numbers in
+message text.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+PII_FIELDS = frozenset({
+    'address', 'deliveryaddress', 'delivery_address', 'email', 'name', 'customername', 'customer_name',
+    'password', 'phone', 'phone_number', 'phonenumber', 'card', 'card_number', 'cvv', 'token',
+})
+REDACTED = '[redacted]'
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+_PHONE_RE = re.compile(r"\+?\d[\d -]{8,}\d")
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+_state = {"handler": None, "listener": None, "sample_rate": 1.0}
+_configure_lock = threading.Lock()
+
+
+def new_request_id(incoming=None):
+    """Use the caller's X-Request-ID when it looks sane, else mint one."""
+    if incoming and _REQUEST_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in PII_FIELDS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return scrub(value)
+    return value
+
+
+def scrub(text):
+    return _PHONE_RE.sub(REDACTED, _EMAIL_RE.sub(REDACTED, text))
+
+
+def fields(**values):
+    return {"fields": values}
+
+
+def sampled(rate=None, **values):
+    return {"fields": values, "sample": _state["sample_rate"] if rate is None else rate}
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the request ID and applies sampling; runs in the calling thread."""
+
+    def filter(self, record):
+        rate = getattr(record, 'sample', None)
+        if rate is not None and random.random() >= rate:
+            return False
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": scrub(record.getMessage()),
+        }
+        rid = getattr(record, 'request_id', None)
+        if rid:
+            entry["request_id"] = rid
+        extra = getattr(record, 'fields', None)
+        if extra:
+            entry.update(redact(extra))
+        if record.exc_text:
+            entry["exc"] = scrub(record.exc_text)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback now (the args may change after we return),
+        # but leave JSON formatting to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _start(level, stream, queue_size):
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    listener.start()
+
+    root = logging.getLogger()
+    if _state["handler"] is not None:
+        root.removeHandler(_state["handler"])
+    root.addHandler(handler)
+    root.setLevel(level)
+    _state["handler"], _state["listener"] = handler, listener
+
+
+def configure(level='INFO', sample_rate=1.0, stream=None, queue_size=10000):
+    """Install the queue handler on the root logger (once per process)."""
+    with _configure_lock:
+        _state["sample_rate"] = sample_rate
+        if _state["listener"] is not None:
+            return
+        for handler in list(logging.getLogger().handlers):
+            logging.getLogger().removeHandler(handler)
+        _start(level, stream, queue_size)
+
+        def restart_in_child():
+            # The listener thread doesn't survive fork (gunicorn preload, multiprocessing)
+            _state["listener"] = None
+            _start(level, stream, queue_size)
+
+        os.register_at_fork(after_in_child=restart_in_child)
+        atexit.register(shutdown)
+
+
+def dropped():
+    handler = _state["handler"]
+    return handler.dropped if handler is not None else 0
+
+
+def shutdown():
+    """Flush queued records; call at exit."""
+    listener = _state["listener"]
+    if listener is not None:
+        _state["listener"] = None
+        try:
+            listener.stop()
+        except queue.Full:
+            pass  # backlogged at exit; the listener is a daemon thread
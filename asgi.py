@@ -0,0 +1,430 @@
+"""ASGI serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+The I/O-bound routes (cart and order-history reads, order status
+streams, the image proxy) run natively on the event loop with aiomysql
+and httpx, so a single process can hold thousands of requests that are
+waiting on MySQL, an upstream image host or the next status change.
+Every other route falls through to the Flask app, which runs in a
+thread pool. Menu and cart caches are shared with the Flask side; a
+menu reload on a cache miss is still a (brief) blocking call.
+"""
+import asyncio
+import logging
+import math
+import os
+import socket
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urljoin, urlsplit
+
+import aiomysql
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as wsgi
+import applog
+import metrics
+from db_pool import PoolTimeout
+from image_proxy import DiskCache, ImageProxyError
+from order_events import format_sse
+from queries import cart_items_plan, decode_order_cursor, order_history_plan
+
+log = logging.getLogger(__name__)
+
+
+async def run_plan_async(plan, cursor):
+    try:
+        query = next(plan)
+        while True:
+            start = time.perf_counter()
+            try:
+                await cursor.execute(*query)
+            finally:
+                wsgi.db_metrics.observe(*query, time.perf_counter() - start)
+            query = plan.send(await cursor.fetchall())
+    except StopIteration as done:
+        return done.value
+
+
+class AsyncDB:
+    """aiomysql pool with the same checkout-timeout behaviour as db_pool."""
+
+    def __init__(self, config, size=20, timeout=5.0, max_lifetime=1800):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pool = None
+
+    async def start(self):
+        self.pool = await aiomysql.create_pool(
+            host=self.config['host'], user=self.config['user'], password=self.config['password'],
+            db=self.config['database'], minsize=1, maxsize=self.size,
+            pool_recycle=int(self.max_lifetime),
+            # Reads only; autocommit avoids holding a stale snapshot on pooled connections
+            autocommit=True,
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+
+    @asynccontextmanager
+    async def cursor(self):
+        try:
+            conn = await asyncio.wait_for(self.pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"no connection available after {self.timeout}s")
+        try:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                yield cursor
+        finally:
+            self.pool.release(conn)
+
+
+db = AsyncDB(
+    wsgi.DB_CONFIG,
+    size=int(os.getenv('ASYNC_DB_POOL_SIZE', '50')),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+)
+http_client = None
+
+
+def json_response(payload, status=200, headers=None):
+    # Flask's JSON provider, so dates and Decimals serialize exactly as in WSGI mode
+    return Response(wsgi.app.json.dumps(payload), status_code=status, headers=headers,
+                    media_type='application/json')
+
+
+def instrumented(endpoint, route):
+    # Same request metrics and Server-Timing header as the Flask hooks; route uses Flask's rule syntax
+    async def wrapper(request):
+        stats, token = metrics.start_request()
+        request_id = applog.request_id.set(applog.new_request_id(request.headers.get('x-request-id')))
+        try:
+            response = await endpoint(request)
+            wsgi.observe_request(request.method, route, response.status_code, stats)
+            wsgi.log_request(request.method, route, response.status_code, stats)
+            response.headers['Server-Timing'] = stats.server_timing()
+            response.headers['X-Request-ID'] = applog.request_id.get()
+            return response
+        finally:
+            applog.request_id.reset(request_id)
+            metrics.end_request(token)
+    return wrapper
+
+
+def error_response(message, status=500):
+    headers = {"Retry-After": "1"} if status == 503 else None
+    return json_response({"status": "error", "message": message}, status, headers)
+
+
+def check_rate_limit(request, name):
+    # Same limits as app.rate_limit, keyed by address (the native routes it guards are anonymous)
+    remote = request.client.host if request.client else None
+    client = f"ip:{wsgi.client_address(remote, request.headers.get('x-forwarded-for'))}"
+    wait = wsgi.rate_limiter.check(name, client)
+    if wait:
+        return json_response({"status": "error", "message": "Too many requests, please retry later"}, 429,
+                             {"Retry-After": str(max(1, math.ceil(wait)))})
+    return None
+
+
+def check_auth(request, user_id=None, admin=False, query_token=False):
+    # Same rules as app.require_auth; returns an error response or None
+    header = request.headers.get('authorization')
+    if not header and query_token and request.query_params.get('access_token'):
+        header = f"Bearer {request.query_params['access_token']}"
+    try:
+        wsgi.authorize(header, user_id, admin)
+    except wsgi.AuthError as e:
+        return error_response(str(e), e.status)
+    return None
+
+
+async def get_cart(request):
+    user_id = request.path_params['user_id']
+    denied = check_auth(request, user_id)
+    if denied:
+        return denied
+    try:
+        cart, version, token = wsgi.cart_cache.lookup(user_id)
+        if cart is None:
+            async with db.cursor() as cursor:
+                items = await run_plan_async(cart_items_plan(user_id), cursor)
+            cart = wsgi.cart_cache.fill(user_id, version, token, items)
+        return json_response({"status": "success", "items": cart['items'], "total": cart['total']})
+    except PoolTimeout:
+        return error_response("Database busy, please retry", 503)
+    except Exception:
+        log.exception("Get cart error")
+        return error_response("An error occurred while fetching cart")
+
+
+async def get_orders(request):
+    user_id = request.path_params['user_id']
+    denied = check_auth(request, user_id)
+    if denied:
+        return denied
+    try:
+        limit = int(request.query_params.get('limit', wsgi.ORDER_PAGE_SIZE))
+    except ValueError:
+        limit = wsgi.ORDER_PAGE_SIZE
+    limit = min(max(limit, 1), wsgi.MAX_ORDER_PAGE_SIZE)
+    page_cursor = request.query_params.get('cursor')
+    try:
+        before = decode_order_cursor(page_cursor) if page_cursor else None
+    except ValueError:
+        return error_response("Invalid cursor", 400)
+
+    try:
+        async with db.cursor() as cursor:
+            orders, next_cursor = await run_plan_async(order_history_plan(user_id, limit, before), cursor)
+        return json_response({"status": "success", "orders": orders, "next_cursor": next_cursor})
+    except PoolTimeout:
+        return error_response("Database busy, please retry", 503)
+    except Exception:
+        log.exception("Get orders error")
+        return error_response("An error occurred while fetching orders")
+
+
+# Streams cost a coroutine and a buffer here, not a thread, so the cap is much higher than in WSGI mode
+ORDER_STREAM_MAX_OPEN = int(os.getenv('ASYNC_ORDER_STREAM_MAX_OPEN', '5000'))
+
+
+def order_event_stream(user_id):
+    # Same protocol as app.order_event_stream, waiting on the event loop instead of a thread
+    if wsgi.order_events.subscriber_count() >= ORDER_STREAM_MAX_OPEN:
+        return error_response("Too many open streams, please retry", 503)
+
+    async def generate():
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+
+        def notify():
+            # Called from whichever thread published the event
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:  # loop already closed
+                pass
+
+        # Subscribed inside the generator so a stream that never starts leaves nothing behind
+        subscription = wsgi.order_events.subscribe(user_id, notify=notify)
+        try:
+            yield "retry: 3000\n\n"
+            deadline = loop.time() + wsgi.ORDER_STREAM_MAX_SECONDS
+            while loop.time() < deadline:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), wsgi.ORDER_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+                events = subscription.drain()
+                if subscription.overflowed:
+                    yield format_sse('reset', {"reason": "buffer overflow"})
+                    return
+                for event in events:
+                    yield format_sse('order_status', event)
+                if not events:
+                    yield ": ping\n\n"
+        finally:
+            wsgi.order_events.unsubscribe(subscription)
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def stream_user_orders(request):
+    user_id = request.path_params['user_id']
+    denied = check_auth(request, user_id, query_token=True)
+    return denied or order_event_stream(user_id)
+
+
+async def stream_all_orders(request):
+    denied = check_auth(request, admin=True, query_token=True)
+    return denied or order_event_stream(None)
+
+
+async def stream_upstream(proxy, url, upstream, content_type):
+    # Async twin of ImageProxy._stream: tee into the disk cache, keep only complete bodies
+    out, tmp = proxy.cache.temp_file()
+    received = 0
+    complete = False
+    try:
+        async for chunk in upstream.aiter_bytes(proxy.chunk_size):
+            received += len(chunk)
+            if received > proxy.max_bytes:
+                log.warning("Image exceeded size limit, aborting",
+                            extra=applog.fields(url=url, max_bytes=proxy.max_bytes))
+                raise ImageProxyError('Image too large', 413)
+            out.write(chunk)
+            yield chunk
+        complete = True
+    except httpx.HTTPError as e:
+        # Raised so the server aborts the response; a clean end would pass off a truncated image as whole
+        log.warning("Upstream image stream failed", extra=applog.fields(url=url, error=str(e)))
+        raise ImageProxyError(f'Upstream stream failed: {e}', 502)
+    finally:
+        out.close()
+        if complete:
+            proxy.cache.put(DiskCache.key(url), tmp, content_type)
+        else:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+# Fetches wait on the event loop, not a thread, so the cap follows the upstream connection limit instead
+IMAGE_PROXY_MAX_IN_FLIGHT = int(os.getenv('ASYNC_IMAGE_PROXY_MAX_IN_FLIGHT',
+                                          os.getenv('IMAGE_PROXY_MAX_CONNECTIONS', '200')))
+
+
+async def image_proxy(request):
+    url = request.query_params.get('url')
+    if not url:
+        return PlainTextResponse('Image URL not provided', 400)
+    limited = check_rate_limit(request, 'image_proxy')
+    if limited:
+        return limited
+
+    proxy = wsgi.image_proxy_service
+    cache_control = f"public, max-age={wsgi.IMAGE_CACHE_MAX_AGE}"
+    try:
+        proxy.check_url(url)
+        cached = proxy.cached(url)
+        if cached:
+            path, content_type = cached
+            return FileResponse(path, media_type=content_type, headers={"Cache-Control": cache_control})
+
+        proxy.begin_fetch(IMAGE_PROXY_MAX_IN_FLIGHT)
+        try:
+            return await fetch_upstream(proxy, url, cache_control)
+        except BaseException:
+            proxy.end_fetch()
+            raise
+    except ImageProxyError as e:
+        log.warning("Image proxy failed", extra=applog.fields(status=e.status, error=str(e)))
+        headers = {"Retry-After": "1"} if e.status == 503 else None
+        return PlainTextResponse(str(e) if e.status < 500 else 'Failed to fetch image', e.status, headers)
+
+
+async def check_host(proxy, url):
+    """Resolve and check the host of ``url``; returns the address to connect to (None with an allowlist)."""
+    if proxy.allowed_hosts:
+        return None
+    host = urlsplit(url).hostname
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise ImageProxyError(f'Could not resolve {host}: {e}', 502)
+    addresses = [info[4][0] for info in infos]
+    proxy.check_resolved(addresses)
+    return addresses[0]
+
+
+def upstream_request(url, address):
+    # Connects to the checked address rather than letting httpx look the host up again (DNS
+    # rebinding could answer differently); Host and TLS SNI/verification still use the hostname.
+    if address is None:
+        return http_client.build_request('GET', url)
+    parts = urlsplit(url)
+    host = f"[{parts.hostname}]" if ':' in parts.hostname else parts.hostname
+    pinned = f"[{address}]" if ':' in address else address
+    port = f":{parts.port}" if parts.port else ''
+    extensions = {"sni_hostname": parts.hostname} if parts.scheme == 'https' else {}
+    return http_client.build_request('GET', parts._replace(netloc=pinned + port).geturl(),
+                                     headers={'Host': host + port}, extensions=extensions)
+
+
+async def fetch_upstream(proxy, url, cache_control):
+    # Holds one of the proxy's fetch slots; the response's background task gives it back.
+    # Redirects are followed here, not by httpx, so each hop passes the same host checks.
+    location = url
+    for _ in range(proxy.max_redirects + 1):
+        address = await check_host(proxy, location)
+        try:
+            upstream = await http_client.send(upstream_request(location, address), stream=True)
+        except httpx.TimeoutException as e:
+            raise ImageProxyError(f'Upstream timed out: {e}', 504)
+        except httpx.HTTPError as e:
+            raise ImageProxyError(f'Upstream request failed: {e}', 502)
+        if not (upstream.is_redirect and 'location' in upstream.headers):
+            break
+        await upstream.aclose()
+        location = urljoin(location, upstream.headers['location'])
+        proxy.check_url(location)
+    else:
+        raise ImageProxyError('Too many redirects', 502)
+    content_type = upstream.headers.get('content-type', '')
+    length = upstream.headers.get('content-length')
+    if upstream.status_code >= 400:
+        error = ImageProxyError(f'Upstream returned {upstream.status_code}', 502)
+    elif not content_type.startswith('image/'):
+        error = ImageProxyError('Upstream did not return an image', 415)
+    elif length and length.isdigit() and int(length) > proxy.max_bytes:
+        error = ImageProxyError('Image too large', 413)
+    else:
+        error = None
+    if error:
+        await upstream.aclose()
+        raise error
+
+    async def finish():
+        try:
+            await upstream.aclose()
+        finally:
+            proxy.end_fetch()
+
+    return StreamingResponse(stream_upstream(proxy, url, upstream, content_type),
+                             media_type=content_type, headers={"Cache-Control": cache_control},
+                             background=BackgroundTask(finish))
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global http_client
+    proxy = wsgi.image_proxy_service
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(proxy.timeout[1], connect=proxy.timeout[0]),
+        limits=httpx.Limits(max_connections=int(os.getenv('IMAGE_PROXY_MAX_CONNECTIONS', '200')),
+                            max_keepalive_connections=20),
+        headers={'User-Agent': 'mirch-masala-image-proxy'},
+    )
+    await db.start()
+    # Jobs left in the journal (e.g. by a crash) run now rather than after this process's next order
+    wsgi.job_queue.start()
+    try:
+        yield
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, wsgi.job_queue.stop)
+        await http_client.aclose()
+        await db.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/cart/{user_id:int}', instrumented(get_cart, '/api/cart/<int:user_id>'), methods=['GET']),
+        Route('/api/orders/{user_id:int}', instrumented(get_orders, '/api/orders/<int:user_id>'), methods=['GET']),
+        Route('/api/image-proxy', instrumented(image_proxy, '/api/image-proxy'), methods=['GET']),
+        Route('/api/orders/{user_id:int}/events',
+              instrumented(stream_user_orders, '/api/orders/<int:user_id>/events'), methods=['GET']),
+        Route('/api/admin/orders/events', instrumented(stream_all_orders, '/api/admin/orders/events'),
+              methods=['GET']),
+        # Everything else (writes, admin, menu, static files) is the Flask app
+        Mount('/', app=WSGIMiddleware(wsgi.app, workers=int(os.getenv('ASGI_WSGI_THREADS', '10')))),
+    ],
+    # Same open CORS policy as flask_cors's CORS(app) on the WSGI side
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,191 @@
+"""Throughput and latency of the main API routes against a seeded SQLite database.
+
+    python -m benchmarks.api_suite [--levels 1,8,32] [--requests 400] [--out results.json]
+    python -m benchmarks.api_suite --baseline before.json --out after.json
+
+Seeds a fresh database (benchmarks/seed.py), starts the Flask app under
+waitress in a child process with the pool pointed at it through
+benchmarks/sqlite_shim.py, then loads each endpoint at each concurrency
+level:
+
+    menu          GET  /api/menu
+    cart          GET  /api/cart/<user_id>     (random users)
+    order_history GET  /api/orders/<user_id>   (random users)
+    place_order   POST /api/orders             (a distinct user, with a full cart, per request)
+
+Results go to --out as JSON with the git commit and machine details.
+With --baseline, throughput drops and p95 rises beyond --tolerance are
+reported and the exit status is 1, so it can gate a change. SQLite
+serialises writers, so place_order numbers say more about the app's
+per-order work than about MySQL behaviour under contention.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import seed as seeding
+from benchmarks.loadgen import BENCH_SECRET, auth, free_port, get, post_json, run_load, wait_until_up
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve(port, db_path, threads, workdir):
+    os.environ.update({
+        "DB_POOL_SIZE": str(threads),
+        "DB_POOL_MAX_OVERFLOW": "0",
+        "LOG_LEVEL": "WARNING",
+        "SESSION_SECRETS": BENCH_SECRET,
+        "SLOW_QUERY_MS": "60000",
+        "MENU_CACHE_VERSION_FILE": os.path.join(workdir, 'menu.version'),
+        "IMAGE_CACHE_DIR": os.path.join(workdir, 'image_cache'),
+        "JOB_JOURNAL": os.path.join(workdir, 'jobs.db'),
+    })
+    sys.path.insert(0, ROOT)
+    import logging
+    import waitress
+    import app
+    from benchmarks import sqlite_shim
+    logging.getLogger('waitress.queue').setLevel(logging.ERROR)
+    app.db_pool._factory = lambda: app.db_metrics.instrument(sqlite_shim.connect(db_path))
+    waitress.serve(app.app, host='127.0.0.1', port=port, threads=threads, connection_limit=4096,
+                   backlog=4096, _quiet=True)
+
+
+def endpoints(users, rng):
+    user_ids = list(range(1, users + 1))
+    headers = {user_id: auth(user_id) for user_id in user_ids}
+
+    def for_random_user(path):
+        user_id = rng.choice(user_ids)
+        return get(path.format(user_id), headers[user_id])
+
+    return {
+        "menu": lambda i: get('/api/menu'),
+        "cart": lambda i: for_random_user('/api/cart/{}'),
+        "order_history": lambda i: for_random_user('/api/orders/{}'),
+        "place_order": None,  # built per level, see place_order_requests
+    }
+
+
+def place_order_requests(user_ids):
+    headers = [auth(user_id) for user_id in user_ids]
+    return lambda i: post_json('/api/orders', {
+        "user_id": user_ids[i], "deliveryAddress": f"{user_ids[i]} MG Road, Pune", "paymentMethod": "online",
+    }, headers[i])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, report, tolerance):
+    """Lines describing regressions of ``report`` against ``baseline``."""
+    problems = []
+    for name, levels in report["results"].items():
+        before = {r["concurrency"]: r for r in baseline.get("results", {}).get(name, [])}
+        for result in levels:
+            old = before.get(result["concurrency"])
+            if not old or not old.get("throughput_rps") or not old.get("p95_ms"):
+                continue
+            label = f"{name} c={result['concurrency']}"
+            if result["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+                problems.append(f"{label}: throughput {old['throughput_rps']} -> {result['throughput_rps']} req/s")
+            if result["p95_ms"] is not None and result["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+                problems.append(f"{label}: p95 {old['p95_ms']} -> {result['p95_ms']} ms")
+            if result["errors"] > old.get("errors", 0):
+                problems.append(f"{label}: errors {old.get('errors', 0)} -> {result['errors']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', default='1,8,32', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=400, help='requests per endpoint and level')
+    parser.add_argument('--threads', type=int, default=8, help='waitress threads (and DB pool size)')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--orders-per-user', type=int, default=20)
+    parser.add_argument('--only', help='comma-separated endpoint names to run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative regression')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(',')]
+    if args.requests * len(levels) > args.users:
+        parser.error('place_order needs --users >= --requests x number of levels')
+
+    workdir = tempfile.mkdtemp(prefix='mirch-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    started = time.time()
+    dataset = seeding.seed(db_path, users=args.users, orders_per_user=args.orders_per_user, seed=args.seed)
+    print(f"Seeded {db_path}: {dataset} in {time.time() - started:.1f}s")
+
+    rng = random.Random(args.seed)
+    plans = endpoints(args.users, rng)
+    if args.only:
+        plans = {name: plans[name] for name in args.only.split(',')}
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port, db_path, args.threads, workdir), daemon=True)
+    server.start()
+    results = {}
+    try:
+        wait_until_up(port)
+        asyncio.run(run_load(port, lambda i: get('/api/menu'), 2, 20))  # warm-up
+        next_user = 1
+        for name, make_request in plans.items():
+            results[name] = []
+            for concurrency in levels:
+                if name == 'place_order':
+                    user_ids = list(range(next_user, next_user + args.requests))
+                    next_user += args.requests
+                    seeding.refill_carts(db_path, user_ids, seed=args.seed)
+                    make_request = place_order_requests(user_ids)
+                result = asyncio.run(run_load(port, make_request, concurrency, args.requests))
+                print(f"{name:14} c={concurrency:<4} {result['throughput_rps']:>8} req/s  p50={result['p50_ms']}ms "
+                      f"p95={result['p95_ms']}ms p99={result['p99_ms']}ms errors={result['errors']}")
+                results[name].append(result)
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "git_commit": git_commit(),
+        "started_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(started)),
+        "machine": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                    "platform": platform.platform(), "cpus": os.cpu_count()},
+        "params": {"levels": levels, "requests": args.requests, "threads": args.threads, "seed": args.seed},
+        "dataset": dataset,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(json.load(f), report, args.tolerance)
+        for line in problems:
+            print(f"REGRESSION {line}")
+        if problems:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
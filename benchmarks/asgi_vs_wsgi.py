@@ -0,0 +1,101 @@
+"""Load-test GET /api/orders/<user_id> in threaded WSGI mode vs ASGI mode.
+
+    python -m benchmarks.asgi_vs_wsgi [--latency 0.01] [--threads 16] [--out results.json]
+
+Each server runs in its own process against the latency stand-in in
+benchmarks/standin.py (every query sleeps --latency seconds). WSGI mode is
+waitress with --threads worker threads and a DB pool of the same size, as
+a gthread deployment would be sized. ASGI mode is uvicorn with
+--async-pool connections.
+
+The load generator (benchmarks/loadgen.py) shares the box with the
+servers; on a small machine pin it to other cores with taskset.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+
+from benchmarks.loadgen import BENCH_SECRET, auth, free_port, get, run_load, wait_until_up
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve_wsgi(port, latency, threads):
+    os.environ.update({'SESSION_SECRETS': BENCH_SECRET, 'LOG_LEVEL': 'WARNING'})
+    sys.path.insert(0, ROOT)
+    import logging
+    import waitress
+    import app
+    logging.getLogger('waitress.queue').setLevel(logging.ERROR)
+    from benchmarks import standin
+    app.db_pool._factory = lambda: standin.Connection(latency)
+    app.db_pool.size, app.db_pool.max_overflow = threads, 0
+    waitress.serve(app.app, host='127.0.0.1', port=port, threads=threads, connection_limit=4096,
+                   backlog=4096, _quiet=True)
+
+
+def serve_asgi(port, latency, pool_size):
+    os.environ.update({'SESSION_SECRETS': BENCH_SECRET, 'LOG_LEVEL': 'WARNING'})
+    sys.path.insert(0, ROOT)
+    import uvicorn
+    import asgi
+    from benchmarks import standin
+    asgi.db = standin.AsyncDB(latency, pool_size)
+    uvicorn.run(asgi.app, host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+
+
+def bench_mode(name, target, args, levels):
+    port = free_port()
+    process = multiprocessing.Process(target=target, args=(port, args.latency, args.pool), daemon=True)
+    process.start()
+    try:
+        wait_until_up(port)
+        request = get('/api/orders/1', auth(1))
+        asyncio.run(run_load(port, lambda i: request, 4, 20))  # warm-up
+        results = []
+        for concurrency in levels:
+            total = max(args.requests, concurrency * 5)
+            result = asyncio.run(run_load(port, lambda i: request, concurrency, total))
+            print(f"{name:5} c={concurrency:<5} {result['throughput_rps']:>8} req/s  "
+                  f"p50={result['p50_ms']}ms p99={result['p99_ms']}ms errors={result['errors']}")
+            results.append(result)
+        return results
+    finally:
+        process.terminate()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per DB query')
+    parser.add_argument('--threads', type=int, default=16, help='WSGI worker threads (and DB pool size)')
+    parser.add_argument('--async-pool', type=int, default=200, help='ASGI DB pool size')
+    parser.add_argument('--levels', default='16,64,256,1024', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per level (at least 5x concurrency)')
+    parser.add_argument('--out', help='write results JSON here')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(',')]
+
+    args.pool = args.threads
+    wsgi_results = bench_mode('wsgi', serve_wsgi, args, levels)
+    args.pool = args.async_pool
+    asgi_results = bench_mode('asgi', serve_asgi, args, levels)
+
+    report = {
+        "endpoint": "GET /api/orders/<user_id>",
+        "db_latency_s": args.latency,
+        "wsgi": {"server": "waitress", "threads": args.threads, "db_pool": args.threads, "results": wsgi_results},
+        "asgi": {"server": "uvicorn", "db_pool": args.async_pool, "results": asgi_results},
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
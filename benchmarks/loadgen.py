@@ -0,0 +1,117 @@
+"""Shared pieces of the load tests: a server-process harness and a lean HTTP client.
+
+The client is a bare asyncio HTTP/1.1 keep-alive loop rather than a full
+client library, so it steals as little CPU as possible from the server
+under test; on a small box, still pin it to other cores (taskset).
+"""
+import asyncio
+import json
+import socket
+import statistics
+import time
+
+from tokens import TokenSigner
+
+# Servers under test get this as SESSION_SECRETS, so the client can mint tokens for any user
+BENCH_SECRET = 'benchmark-secret'
+_signer = TokenSigner([BENCH_SECRET])
+
+
+def auth(user_id):
+    """Authorization header for ``user_id``."""
+    return {"Authorization": f"Bearer {_signer.issue(user_id)[0]}"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def get(path, headers=None):
+    extra = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    return f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: keep-alive\r\n{extra}\r\n".encode()
+
+
+def post_json(path, payload, headers=None):
+    body = json.dumps(payload).encode()
+    extra = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    return (f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: keep-alive\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n{extra}\r\n").encode() + body
+
+
+async def fetch(reader, writer, request):
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def run_load(port, make_request, concurrency, total):
+    """Send ``total`` requests (``make_request(i)`` -> raw bytes) over ``concurrency`` connections."""
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            for i in remaining:
+                start = time.perf_counter()
+                try:
+                    status = await fetch(reader, writer, make_request(i))
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    errors += 1
+                    writer.close()
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                    continue
+                if status != 200:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+    }
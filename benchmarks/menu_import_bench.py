@@ -0,0 +1,126 @@
+"""Bulk menu import/export vs one admin request per item, on the SQLite stand-in.
+
+    python -m benchmarks.menu_import_bench [--items 10000] [--single 300] [--out results.json]
+
+Through the Flask test client against a seeded database:
+
+    import_csv    POST /api/admin/menu/import, --items new items as CSV
+    import_json   the same items re-imported as JSON updates (exported ids)
+    export_csv    GET  /api/admin/menu/export?format=csv
+    export_json   GET  /api/admin/menu/export?format=json
+    single_add    --single POST /api/admin/menu calls, extrapolated to --items
+
+SQLite commits are cheap next to a MySQL round trip, so on a real server
+the gap between the bulk and per-item paths is wider than shown here.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_csv(count, rng):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['item_name', 'description', 'category', 'price', 'availability', 'image'])
+    for n in range(count):
+        writer.writerow([f"Branch Special {n}", f"House recipe number {n}", f"Category {n % 40}",
+                         f"{rng.randrange(49, 499)}.00", 1, ''])
+    return out.getvalue().encode()
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--single', type=int, default=300, help='per-item requests to time')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write results JSON here')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mirch-menu-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    os.environ.update({
+        "LOG_LEVEL": "WARNING",
+        "SESSION_SECRETS": "benchmark-secret",
+        "MENU_IMPORT_MAX_ROWS": str(max(args.items, 50000)),
+        "MENU_CACHE_VERSION_FILE": os.path.join(workdir, 'menu.version'),
+        "IMAGE_CACHE_DIR": os.path.join(workdir, 'image_cache'),
+        "JOB_JOURNAL": os.path.join(workdir, 'jobs.db'),
+        "ORDER_EVENTS_FILE": os.path.join(workdir, 'order_events'),
+    })
+    sys.path.insert(0, ROOT)
+    from benchmarks import seed as seeding, sqlite_shim
+    import app
+
+    try:
+        seeding.seed(db_path, users=10, orders_per_user=1, seed=args.seed)
+        app.db_pool._factory = lambda: app.db_metrics.instrument(sqlite_shim.connect(db_path))
+        client = app.app.test_client()
+        token, _ = app.session_tokens.issue(1, 'admin')
+        headers = {'Authorization': f'Bearer {token}'}
+        rng = random.Random(args.seed)
+        results = {}
+
+        def report(name, seconds, items):
+            results[name] = {"items": items, "seconds": round(seconds, 3),
+                             "items_per_s": round(items / seconds, 1) if seconds else None}
+            print(f"{name:12} {items:>7} items  {seconds:8.3f}s  {results[name]['items_per_s']:>10} items/s")
+
+        body = make_csv(args.items, rng)
+        response, seconds = timed(lambda: client.post('/api/admin/menu/import', data=body,
+                                                      content_type='text/csv', headers=headers))
+        assert response.status_code == 200, response.get_data(as_text=True)
+        report('import_csv', seconds, args.items)
+
+        app.menu_cache.get()  # reload after the import's invalidation, so exports time only the encoding
+        response, seconds = timed(lambda: client.get('/api/admin/menu/export?format=csv', headers=headers))
+        exported = response.get_data()
+        report('export_csv', seconds, exported.count(b'\n') - 1)
+
+        response, seconds = timed(lambda: client.get('/api/admin/menu/export?format=json', headers=headers))
+        items = json.loads(response.get_data())
+        report('export_json', seconds, len(items))
+
+        for item in items:
+            item['price'] = str(round(float(item['price']) * 1.05, 2))
+        body = json.dumps(items).encode()
+        response, seconds = timed(lambda: client.post('/api/admin/menu/import', data=body,
+                                                      content_type='application/json', headers=headers))
+        assert response.status_code == 200, response.get_data(as_text=True)
+        report('import_json', seconds, len(items))
+
+        def add_each():
+            for n in range(args.single):
+                response = client.post('/api/admin/menu', headers=headers, json={
+                    "name": f"Single {n}", "description": "One at a time", "category": "Singles", "price": 99})
+                assert response.status_code == 200, response.get_data(as_text=True)
+        _, seconds = timed(add_each)
+        report('single_add', seconds, args.single)
+        extrapolated = seconds / args.single * args.items
+        results['single_add']['extrapolated_seconds'] = round(extrapolated, 3)
+        speedup = extrapolated / results['import_csv']['seconds']
+        print(f"{args.items} items one request each: ~{extrapolated:.1f}s, {speedup:.0f}x the CSV import")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
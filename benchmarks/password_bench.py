@@ -0,0 +1,69 @@
+"""Login verification throughput per core for each scrypt work factor.
+
+    python -m benchmarks.password_bench [--log2-n 12,14,15] [--logins 64] [--out results.json]
+
+For each work factor, runs --logins verifications from --clients request
+threads through passwords.PasswordHasher with 1..cpus KDF workers and
+reports verifications/s overall and per busy core, plus the throughput
+when the verification cache hits. Use it to pick PASSWORD_SCRYPT_LOG2_N:
+at peak, logins/s needed / per-core rate = cores spent on logins.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passwords import PasswordHasher, VerifyCache
+
+
+def measure(hasher, stored, logins, clients):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda _: hasher.verify('correct horse', stored)[0], range(logins)))
+    elapsed = time.perf_counter() - started
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--log2-n', default='12,14,15', help='comma-separated scrypt log2(n) values')
+    parser.add_argument('--logins', type=int, default=64, help='verifications per measurement')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent request threads')
+    parser.add_argument('--out', help='write results JSON here')
+    args = parser.parse_args()
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, max(cpus // 2, 1), cpus})
+
+    report = {"cpus": cpus, "results": []}
+    for log2_n in (int(v) for v in args.log2_n.split(',')):
+        for workers in worker_counts:
+            hasher = PasswordHasher(log2_n=log2_n, workers=workers, max_pending=args.clients)
+            stored = hasher.hash('correct horse')
+            start = time.perf_counter()
+            hasher.verify('correct horse', stored)
+            single_ms = (time.perf_counter() - start) * 1000
+            rate = measure(hasher, stored, args.logins, args.clients)
+            row = {"log2_n": log2_n, "workers": workers, "single_verify_ms": round(single_ms, 1),
+                   "verifications_per_s": round(rate, 1),
+                   "per_core_per_s": round(rate / min(workers, cpus), 1)}
+            report["results"].append(row)
+            print(f"n=2^{log2_n:<3} workers={workers:<3} {row['single_verify_ms']:>7} ms/verify  "
+                  f"{row['verifications_per_s']:>8}/s  {row['per_core_per_s']:>8}/s per core")
+
+        cached = PasswordHasher(log2_n=log2_n, workers=cpus, max_pending=args.clients, cache=VerifyCache())
+        stored = cached.hash('correct horse')
+        cached.verify('correct horse', stored)
+        rate = measure(cached, stored, args.logins * 50, args.clients)
+        report["results"].append({"log2_n": log2_n, "workers": cpus, "cache_hit": True,
+                                  "verifications_per_s": round(rate, 1)})
+        print(f"n=2^{log2_n:<3} cache hit          {round(rate, 1):>8}/s")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
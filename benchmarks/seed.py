@@ -0,0 +1,200 @@
+"""Seed a SQLite database (see sqlite_shim.py) with a realistic data set.
+
+    python -m benchmarks.seed bench.db [--users 2000] [--orders-per-user 20]
+
+Deterministic for a given --seed, so two runs of the suite measure the
+same data. Tables mirror the MySQL schema the app queries.
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks import sqlite_shim  # noqa: F401  (registers the Decimal/datetime adapters)
+
+SCHEMA = """
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    phone_number TEXT,
+    password TEXT NOT NULL,
+    address TEXT,
+    user_type TEXT NOT NULL DEFAULT 'customer'
+);
+CREATE TABLE menu (
+    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_name TEXT NOT NULL,
+    description TEXT,
+    category TEXT,
+    price DECIMAL NOT NULL,
+    availability INTEGER NOT NULL DEFAULT 1,
+    image TEXT
+);
+CREATE TABLE cart (
+    cart_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    UNIQUE (user_id, item_id)
+);
+CREATE TABLE orders (
+    order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    order_date DATETIME NOT NULL,
+    total_price DECIMAL NOT NULL,
+    payment_mode TEXT,
+    status TEXT
+);
+CREATE INDEX idx_orders_user_date ON orders (user_id, order_date, order_id);
+CREATE TABLE order_items (
+    order_item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    subtotal DECIMAL NOT NULL
+);
+CREATE INDEX idx_order_items_order ON order_items (order_id);
+CREATE TABLE payments (
+    payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    amount DECIMAL NOT NULL,
+    payment_method TEXT,
+    transaction_status TEXT
+);
+CREATE INDEX idx_payments_order ON payments (order_id);
+CREATE TABLE delivery_info (
+    delivery_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    delivery_address TEXT,
+    delivery_status TEXT,
+    estimated_time DATETIME
+);
+CREATE INDEX idx_delivery_info_order ON delivery_info (order_id);
+CREATE TABLE logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    order_id INTEGER,
+    timestamp DATETIME NOT NULL
+);
+CREATE TABLE order_requests (
+    user_id INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    order_id INTEGER,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+"""
+
+MENU = {
+    "Soups": ["Tomato Shorba", "Sweet Corn Soup", "Manchow Soup", "Hot and Sour Soup", "Lemon Coriander Soup"],
+    "Starters & Indo-Chinese Specials": ["Paneer Tikka", "Veg Manchurian", "Chilli Paneer", "Hara Bhara Kebab",
+                                         "Crispy Corn", "Spring Rolls", "Gobi 65", "Honey Chilli Potato"],
+    "Lentils & Rice": ["Dal Tadka", "Dal Makhani", "Jeera Rice", "Veg Biryani", "Khichdi", "Curd Rice"],
+    "Main Course - Vegetarian Delights": ["Mix Veg Curry", "Aloo Gobi", "Bhindi Masala", "Chana Masala",
+                                          "Malai Kofta", "Baingan Bharta", "Rajma Masala"],
+    "Main Course - Paneer Specialties": ["Paneer Butter Masala", "Kadai Paneer", "Palak Paneer",
+                                         "Shahi Paneer", "Paneer Lababdar", "Matar Paneer"],
+    "Indian Breads": ["Butter Naan", "Garlic Naan", "Tandoori Roti", "Lachha Paratha", "Missi Roti", "Kulcha"],
+    "Beverages - Traditional Indian Drinks": ["Masala Chai", "Sweet Lassi", "Mango Lassi", "Jaljeera",
+                                              "Thandai", "Masala Chaas"],
+    "Desserts & Sweets": ["Gulab Jamun", "Rasmalai", "Gajar Halwa", "Kheer", "Jalebi"],
+    "Ice Creams": ["Kesar Pista Kulfi", "Mango Ice Cream", "Chocolate Sundae", "Butterscotch Scoop"],
+}
+VARIANTS = ["", "Special ", "Jain ", "Tandoori ", "Homestyle "]
+WORDS = ["rich", "creamy", "smoky", "tangy", "spiced", "slow-cooked", "fresh", "aromatic", "buttery", "crisp"]
+PAYMENT_MODES = ["Cash on Delivery", "Online Payment"]
+STATUSES = ["pending", "preparing", "out_for_delivery", "delivered", "delivered", "delivered"]
+
+
+def menu_rows(rng, size):
+    rows = []
+    names = [(category, name) for category, names in MENU.items() for name in names]
+    for i in range(size):
+        category, name = names[i % len(names)]
+        variant = VARIANTS[(i // len(names)) % len(VARIANTS)]
+        description = f"{rng.choice(WORDS).capitalize()} {name.lower()} made {rng.choice(WORDS)} and {rng.choice(WORDS)}"
+        price = Decimal(rng.randrange(49, 499)) + Decimal('0.00')
+        rows.append((f"{variant}{name}", description, category, price, int(rng.random() > 0.05),
+                     f"{name.lower().replace(' ', '_')}.jpg"))
+    return rows
+
+
+def seed(path, users=2000, menu_items=120, orders_per_user=20, cart_items=3, seed=42):
+    """Create ``path`` from scratch; every user gets a cart of ``cart_items`` items."""
+    rng = random.Random(seed)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+
+    conn.executemany("INSERT INTO menu (item_name, description, category, price, availability, image) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", menu_rows(rng, menu_items))
+    prices = dict(conn.execute("SELECT item_id, price FROM menu"))
+    item_ids = sorted(prices)
+
+    conn.executemany(
+        "INSERT INTO users (name, email, phone_number, password, address, user_type) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"User {u}", f"user{u}@example.com", f"9{u:09d}", f"password{u}", f"{u} MG Road, Pune",
+          'admin' if u == 1 else 'customer') for u in range(1, users + 1)])
+
+    now = datetime(2026, 1, 1)
+    order_id = 0
+    orders, items, payments = [], [], []
+    for user_id in range(1, users + 1):
+        # Skewed history: a few regulars with long histories, most with a handful
+        count = min(int(rng.expovariate(1 / orders_per_user)), orders_per_user * 10)
+        for n in range(count):
+            order_id += 1
+            lines = rng.sample(item_ids, rng.randint(1, 5))
+            total = Decimal('0.00')
+            for item_id in lines:
+                quantity = rng.randint(1, 3)
+                subtotal = prices[item_id] * quantity
+                total += subtotal
+                items.append((order_id, item_id, quantity, subtotal))
+            mode = rng.choice(PAYMENT_MODES)
+            orders.append((order_id, user_id, now - timedelta(hours=n * 30 + rng.randint(0, 29)), total, mode,
+                           rng.choice(STATUSES)))
+            payments.append((order_id, total, mode, 'successful' if mode == 'Online Payment' else 'pending'))
+    conn.executemany("INSERT INTO orders (order_id, user_id, order_date, total_price, payment_mode, status) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", orders)
+    conn.executemany("INSERT INTO order_items (order_id, item_id, quantity, subtotal) VALUES (?, ?, ?, ?)", items)
+    conn.executemany("INSERT INTO payments (order_id, amount, payment_method, transaction_status) "
+                     "VALUES (?, ?, ?, ?)", payments)
+    conn.commit()
+    conn.close()
+    refill_carts(path, range(1, users + 1), cart_items, seed)
+    return {"users": users, "menu_items": menu_items, "orders": len(orders), "order_items": len(items)}
+
+
+def refill_carts(path, user_ids, cart_items=3, seed=42):
+    """Give each user a fresh cart (placing an order empties it)."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, timeout=30)
+    item_ids = [row[0] for row in conn.execute("SELECT item_id FROM menu WHERE availability = 1")]
+    rows = [(user_id, item_id, rng.randint(1, 3))
+            for user_id in user_ids for item_id in rng.sample(item_ids, cart_items)]
+    with conn:
+        conn.executemany("DELETE FROM cart WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+        conn.executemany("INSERT INTO cart (user_id, item_id, quantity) VALUES (?, ?, ?)", rows)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--menu-items', type=int, default=120)
+    parser.add_argument('--orders-per-user', type=int, default=20, help='mean order history length')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(seed(args.path, args.users, args.menu_items, args.orders_per_user, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""SQLite stand-in for mysql.connector, for benchmarks without a MySQL server.
+
+Speaks the subset of MySQL the app uses:
+- ``%s`` placeholders
+- ``cursor(dictionary=True)``
+- ``SELECT ... FOR UPDATE``, taken as ``BEGIN IMMEDIATE``: SQLite locks the
+  whole database rather than rows, so checkouts serialise; that is stricter
+  than InnoDB
+- ``INSERT ... ON DUPLICATE KEY UPDATE`` with ``VALUES(col)`` and
+  ``LAST_INSERT_ID(col)``
+- IntegrityError raised as mysql.connector's
+- ``SHOW INDEX FROM <table>`` (the first five columns: Table, Non_unique,
+  Key_name, Seq_in_index, Column_name)
+
+DECIMAL and DATETIME columns come back as Decimal and datetime, like the
+real driver.
+"""
+import re
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+try:
+    from mysql.connector import IntegrityError
+except ImportError:  # the shim also works without the MySQL driver installed
+    IntegrityError = sqlite3.IntegrityError
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_converter('DECIMAL', lambda raw: Decimal(raw.decode()))
+sqlite3.register_converter('DATETIME', lambda raw: datetime.fromisoformat(raw.decode()))
+
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\s*$", re.IGNORECASE)
+_ON_DUPLICATE = re.compile(r"ON\s+DUPLICATE\s+KEY\s+UPDATE", re.IGNORECASE)
+_VALUES_FN = re.compile(r"VALUES\((\w+)\)", re.IGNORECASE)
+_LAST_INSERT_ID = re.compile(r"(\w+)\s*=\s*LAST_INSERT_ID\(\w+\)\s*,?\s*", re.IGNORECASE)
+_SHOW_INDEX = re.compile(r"^\s*SHOW\s+INDEX\s+FROM\s+(\w+)\s*$", re.IGNORECASE)
+SHOW_INDEX_COLUMNS = ('Table', 'Non_unique', 'Key_name', 'Seq_in_index', 'Column_name')
+_WRITE = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+_translated = {}
+
+
+def translate(sql):
+    """MySQL statement -> (SQLite statement, locks, returning column or None)."""
+    cached = _translated.get(sql)
+    if cached is not None:
+        return cached
+    text = sql.replace('%s', '?')
+    locks = bool(_FOR_UPDATE.search(text))
+    text = _FOR_UPDATE.sub('', text)
+    returning = None
+    if _ON_DUPLICATE.search(text):
+        match = _LAST_INSERT_ID.search(text)
+        if match:
+            returning = match.group(1)
+            text = _LAST_INSERT_ID.sub('', text)
+        text = _ON_DUPLICATE.sub('ON CONFLICT DO UPDATE SET', text)
+        text = _VALUES_FN.sub(r'excluded.\1', text)
+    result = _translated[sql] = (text, locks or bool(_WRITE.match(text)), returning)
+    return result
+
+
+def show_index(raw, table):
+    rows = []
+    for _, name, unique, origin, _ in raw.execute(f"PRAGMA index_list({table})").fetchall():
+        key_name = 'PRIMARY' if origin == 'pk' else name
+        for seq, _, column in raw.execute(f"PRAGMA index_info({name})").fetchall():
+            rows.append((table, 0 if unique else 1, key_name, seq + 1, column))
+    return rows
+
+
+class Cursor:
+    def __init__(self, conn, dictionary):
+        self._conn = conn
+        self._cursor = conn.raw.cursor()
+        if dictionary:
+            self._cursor.row_factory = sqlite3.Row
+        self._dictionary = dictionary
+        self._rows = None
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def _begin(self, locks):
+        if locks and not self._conn.raw.in_transaction:
+            # Take the write lock up front, as FOR UPDATE / a first write would in InnoDB
+            self._conn.raw.execute('BEGIN IMMEDIATE')
+
+    def _row(self, row):
+        if row is None:
+            return None
+        return dict(row) if self._dictionary else tuple(row)
+
+    def execute(self, sql, params=()):
+        show = _SHOW_INDEX.match(sql)
+        if show:
+            rows = show_index(self._conn.raw, show.group(1))
+            self._rows = [dict(zip(SHOW_INDEX_COLUMNS, row)) for row in rows] if self._dictionary else rows
+            self.rowcount = len(rows)
+            return
+        text, locks, returning = translate(sql)
+        self._begin(locks)
+        try:
+            if returning:
+                self._cursor.execute(f"{text} RETURNING {returning}", tuple(params))
+                row = self._cursor.fetchone()
+                self._cursor.fetchall()
+                self.lastrowid = row[0] if row else None
+                self._rows = []
+            else:
+                self._cursor.execute(text, tuple(params))
+                self.lastrowid = self._cursor.lastrowid
+                self._rows = None
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+        self.rowcount = self._cursor.rowcount
+
+    def executemany(self, sql, seq_params):
+        text, locks, _ = translate(sql)
+        self._begin(locks)
+        try:
+            self._cursor.executemany(text, [tuple(p) for p in seq_params])
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+        self.rowcount = self._cursor.rowcount
+        self._rows = []
+
+    def fetchone(self):
+        if self._rows is not None:
+            return self._rows.pop(0) if self._rows else None
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path, timeout=30.0):
+        # Autocommit mode: transactions are opened explicitly by Cursor._begin
+        self.raw = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                   detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self.raw.execute('PRAGMA journal_mode=WAL')
+        self.raw.execute('PRAGMA synchronous=NORMAL')
+
+    def cursor(self, dictionary=False, **_):
+        return Cursor(self, dictionary)
+
+    def ping(self, reconnect=False):
+        self.raw.execute('SELECT 1')
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.raw.execute('COMMIT')
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.raw.execute('ROLLBACK')
+
+    def close(self):
+        self.raw.close()
+
+
+def connect(path):
+    return Connection(path)
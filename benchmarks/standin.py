@@ -0,0 +1,112 @@
+"""Latency-injecting DB stand-ins for load tests.
+
+Every query sleeps ``latency`` seconds, like a network round trip to
+MySQL, then returns canned rows shaped like the real tables. The sync
+flavour plugs into db_pool.ConnectionPool as its factory. The async
+flavour replaces asgi.db. Both modes wait the same way per query, so the
+difference measured is the serving model.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+ORDERS_PER_USER = 40
+ITEMS_PER_ORDER = 3
+
+
+def canned_rows(sql, params):
+    if 'FROM orders' in sql:
+        limit = params[-1]
+        start = datetime(2026, 1, 1)
+        return [{"order_id": 1000 + n, "order_date": start - timedelta(hours=n),
+                 "total_price": Decimal('450.00'), "payment_mode": 'Online Payment', "status": 'pending'}
+                for n in range(min(limit, ORDERS_PER_USER))]
+    if 'FROM order_items' in sql:
+        return [{"order_id": order_id, "item_id": i, "item_name": f"Dish {i}", "quantity": 1,
+                 "subtotal": Decimal('150.00')}
+                for order_id in params for i in range(ITEMS_PER_ORDER)]
+    if 'FROM payments' in sql:
+        return [{"order_id": order_id, "payment_method": 'Online Payment', "transaction_status": 'successful'}
+                for order_id in params]
+    if 'FROM cart' in sql:
+        return [{"cart_id": i, "item_id": i, "name": f"Dish {i}", "description": '', "category": 'Main Course',
+                 "price": Decimal('150.00'), "quantity": 2, "subtotal": Decimal('300.00')} for i in range(4)]
+    if 'FROM menu' in sql:
+        return [{"item_id": i, "item_name": f"Dish {i}", "description": '', "category": 'Main Course',
+                 "price": Decimal('150.00'), "availability": 1, "image": None} for i in range(60)]
+    return []
+
+
+class Cursor:
+    def __init__(self, latency):
+        self.latency = latency
+        self._rows = []
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        time.sleep(self.latency)
+        self._rows = canned_rows(sql, params)
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def close(self):
+        pass
+
+
+class Connection:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def cursor(self, dictionary=False):
+        return Cursor(self.latency)
+
+    def ping(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncCursor:
+    def __init__(self, latency):
+        self.latency = latency
+        self._rows = []
+
+    async def execute(self, sql, params=()):
+        await asyncio.sleep(self.latency)
+        self._rows = canned_rows(sql, params)
+
+    async def fetchall(self):
+        return self._rows
+
+
+class AsyncDB:
+    """Drop-in for asgi.db: a pool of ``size`` connections, each query sleeping ``latency``."""
+
+    def __init__(self, latency, size):
+        self.latency = latency
+        self.size = size
+        self._slots = None
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.size)
+
+    async def close(self):
+        pass
+
+    @asynccontextmanager
+    async def cursor(self):
+        async with self._slots:
+            yield AsyncCursor(self.latency)
@@ -0,0 +1,67 @@
+"""Cost of session-token checks: raw verify, and per request through Flask.
+
+    python -m benchmarks.token_bench [--iterations 20000] [--revoked 10000]
+
+Times TokenSigner.verify with a full revocation list, then the same
+trivial Flask view with and without app.require_auth through the test
+client; the difference is what the decorator adds per request.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('SESSION_SECRETS', 'benchmark-secret')
+
+from flask import Flask, jsonify  # noqa: E402
+
+import app  # noqa: E402
+
+
+def per_call_us(fn, iterations):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--revoked', type=int, default=10000, help='live entries in the revocation list')
+    args = parser.parse_args()
+
+    signer = app.session_tokens
+    signer.revocations.path = None  # keep the benchmark off the shared file
+    for n in range(args.revoked):
+        signer.revocations.revoke(f"revoked-{n}", time.time() + 3600)
+    token, _ = signer.issue(42)
+
+    verify_us = per_call_us(lambda: signer.verify(token), args.iterations)
+    print(f"verify:            {verify_us:8.2f} us")
+
+    bench = Flask(__name__)
+
+    @bench.route('/plain/<int:user_id>')
+    def plain(user_id):
+        return jsonify({"ok": True})
+
+    @bench.route('/auth/<int:user_id>')
+    @app.require_auth()
+    def authed(user_id):
+        return jsonify({"ok": True})
+
+    client = bench.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/auth/42', headers=headers).status_code == 200
+    requests = max(args.iterations // 10, 1)
+    plain_us = per_call_us(lambda: client.get('/plain/42', headers=headers), requests)
+    authed_us = per_call_us(lambda: client.get('/auth/42', headers=headers), requests)
+    print(f"request, no auth:  {plain_us:8.2f} us")
+    print(f"request, auth:     {authed_us:8.2f} us")
+    print(f"decorator adds:    {authed_us - plain_us:8.2f} us per request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+import pickle
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class LocalCartBackend:
+    """Per-process cart store, LRU-bounded to ``max_users`` carts."""
+
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._carts = OrderedDict()   # user_id -> (menu_version, cart)
+        self._last_write = {}         # user_id -> write sequence number
+        self._writing = {}            # user_id -> writes begun and not yet ended
+        self._seq = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._carts.get(user_id)
+            if entry is not None:
+                self._carts.move_to_end(user_id)
+            return entry
+
+    def load_token(self, user_id):
+        return self._seq
+
+    def store_loaded(self, user_id, token, entry):
+        # Skip if a write began, ended or is still running while the cart was being read from the DB
+        with self._lock:
+            if self._last_write.get(user_id, 0) > token or self._writing.get(user_id):
+                return
+            self._store(user_id, entry)
+
+    def begin_write(self, user_id):
+        with self._lock:
+            self._note_write(user_id)
+            self._writing[user_id] = self._writing.get(user_id, 0) + 1
+
+    def end_write(self, user_id, fn=None):
+        # Patch the cached cart with ``fn``, or drop it when ``fn`` is None
+        with self._lock:
+            self._note_write(user_id)
+            if self._writing.get(user_id, 0) > 1:
+                self._writing[user_id] -= 1
+            else:
+                self._writing.pop(user_id, None)
+            entry = self._carts.get(user_id)
+            if entry is None:
+                return
+            if fn is None:
+                del self._carts[user_id]
+            else:
+                self._store(user_id, (entry[0], fn(entry[1])))
+
+    def delete(self, user_id):
+        with self._lock:
+            self._note_write(user_id)
+            self._carts.pop(user_id, None)
+
+    def _note_write(self, user_id):
+        self._seq += 1
+        self._last_write[user_id] = self._seq
+        if len(self._last_write) > 2 * self.max_users:
+            # Only recent writes matter (they guard loads still in flight)
+            cutoff = self._seq - self.max_users
+            self._last_write = {uid: seq for uid, seq in self._last_write.items() if seq > cutoff}
+
+    def _store(self, user_id, entry):
+        self._carts[user_id] = entry
+        self._carts.move_to_end(user_id)
+        while len(self._carts) > self.max_users:
+            evicted, _ = self._carts.popitem(last=False)
+            self._last_write.pop(evicted, None)
+
+
+class RedisCartBackend:
+    """Cart store shared by all workers, on a redis-py client."""
+
+    def __init__(self, client, ttl=3600, prefix='cart'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, user_id):
+        return f"{self.prefix}:{user_id}"
+
+    def _write_key(self, user_id):
+        return f"{self.prefix}:w:{user_id}"
+
+    def _writing_key(self, user_id):
+        return f"{self.prefix}:p:{user_id}"
+
+    def get(self, user_id):
+        raw = self.client.get(self._key(user_id))
+        return pickle.loads(raw) if raw else None
+
+    def load_token(self, user_id):
+        return self.client.get(self._write_key(user_id))
+
+    def store_loaded(self, user_id, token, entry):
+        def txn(pipe):
+            if pipe.get(self._write_key(user_id)) != token or int(pipe.get(self._writing_key(user_id)) or 0) > 0:
+                return
+            pipe.multi()
+            pipe.set(self._key(user_id), pickle.dumps(entry), ex=self.ttl)
+        self.client.transaction(txn, self._write_key(user_id), self._writing_key(user_id))
+
+    def begin_write(self, user_id):
+        # The in-progress count expires with the cart, so a worker dying mid-write only stops caching for a while
+        pipe = self.client.pipeline()
+        pipe.incr(self._write_key(user_id))
+        pipe.expire(self._write_key(user_id), self.ttl)
+        pipe.incr(self._writing_key(user_id))
+        pipe.expire(self._writing_key(user_id), self.ttl)
+        pipe.execute()
+
+    def end_write(self, user_id, fn=None):
+        def txn(pipe):
+            raw = pipe.get(self._key(user_id))
+            pipe.multi()
+            pipe.incr(self._write_key(user_id))
+            pipe.expire(self._write_key(user_id), self.ttl)
+            pipe.decr(self._writing_key(user_id))
+            if fn is None:
+                pipe.delete(self._key(user_id))
+            elif raw:
+                version, cart = pickle.loads(raw)
+                pipe.set(self._key(user_id), pickle.dumps((version, fn(cart))), ex=self.ttl)
+        self.client.transaction(txn, self._key(user_id))
+
+    def delete(self, user_id):
+        pipe = self.client.pipeline()
+        pipe.incr(self._write_key(user_id))
+        pipe.expire(self._write_key(user_id), self.ttl)
+        pipe.delete(self._key(user_id))
+        pipe.execute()
+
+
+def _copy(cart):
+    return {"items": [dict(row) for row in cart['items']], "total": cart['total']}
+
+
+class CartCache:
+    """Read-through cart cache kept current by the cart write routes.
+
+    A cart is ``{"items": [...rows as get_cart returns them...], "total": ...}``.
+    Routes that add lines wrap the MySQL write in ``write`` and call
+    ``add`` on the handle once it has committed; when the block exits, the
+    cached cart and its running total are patched (copy-on-write) instead
+    of reloaded. A cart read from the DB while any write for that user is
+    in progress is not cached, since it may or may not include the write
+    its patch is about to apply. The patches are increments, so concurrent
+    adds give the same cart whichever order they end in. Writes that set an
+    absolute value (a new quantity, an emptied cart) ``clear`` the entry
+    after committing instead: two of them could commit in one order and
+    patch the cache in the other.
+
+    Cached carts are tagged with ``menu_version()``; once the menu changes
+    (a price edit in any worker), carts built from the old menu reload.
+    """
+
+    def __init__(self, loader, menu_version, backend=None):
+        self._loader = loader
+        self._menu_version = menu_version
+        self.backend = backend or LocalCartBackend()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        cart, version, token = self.lookup(user_id)
+        if cart is None:
+            cart = self.fill(user_id, version, token, self._loader(user_id))
+        return cart
+
+    def lookup(self, user_id):
+        """``(cart, None, None)`` on a hit, else ``(None, version, token)`` for ``fill``.
+
+        Split from ``get`` so callers with their own (async) loader can use the cache.
+        """
+        version = self._menu_version()
+        entry = self.backend.get(user_id)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1], None, None
+        self.misses += 1
+        return None, version, self.backend.load_token(user_id)
+
+    def fill(self, user_id, version, token, items):
+        items = list(items)
+        cart = {"items": items, "total": sum(item['subtotal'] for item in items)}
+        self.backend.store_loaded(user_id, token, (version, cart))
+        return cart
+
+    @contextmanager
+    def write(self, user_id):
+        """Bracket a cart write; patches queued with ``add`` apply on exit, and an error drops the cart."""
+        change = CartWrite()
+        self.backend.begin_write(user_id)
+        try:
+            yield change
+        except BaseException:
+            self.backend.end_write(user_id)
+            raise
+        self.backend.end_write(user_id, None if change.cleared else change.apply)
+
+    def clear(self, user_id):
+        self.backend.delete(user_id)
+
+
+class CartWrite:
+    def __init__(self):
+        self.cleared = False
+        self._lines = []
+
+    def add(self, menu_item, quantity, cart_id):
+        self._lines.append((menu_item, quantity, cart_id))
+
+    def clear(self):
+        self.cleared = True
+
+    def apply(self, cart):
+        cart = _copy(cart)
+        for menu_item, quantity, cart_id in self._lines:
+            price = menu_item['price']
+            for row in cart['items']:
+                if row['item_id'] == menu_item['item_id']:
+                    row['quantity'] += quantity
+                    row['subtotal'] = price * row['quantity']
+                    break
+            else:
+                cart['items'].append({
+                    "cart_id": cart_id,
+                    "item_id": menu_item['item_id'],
+                    "name": menu_item['item_name'],
+                    "description": menu_item.get('description'),
+                    "category": menu_item.get('category'),
+                    "price": price,
+                    "quantity": quantity,
+                    "subtotal": price * quantity,
+                })
+            cart['total'] += price * quantity
+        return cart
@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeout(PoolError):
+    """No connection became free within the checkout timeout."""
+
+
+class ConnectError(PoolError):
+    """The connection factory failed to open a new connection."""
+
+
+def _ping(conn):
+    # mysql.connector exposes ping(); DB-API stand-ins (sqlite3) do not
+    ping = getattr(conn, 'ping', None)
+    if ping is not None:
+        ping()
+    else:
+        conn.cursor().execute("SELECT 1")
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections built by ``factory``.
+
+    Keeps up to ``size`` idle connections, opens up to ``max_overflow`` extra
+    ones under load (closed again on return), pings connections on checkout,
+    recycles them after ``max_lifetime`` seconds and raises ``PoolTimeout``
+    when nothing frees up within ``timeout`` seconds.
+    """
+
+    def __init__(self, factory, size=5, max_overflow=10, timeout=5.0,
+                 max_lifetime=1800.0, pre_ping=True, ping=_ping):
+        self._factory = factory
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self._ping = ping
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, created_at), most recently used on the right
+        self._open = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._connects = 0
+        self._discards = 0
+
+    @contextmanager
+    def connection(self):
+        conn, created = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = not self._rollback(conn)
+            raise
+        finally:
+            # Always end the transaction: with autocommit off a plain SELECT
+            # leaves a snapshot open that would otherwise leak to the next user.
+            if not broken:
+                broken = not self._rollback(conn)
+            self._checkin(conn, created, discard=broken)
+
+    def _checkout(self):
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    conn = created = None
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"no connection available after {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += time.monotonic() - start
+
+        try:
+            if conn is not None and not self._usable(conn, created):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn, created = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn, created
+
+    def _checkin(self, conn, created, discard=False):
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._open > self.size or self._expired(created):
+                self._open -= 1
+                self._discards += 1
+            else:
+                self._idle.append((conn, created))
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            self._close(conn)
+
+    def _connect(self):
+        try:
+            conn = self._factory()
+        except Exception as err:
+            raise ConnectError(str(err)) from err
+        with self._cond:
+            self._connects += 1
+        return conn, time.monotonic()
+
+    def _usable(self, conn, created):
+        if self._expired(created):
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            self._ping(conn)
+            return True
+        except Exception:
+            return False
+
+    def _expired(self, created):
+        return self.max_lifetime is not None and time.monotonic() - created > self.max_lifetime
+
+    @staticmethod
+    def _rollback(conn):
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def warm(self, count=None):
+        """Open connections up front (``size`` by default) so first requests skip the connect."""
+        count = self.size if count is None else min(count, self.size)
+        with self._cond:
+            # Already at or past the target (overflow connections count too): nothing to open
+            count = max(count - self._open, 0)
+            self._open += count
+        opened = []
+        try:
+            for _ in range(count):
+                opened.append(self._connect())
+        finally:
+            with self._cond:
+                self._open -= count - len(opened)
+                self._idle.extend(opened)
+                self._cond.notify_all()
+        return len(opened)
+
+    def reset_after_fork(self):
+        """Forget connections inherited from a parent process.
+
+        They are deliberately not closed: the sockets are shared with the
+        parent, and a clean close would tear down its sessions too.
+        """
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_seconds": round(self._wait_time, 6),
+                "timeouts": self._timeouts,
+                "connects": self._connects,
+                "discards": self._discards,
+            }
@@ -0,0 +1,53 @@
+"""Production gunicorn settings.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Tuned through the environment:
+    WEB_CONCURRENCY   worker processes (default 2 x CPUs + 1)
+    WEB_THREADS       threads per worker (default 4); also the default DB_POOL_SIZE
+    PORT / BIND       listen address (default 0.0.0.0:5000)
+    WEB_TIMEOUT       seconds before a stuck worker is killed (default 30)
+    WEB_MAX_REQUESTS  recycle a worker after this many requests (default 0 = never)
+    TRUSTED_PROXY_COUNT  reverse proxies in front (e.g. 1 behind nginx); required
+                      behind a proxy, or every client shares one rate limit
+
+The app is preloaded: imports and the menu warm-up happen once in the
+master and workers inherit them copy-on-write. Each worker then drops the
+inherited DB connections and opens its own pool before taking traffic.
+
+Reloading: ``kill -HUP <master>`` gracefully replaces workers, but with
+preload they fork from the old code. To deploy new code without dropping
+connections, ``kill -USR2 <master>`` (starts a new master), then
+``kill -QUIT <old master>`` once the new workers are up.
+"""
+import multiprocessing
+import os
+
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('WEB_THREADS', '4'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+preload_app = True
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+# One pooled DB connection per request thread unless overridden
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+# No job threads in the preloading master (they'd be forked mid-job); each worker starts its own in post_fork
+os.environ['JOB_AUTOSTART'] = '0'
+
+
+def post_fork(server, worker):
+    import app
+    app.db_pool.reset_after_fork()
+    app.warm_up(pool_connections=app.db_pool.size)
+
+
+def worker_exit(server, worker):
+    import app
+    app.job_queue.stop()
+    app.db_pool.close()
@@ -0,0 +1,272 @@
+"""Build resized WebP/AVIF/JPEG variants of the menu photos.
+
+    python image_pipeline.py build [--force]
+    python image_pipeline.py bench [--width 640]
+
+Variants land in static/images/menu/variants/ with content-hashed names,
+and manifest.json there maps each source image to its variants so the
+menu API can hand the browser a srcset. Builds hold a lock on
+manifest.json.lock, so web workers and the command line can't overwrite
+each other's manifest entries, and each build removes the variants the
+manifest no longer lists.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within this process
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(BASE_DIR, 'static', 'images', 'menu')
+VARIANT_DIR = os.path.join(SOURCE_DIR, 'variants')
+MANIFEST_PATH = os.path.join(VARIANT_DIR, 'manifest.json')
+URL_PREFIX = '/static/images/menu/variants/'
+
+WIDTHS = (320, 640, 1024)
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# Pillow save() arguments per output format, best compression first
+FORMATS = {
+    'avif': ('AVIF', {'quality': 50}),
+    'webp': ('WEBP', {'quality': 75, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 78, 'optimize': True, 'progressive': True}),
+}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+_manifest_lock = threading.Lock()
+
+
+@contextmanager
+def manifest_lock(manifest_path=MANIFEST_PATH):
+    """Hold the manifest for a read-modify-write, against other threads and processes."""
+    with _manifest_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def available_formats():
+    from PIL import features
+    formats = []
+    for name in FORMATS:
+        try:
+            supported = name == 'jpeg' or features.check(name)
+        except ValueError:  # feature name unknown to this Pillow version
+            supported = False
+        if supported:
+            formats.append(name)
+    return formats
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:10]
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest, path=MANIFEST_PATH):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def entry_is_current(entry, source_path, variant_dir=VARIANT_DIR):
+    if not entry or entry.get('hash') != file_hash(source_path):
+        return False
+    return all(os.path.exists(os.path.join(variant_dir, v['file']))
+               for variants in entry['variants'].values() for v in variants)
+
+
+def build_image(name, source_dir=SOURCE_DIR, variant_dir=VARIANT_DIR, widths=WIDTHS, formats=None):
+    """Write every width/format variant of one source image; return its manifest entry."""
+    from PIL import Image, ImageOps
+
+    source_path = os.path.join(source_dir, name)
+    digest = file_hash(source_path)
+    stem = os.path.splitext(name)[0]
+    os.makedirs(variant_dir, exist_ok=True)
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    # Never upscale; the original width stands in for any larger target
+    targets = sorted({min(w, image.width) for w in widths})
+
+    variants = {}
+    for fmt in formats or available_formats():
+        pil_format, options = FORMATS[fmt]
+        variants[fmt] = []
+        for width in targets:
+            filename = f"{stem}-{width}w.{digest}.{fmt}"
+            out_path = os.path.join(variant_dir, filename)
+            if not os.path.exists(out_path):
+                height = round(image.height * width / image.width)
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                resized.save(out_path + '.tmp', pil_format, **options)
+                os.replace(out_path + '.tmp', out_path)
+            variants[fmt].append({"width": width, "file": filename, "bytes": os.path.getsize(out_path)})
+
+    return {
+        "hash": digest,
+        "width": image.width,
+        "height": image.height,
+        "bytes": os.path.getsize(source_path),
+        "variants": variants,
+    }
+
+
+def source_images(source_dir=SOURCE_DIR):
+    return sorted(name for name in os.listdir(source_dir)
+                  if name.lower().endswith(SOURCE_EXTENSIONS) and os.path.isfile(os.path.join(source_dir, name)))
+
+
+def build_all(force=False, source_dir=SOURCE_DIR, variant_dir=VARIANT_DIR, manifest_path=MANIFEST_PATH):
+    with manifest_lock(manifest_path):
+        manifest = load_manifest(manifest_path)
+        built = 0
+        names = source_images(source_dir)
+        for name in names:
+            if not force and entry_is_current(manifest.get(name), os.path.join(source_dir, name), variant_dir):
+                continue
+            manifest[name] = build_image(name, source_dir, variant_dir)
+            built += 1
+        for name in set(manifest) - set(names):
+            del manifest[name]
+        write_manifest(manifest, manifest_path)
+        remove_stale_variants(manifest, variant_dir, manifest_path)
+        return built, len(names)
+
+
+def build_one(name, source_dir=SOURCE_DIR, variant_dir=VARIANT_DIR, manifest_path=MANIFEST_PATH):
+    """(Re)build a single image if it changed; returns True when the manifest was updated."""
+    source_path = os.path.join(source_dir, name)
+    with manifest_lock(manifest_path):
+        manifest = load_manifest(manifest_path)
+        if entry_is_current(manifest.get(name), source_path, variant_dir):
+            return False
+        manifest[name] = build_image(name, source_dir, variant_dir)
+        write_manifest(manifest, manifest_path)
+        # The previous photo's variants, now that pages are pointed at the new ones
+        remove_stale_variants(manifest, variant_dir, manifest_path)
+        return True
+
+
+def remove_stale_variants(manifest, variant_dir=VARIANT_DIR, manifest_path=MANIFEST_PATH):
+    """Delete files in ``variant_dir`` that ``manifest`` doesn't list; call with the manifest lock held."""
+    keep = {v['file'] for entry in manifest.values() for variants in entry['variants'].values() for v in variants}
+    manifest_name = os.path.basename(manifest_path)
+    keep.update({manifest_name, manifest_name + '.lock'})
+    for filename in os.listdir(variant_dir):
+        if filename not in keep:
+            try:
+                os.remove(os.path.join(variant_dir, filename))
+            except OSError:
+                pass
+
+
+def ordered_variants(entry):
+    """(format, variants) pairs of a manifest entry, best compression first."""
+    return [(fmt, entry['variants'][fmt]) for fmt in FORMATS if entry['variants'].get(fmt)]
+
+
+def srcsets(entry):
+    """{format: srcset string} for one manifest entry."""
+    return {
+        fmt: ', '.join(f"{URL_PREFIX}{v['file']} {v['width']}w" for v in variants)
+        for fmt, variants in ordered_variants(entry)
+    }
+
+
+class ImageManifest:
+    """Manifest reader for the web process; re-reads the file when it changes."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._mtime = None
+        self._entries = {}
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._mtime, self._entries = None, {}
+            return
+        if mtime != self._mtime:
+            self._entries = load_manifest(self.path)
+            self._mtime = mtime
+
+    def images_for(self, name):
+        self._refresh()
+        entry = self._entries.get(name) if name else None
+        if not entry:
+            return None
+        largest = entry['variants']['jpeg'][-1] if entry['variants'].get('jpeg') else None
+        return {
+            "srcset": srcsets(entry),
+            "src": URL_PREFIX + largest['file'] if largest else None,
+            "width": entry['width'],
+            "height": entry['height'],
+        }
+
+
+def bench(width, source_dir=SOURCE_DIR, manifest_path=MANIFEST_PATH):
+    """Bytes a browser downloads to render every menu photo at ``width`` device pixels."""
+    manifest = load_manifest(manifest_path)
+    before = after = 0
+    for name in source_images(source_dir):
+        size = os.path.getsize(os.path.join(source_dir, name))
+        before += size
+        entry = manifest.get(name)
+        if not entry:
+            after += size
+            continue
+        # What the browser picks: first format in preference order, smallest width that covers the slot
+        variants = ordered_variants(entry)[0][1]
+        chosen = next((v for v in variants if v['width'] >= width), variants[-1])
+        after += chosen['bytes']
+    return {
+        "images": len(source_images(source_dir)),
+        "slot_width": width,
+        "bytes_before": before,
+        "bytes_after": after,
+        "reduction": round(1 - after / before, 4) if before else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_cmd = sub.add_parser('build', help='generate variants and manifest')
+    build_cmd.add_argument('--force', action='store_true', help='rebuild even if the source is unchanged')
+    bench_cmd = sub.add_parser('bench', help='compare full-menu image bytes before/after')
+    bench_cmd.add_argument('--width', type=int, default=640, help='rendered slot width in device pixels')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        built, total = build_all(force=args.force)
+        print(f"Built {built} of {total} images into {VARIANT_DIR}")
+    else:
+        print(json.dumps(bench(args.width), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+log = logging.getLogger(__name__)
+
+
+class ImageProxyError(Exception):
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+def public_address(address):
+    """True if ``address`` is routable on the internet (not loopback, private, link-local, ...)."""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class _PublicPeer:
+    # Checks the address the socket actually reached, before anything is sent on it. A separate
+    # lookup beforehand could be answered differently from the connect's own (DNS rebinding).
+    def _new_conn(self):
+        sock = super()._new_conn()
+        if not public_address(sock.getpeername()[0]):
+            sock.close()
+            raise ImageProxyError('Image host not allowed', 403)
+        return sock
+
+
+class PublicHTTPConnection(_PublicPeer, HTTPConnection):
+    pass
+
+
+class PublicHTTPSConnection(_PublicPeer, HTTPSConnection):
+    pass
+
+
+class PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = PublicHTTPConnection
+
+
+class PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = PublicHTTPSConnection
+
+
+class PublicOnlyAdapter(HTTPAdapter):
+    """Transport adapter that only connects to public addresses."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': PublicHTTPConnectionPool,
+                                                   'https': PublicHTTPSConnectionPool}
+
+
+class DiskCache:
+    """Size-bounded on-disk LRU of fetched images, keyed by URL.
+
+    Each entry is ``<sha256>.bin`` plus a ``.json`` sidecar holding the
+    content type. Hits bump the file mtime, and eviction removes the
+    least recently used entries once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {}
+        for name in os.listdir(directory):
+            if name.endswith('.part'):
+                # Left behind by a fetch interrupted by a crash
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+            elif name.endswith('.bin'):
+                try:
+                    self._sizes[name[:-4]] = os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    pass
+        self._total = sum(self._sizes.values())
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, key + ext)
+
+    def get(self, key):
+        """Return ``(path, content_type)`` for a cached entry, or None."""
+        path = self._path(key, '.bin')
+        try:
+            with open(self._path(key, '.json')) as f:
+                meta = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path, meta['content_type']
+
+    def temp_file(self):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        return os.fdopen(fd, 'wb'), tmp
+
+    def put(self, key, tmp_path, content_type):
+        size = os.path.getsize(tmp_path)
+        with open(self._path(key, '.json'), 'w') as f:
+            json.dump({"content_type": content_type, "stored_at": time.time()}, f)
+        os.replace(tmp_path, self._path(key, '.bin'))
+        with self._lock:
+            self._total += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for key in self._sizes:
+            try:
+                entries.append((os.path.getmtime(self._path(key, '.bin')), key))
+            except OSError:
+                entries.append((0, key))
+        entries.sort()
+        for _, key in entries:
+            if self._total <= self.max_bytes:
+                break
+            for ext in ('.bin', '.json'):
+                try:
+                    os.remove(self._path(key, ext))
+                except OSError:
+                    pass
+            self._total -= self._sizes.pop(key)
+
+
+class ImageProxy:
+    """Fetches remote images through a pooled session, caching them on disk.
+
+    With ``allowed_hosts`` only those hosts (and their subdomains) are
+    fetched from; without, any host on a public address, checked on each
+    connection as it is made. Redirects are followed by hand, up to
+    ``max_redirects``, and every hop is checked the same way.
+
+    At most ``max_in_flight`` upstream fetches run at once (None for no
+    cap); past that ``fetch`` fails fast with a 503 rather than tying up
+    another worker thread on a slow upstream.
+    """
+
+    def __init__(self, cache, allowed_hosts=None, connect_timeout=3.05, read_timeout=10,
+                 max_bytes=5 * 1024 * 1024, chunk_size=64 * 1024, pool_size=20, max_in_flight=None,
+                 max_redirects=3):
+        self.cache = cache
+        self.max_redirects = max_redirects
+        self.allowed_hosts = {h.lower() for h in allowed_hosts or ()}
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        adapter_class = HTTPAdapter if self.allowed_hosts else PublicOnlyAdapter
+        adapter = adapter_class(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'mirch-masala-image-proxy'
+
+        self.max_in_flight = max_in_flight
+        self._in_flight_lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def begin_fetch(self, max_in_flight=None):
+        """Claim an upstream fetch slot, or raise ImageProxyError (503) if the cap is reached.
+
+        ``max_in_flight`` overrides the proxy's own cap, for callers that
+        don't spend a thread per fetch.
+        """
+        limit = max_in_flight or self.max_in_flight
+        with self._in_flight_lock:
+            if limit and self.in_flight >= limit:
+                self.rejected += 1
+                raise ImageProxyError('Too many image fetches in progress', 503)
+            self.in_flight += 1
+
+    def end_fetch(self):
+        with self._in_flight_lock:
+            self.in_flight -= 1
+
+    def check_url(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ImageProxyError('Invalid image URL', 400)
+        host = parts.hostname.lower()
+        if self.allowed_hosts and not any(host == h or host.endswith('.' + h) for h in self.allowed_hosts):
+            raise ImageProxyError('Image host not allowed', 403)
+
+    def check_resolved(self, addresses):
+        # With no allowlist, refuse hosts that resolve into our own or the provider's network
+        if not self.allowed_hosts and not all(public_address(a) for a in addresses):
+            raise ImageProxyError('Image host not allowed', 403)
+
+    def cached(self, url):
+        return self.cache.get(DiskCache.key(url))
+
+    def fetch(self, url):
+        """Open ``url`` upstream and return ``(chunks, content_type)``.
+
+        ``chunks`` streams the body to the caller while writing it to the
+        cache; the entry is only kept if the whole body arrived. If it
+        doesn't (upstream fails, or the body passes ``max_bytes``), ``chunks``
+        raises so the server aborts the response instead of ending a
+        truncated image cleanly. It holds
+        a fetch slot: the caller calls ``end_fetch()`` once the response
+        is closed, whether or not ``chunks`` was consumed.
+        """
+        self.check_url(url)
+        self.begin_fetch()
+        try:
+            return self._open(url)
+        except BaseException:
+            self.end_fetch()
+            raise
+
+    def _open(self, url):
+        location = url
+        for _ in range(self.max_redirects + 1):
+            try:
+                upstream = self.session.get(location, stream=True, timeout=self.timeout, allow_redirects=False)
+            except requests.exceptions.Timeout as e:
+                raise ImageProxyError(f'Upstream timed out: {e}', 504)
+            except requests.exceptions.RequestException as e:
+                raise ImageProxyError(f'Upstream request failed: {e}', 502)
+            if not upstream.is_redirect:
+                break
+            upstream.close()
+            location = urljoin(location, upstream.headers['location'])
+            self.check_url(location)
+        else:
+            raise ImageProxyError('Too many redirects', 502)
+        if not upstream.ok:
+            upstream.close()
+            raise ImageProxyError(f'Upstream returned {upstream.status_code}', 502)
+
+        content_type = upstream.headers.get('content-type', '')
+        if not content_type.startswith('image/'):
+            upstream.close()
+            raise ImageProxyError('Upstream did not return an image', 415)
+        length = upstream.headers.get('content-length')
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            upstream.close()
+            raise ImageProxyError('Image too large', 413)
+
+        return self._stream(url, upstream, content_type), content_type
+
+    def _stream(self, url, upstream, content_type):
+        out, tmp = self.cache.temp_file()
+        received = 0
+        complete = False
+        try:
+            for chunk in upstream.iter_content(chunk_size=self.chunk_size):
+                received += len(chunk)
+                if received > self.max_bytes:
+                    log.warning("Image exceeded size limit, aborting",
+                                extra={"fields": {"url": url, "max_bytes": self.max_bytes}})
+                    raise ImageProxyError('Image too large', 413)
+                out.write(chunk)
+                yield chunk
+            complete = True
+        except requests.exceptions.RequestException as e:
+            log.warning("Upstream image stream failed", extra={"fields": {"url": url, "error": str(e)}})
+            raise ImageProxyError(f'Upstream stream failed: {e}', 502)
+        finally:
+            upstream.close()
+            out.close()
+            if complete:
+                self.cache.put(DiskCache.key(url), tmp, content_type)
+            else:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
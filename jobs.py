@@ -0,0 +1,197 @@
+"""Background jobs backed by a durable SQLite journal.
+
+Work that doesn't have to finish before the response (activity log
+rows) is enqueued by name with a JSON payload. Anything the request's
+own data depends on belongs in the request's transaction instead.
+``enqueue`` commits the job to the journal before returning, and a few
+worker threads per process run due jobs. A failing job is retried with
+exponential backoff and jitter; after ``max_attempts`` it stays in the
+journal as 'failed' for inspection.
+
+Claimed jobs hold a lease. If the process running one dies, the job
+becomes claimable again when the lease runs out, by any process sharing
+the journal file. Delivery is at least once, so handlers must be
+idempotent.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, run_at);
+"""
+
+
+class JobQueue:
+    def __init__(self, path=None, workers=2, max_attempts=8, backoff_base=1.0, backoff_max=300.0,
+                 lease_seconds=60.0, poll_interval=1.0, synchronous='NORMAL'):
+        # Beside the app by default: the temp directory is often tmpfs or cleared on reboot
+        self.path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jobs', 'jobs.db')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # NORMAL survives a process crash; FULL also survives power loss, at an fsync per enqueue
+        self.synchronous = synchronous
+        self._handlers = {}
+        self._local = threading.local()
+        self._start_lock = threading.Lock()
+        self._reset()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.stop)
+
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _reset(self):
+        # Threads and SQLite connections don't survive fork; children start their own
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def handler(self, name):
+        """Decorator registering ``fn(payload)`` as the handler for jobs called ``name``."""
+        def register(fn):
+            self._handlers[name] = fn
+            return fn
+        return register
+
+    def enqueue(self, name, payload, delay=0.0):
+        """Durably record a job; returns its id once committed."""
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO jobs (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+            (name, json.dumps(payload, default=str), now + delay, now))
+        self.start()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def start(self):
+        """Start this process's worker threads (idempotent)."""
+        if self._threads or self.workers <= 0:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'jobs-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Stop the workers; a job still running is picked up again after its lease."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def _claim(self):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running' AND lease_until <= ?",
+                         (now,))
+            row = conn.execute("""
+                SELECT id, name, payload, attempts FROM jobs
+                WHERE status = 'pending' AND run_at <= ?
+                ORDER BY run_at LIMIT 1
+            """, (now,)).fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ? "
+                             "WHERE id = ?", (now + self.lease_seconds, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _work(self):
+        stopping = self._stopping
+        while not stopping.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                log.exception("Job journal error")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(*job)
+
+    def _run(self, job_id, name, payload, attempts):
+        attempts += 1
+        started = time.perf_counter()
+        try:
+            handler = self._handlers.get(name)
+            if handler is None:
+                raise LookupError(f"no handler for job {name!r}")
+            handler(json.loads(payload))
+        except Exception as e:
+            self._failed(job_id, name, attempts, e)
+            return
+        self._connect().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        self.completed += 1
+        log.debug("Job done", extra={"fields": {"job": name, "job_id": job_id, "attempts": attempts,
+                                                "ms": round((time.perf_counter() - started) * 1000, 1)}})
+
+    def _failed(self, job_id, name, attempts, error):
+        fields = {"job": name, "job_id": job_id, "attempts": attempts, "error": str(error)}
+        if attempts >= self.max_attempts:
+            self._connect().execute("UPDATE jobs SET status = 'failed', last_error = ?, lease_until = NULL "
+                                    "WHERE id = ?", (repr(error), job_id))
+            self.failed += 1
+            log.error("Job failed permanently", exc_info=error, extra={"fields": fields})
+            return
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        self._connect().execute("UPDATE jobs SET status = 'pending', run_at = ?, last_error = ?, "
+                                "lease_until = NULL WHERE id = ?", (time.time() + delay, repr(error), job_id))
+        self.retried += 1
+        log.warning("Job failed, will retry", extra={"fields": dict(fields, retry_in_s=round(delay, 1))})
+
+    def counts(self):
+        """Journal rows by status: pending, running, failed."""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict({'pending': 0, 'running': 0, 'failed': 0}, **dict(rows))
+
+    def retry_failed(self):
+        """Make every permanently failed job due again; returns how many."""
+        cursor = self._connect().execute("UPDATE jobs SET status = 'pending', attempts = 0, run_at = ? "
+                                         "WHERE status = 'failed'", (time.time(),))
+        return cursor.rowcount
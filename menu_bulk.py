@@ -0,0 +1,178 @@
+"""Bulk menu import and export as CSV or JSON, parsed and produced incrementally.
+
+Import input is read from a binary stream a chunk or line at a time, so a
+large upload is never held as one string:
+
+    CSV   a header row naming the columns, then one item per row
+    JSON  an array of objects, or newline-delimited objects
+
+Columns/keys are those of ``FIELDS`` (``name`` is accepted for
+``item_name``, as in the admin API). A row with an ``item_id`` updates
+that item (or creates it with that id); one without creates a new item.
+``clean_row`` validates one row into the tuple order of ``FIELDS``.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+FIELDS = ('item_id', 'item_name', 'description', 'category', 'price', 'availability', 'image')
+MAX_PRICE = Decimal('99999999.99')
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n'}
+CHUNK_SIZE = 64 * 1024
+MAX_ITEM_CHARS = 64 * 1024
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def clean_row(raw):
+    """Validate one input row; returns a tuple in FIELDS order or raises ValueError."""
+    if not isinstance(raw, dict):
+        raise ValueError("row must be an object")
+
+    item_id = _text(raw.get('item_id'))
+    if item_id:
+        if not item_id.isdigit() or int(item_id) < 1:
+            raise ValueError("item_id must be a positive integer")
+        item_id = int(item_id)
+    else:
+        item_id = None
+
+    name = _text(raw.get('item_name', raw.get('name')))
+    if not name or len(name) > 150:
+        raise ValueError("item_name is required (at most 150 characters)")
+    category = _text(raw.get('category'))
+    if not category or len(category) > 100:
+        raise ValueError("category is required (at most 100 characters)")
+    description = _text(raw.get('description'))
+
+    try:
+        price = Decimal(_text(raw.get('price')))
+    except InvalidOperation:
+        raise ValueError("price must be a number")
+    if not price.is_finite() or price < 0 or price > MAX_PRICE or price.as_tuple().exponent < -2:
+        raise ValueError("price must be between 0 and 99999999.99 with at most 2 decimals")
+
+    availability = raw.get('availability', True)
+    if not isinstance(availability, bool):
+        flag = _text(availability).lower()
+        if flag not in TRUE_VALUES | FALSE_VALUES | {''}:
+            raise ValueError("availability must be true or false")
+        availability = flag not in FALSE_VALUES
+
+    image = _text(raw.get('image')) or None
+    if image and (os.path.basename(image) != image or len(image) > 255):
+        raise ValueError("image must be a file name under static/images/menu")
+
+    return item_id, name, description, category, price, availability, image
+
+
+def _lines(stream):
+    # Whole lines from fixed-size reads; iterating a WSGI input stream line by line is far slower
+    pending = b''
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = (pending + chunk).splitlines(keepends=True)
+        pending = b'' if lines[-1].endswith(b'\n') else lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def parse_csv(stream):
+    """Rows of a CSV upload as dicts; raises ValueError on a malformed file."""
+    lines = codecs.iterdecode(_lines(stream), 'utf-8-sig')
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames:
+        return
+    missing = {'category', 'price'} - set(reader.fieldnames)
+    if missing or not {'item_name', 'name'} & set(reader.fieldnames):
+        raise ValueError("CSV header needs item_name (or name), category and price columns")
+    try:
+        yield from reader
+    except csv.Error as e:
+        raise ValueError(f"malformed CSV at line {reader.line_num}: {e}")
+
+
+def parse_json(stream):
+    """Objects of a JSON array or newline-delimited JSON upload, decoded as chunks arrive."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    opened = closed = False
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        buffer += text.decode(chunk or b'', final=not chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+                pos += 1
+            if pos == len(buffer):
+                break
+            if closed:
+                raise ValueError("unexpected data after the closing ]")
+            if buffer[pos] == '[' and not opened:
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == ']' and opened:
+                closed = True
+                pos += 1
+                continue
+            if buffer[pos] != '{':
+                raise ValueError("expected a JSON object per item")
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise ValueError("malformed or truncated JSON")
+                if len(buffer) - pos > MAX_ITEM_CHARS:
+                    raise ValueError("malformed JSON or item too large")
+                break  # object continues in the next chunk
+            yield obj
+        buffer = buffer[pos:]
+        if not chunk:
+            break
+    if opened and not closed:
+        raise ValueError("JSON array is not closed")
+
+
+def _export_row(item):
+    return {field: item.get(field) for field in FIELDS}
+
+
+def export_csv(items, rows_per_chunk=500):
+    """CSV text of ``items`` in chunks, header first."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(FIELDS)
+    for n, item in enumerate(items, 1):
+        row = _export_row(item)
+        row['availability'] = int(bool(row['availability']))
+        writer.writerow(['' if row[field] is None else row[field] for field in FIELDS])
+        if n % rows_per_chunk == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+def export_json(items, rows_per_chunk=500):
+    """A JSON array of ``items`` in chunks."""
+    parts = ['[']
+    for n, item in enumerate(items):
+        row = _export_row(item)
+        row['availability'] = bool(row['availability'])
+        parts.append((',\n' if n else '\n') + json.dumps(row, default=str))
+        if len(parts) >= rows_per_chunk:
+            yield ''.join(parts)
+            parts = []
+    parts.append('\n]\n')
+    yield ''.join(parts)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from menu_search import MenuIndex
+
+log = logging.getLogger(__name__)
+
+
+class MenuSnapshot:
+    """Immutable view of the whole menu, grouped by category and keyed by id."""
+
+    # Cap on memoised derived values (e.g. encoded responses per query); keys can
+    # come straight from query strings, so the least recently used are dropped
+    max_memo_entries = 256
+
+    def __init__(self, items):
+        self.items = items
+        self.by_id = {item['item_id']: item for item in items}
+        self.by_category = {}
+        for item in items:
+            self.by_category.setdefault(item.get('category') or '', []).append(item)
+        # Lower-cased category names and their leading words ("paneer" for "Paneer Specials"),
+        # as the category buttons send them: the bounded set of plain category views
+        self.category_keys = {'all'}
+        for category in self.by_category:
+            words = category.lower().split()
+            self.category_keys.update(' '.join(words[:n]) for n in range(1, len(words) + 1))
+        # Content hash, so every worker that loaded the same rows agrees on it
+        payload = json.dumps(items, sort_keys=True, default=str).encode()
+        self.version = hashlib.sha1(payload).hexdigest()[:16]
+        self.loaded_at = time.time()
+        self._memo = OrderedDict()
+        self._kept = {}
+        self._memo_lock = threading.Lock()
+
+    def memo(self, key, factory, keep=False):
+        """Return ``factory()``, computed once per snapshot for ``key``.
+
+        Entries are kept least recently used first, up to ``max_memo_entries``;
+        ``keep=True`` is for keys from a small fixed set, which are never evicted.
+        """
+        memo = self._kept if keep else self._memo
+        with self._memo_lock:
+            if key in memo:
+                if not keep:
+                    memo.move_to_end(key)
+                return memo[key]
+        value = factory()
+        with self._memo_lock:
+            value = memo.setdefault(key, value)
+            if not keep:
+                memo.move_to_end(key)
+                while len(memo) > self.max_memo_entries:
+                    memo.popitem(last=False)
+        return value
+
+    @property
+    def index(self):
+        return self.memo('index', lambda: MenuIndex(self.items), keep=True)
+
+    def filter(self, category=None, **query):
+        """Items matching ``category`` and any MenuIndex.search filters."""
+        return self.index.search(category=category, **query)
+
+
+class MenuCache:
+    """In-process menu cache with TTL fallback and a shared invalidation file.
+
+    ``loader`` returns the full list of menu rows. Writers call
+    ``invalidate()``, which drops the local snapshot and rewrites the
+    version file so other worker processes reload on their next check.
+    """
+
+    def __init__(self, loader, ttl=300.0, version_file=None, check_interval=1.0):
+        self._loader = loader
+        self.ttl = ttl
+        self.version_file = version_file or os.path.join(tempfile.gettempdir(), 'mirch_masala_menu.version')
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._token = None
+        self._checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and self._fresh(snapshot):
+            self.hits += 1
+            return snapshot
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot is not None and self._fresh(snapshot):
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            token = self._read_token()
+            try:
+                snapshot = MenuSnapshot(self._loader())
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                log.warning("Menu reload failed, serving stale menu", extra={"fields": {"error": str(e)}})
+                return self._snapshot
+            self._snapshot = snapshot
+            self._token = token
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._write_token()
+
+    def _fresh(self, snapshot):
+        if time.time() - snapshot.loaded_at > self.ttl:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return True
+        self._checked_at = now
+        return self._read_token() == self._token
+
+    def _read_token(self):
+        try:
+            with open(self.version_file) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _write_token(self):
+        token = f"{time.time_ns()}-{os.getpid()}"
+        tmp = f"{self.version_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                f.write(token)
+            os.replace(tmp, self.version_file)
+        except OSError as e:
+            log.error("Could not write menu version file", extra={"fields": {"error": str(e)}})
@@ -0,0 +1,107 @@
+import re
+from bisect import bisect_left, bisect_right
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+SORT_KEYS = {
+    'price': lambda item: (float(item['price'] or 0), item['item_id']),
+    'name': lambda item: ((item.get('item_name') or '').lower(), item['item_id']),
+}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class MenuIndex:
+    """Precomputed lookup structures over one menu snapshot.
+
+    Built once per menu version, so filtering costs set intersections and
+    bisects rather than a scan of every item:
+    - category -> item ids (exact, case-insensitive)
+    - inverted index of item_name/description tokens, searched by prefix
+    - items sorted by price for range queries
+    - per-sort-key rank tables
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.by_id = {item['item_id']: item for item in items}
+        self.order = {item['item_id']: i for i, item in enumerate(items)}
+
+        self.categories = {}
+        for item in items:
+            self.categories.setdefault((item.get('category') or '').lower(), set()).add(item['item_id'])
+
+        postings = {}
+        for item in items:
+            for token in set(tokenize(item.get('item_name')) + tokenize(item.get('description'))):
+                postings.setdefault(token, set()).add(item['item_id'])
+        self.tokens = sorted(postings)
+        self.postings = postings
+
+        by_price = sorted(items, key=SORT_KEYS['price'])
+        self.prices = [float(item['price'] or 0) for item in by_price]
+        self.price_ids = [item['item_id'] for item in by_price]
+
+        self.available = {item['item_id'] for item in items if item.get('availability', 1)}
+
+        self.ranks = {}
+        for name, key in SORT_KEYS.items():
+            ranked = sorted(items, key=key)
+            self.ranks[name] = {item['item_id']: i for i, item in enumerate(ranked)}
+
+    def category_ids(self, category):
+        needle = category.lower()
+        if needle in self.categories:
+            return self.categories[needle]
+        # Short names from the category buttons ("Paneer" for "Paneer Specials"):
+        # match against the handful of distinct category names, not the items
+        ids = set()
+        for name, members in self.categories.items():
+            if needle in name:
+                ids |= members
+        return ids
+
+    def text_ids(self, query):
+        # Every query token must match (as a prefix) some token of the item
+        ids = None
+        for term in tokenize(query):
+            start = bisect_left(self.tokens, term)
+            end = bisect_left(self.tokens, term + '\uffff', start)
+            matched = set()
+            for token in self.tokens[start:end]:
+                matched |= self.postings[token]
+            ids = matched if ids is None else ids & matched
+            if not ids:
+                break
+        return ids if ids is not None else set(self.by_id)
+
+    def price_ids_between(self, min_price, max_price):
+        start = bisect_left(self.prices, min_price) if min_price is not None else 0
+        end = bisect_right(self.prices, max_price) if max_price is not None else len(self.prices)
+        return set(self.price_ids[start:end])
+
+    def search(self, category=None, q=None, min_price=None, max_price=None, available=None, sort=None):
+        ids = None
+
+        def narrow(subset):
+            return subset if ids is None else ids & subset
+
+        if category and category != 'all':
+            ids = narrow(self.category_ids(category))
+        if q:
+            ids = narrow(self.text_ids(q))
+        if min_price is not None or max_price is not None:
+            ids = narrow(self.price_ids_between(min_price, max_price))
+        if available is not None:
+            ids = narrow(self.available) if available else narrow(set(self.by_id) - self.available)
+
+        if ids is None and not sort:
+            return self.items
+        if ids is None:
+            ids = self.by_id.keys()
+
+        descending = bool(sort) and sort.startswith('-')
+        ranks = self.ranks[sort.lstrip('-')] if sort else self.order
+        return [self.by_id[i] for i in sorted(ids, key=ranks.__getitem__, reverse=descending)]
@@ -0,0 +1,250 @@
+"""In-process metrics with Prometheus text exposition.
+
+Histograms and counters are kept per process; gauges are read from the
+pool and caches at scrape time. Under gunicorn each worker keeps its own
+numbers, so scrape the workers individually (or label by pod) rather
+than expecting totals from one /metrics hit.
+
+DB work is measured by wrapping connections (``instrument``): every
+cursor execute adds to the current request's ``RequestStats`` and slow
+statements are logged with their parameters redacted.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+SLOW_QUERY_SECONDS = 0.2
+
+_WHITESPACE = re.compile(r"\s+")
+
+log = logging.getLogger(__name__)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = (('le', _number(bound)),)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value(s) computed at scrape time: ``fn()`` returns a number or {label value: number}."""
+
+    def __init__(self, name, help, fn, labelname=None, type='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelname = labelname
+        self.type = type
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            value = self.fn()
+        except Exception:
+            return lines
+        if isinstance(value, dict):
+            for label, number in sorted(value.items()):
+                lines.append(f"{self.name}{_labels((self.labelname,), (label,))} {_number(number)}")
+        elif value is not None:
+            lines.append(f"{self.name} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """DB work done on behalf of one request."""
+
+    __slots__ = ('started', 'queries', 'db_seconds', 'pool_wait_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        total = self.elapsed()
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        if self.pool_wait_seconds:
+            parts.append(f"pool;dur={self.pool_wait_seconds * 1000:.1f}")
+        parts.append(f"app;dur={max(total - self.db_seconds - self.pool_wait_seconds, 0) * 1000:.1f}")
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ', '.join(parts)
+
+
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, current_request.set(stats)
+
+
+def end_request(token):
+    current_request.reset(token)
+
+
+def redact(sql):
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, observer):
+        self._cursor = cursor
+        self._observer = observer
+
+    def _timed(self, method, sql, params):
+        start = time.perf_counter()
+        try:
+            return method(sql, params) if params is not None else method(sql)
+        finally:
+            self._observer(sql, params, time.perf_counter() - start)
+
+    def execute(self, sql, params=None):
+        return self._timed(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_params):
+        return self._timed(self._cursor.executemany, sql, seq_params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, observer):
+        self._conn = conn
+        self._observer = observer
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._observer)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class DBMetrics:
+    """Query counters/histograms plus the per-request accounting behind Server-Timing."""
+
+    def __init__(self, registry, slow_query_seconds=SLOW_QUERY_SECONDS):
+        self.slow_query_seconds = slow_query_seconds
+        self.query_seconds = registry.histogram(
+            'db_query_duration_seconds', 'Time spent in a single DB statement', ('statement',))
+        self.slow_queries = registry.counter('db_slow_queries_total', 'Statements slower than the slow-query threshold')
+
+    def instrument(self, conn):
+        return InstrumentedConnection(conn, self.observe)
+
+    def observe(self, sql, params, seconds):
+        statement = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'UNKNOWN'
+        self.query_seconds.observe(seconds, statement=statement)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+        if seconds >= self.slow_query_seconds:
+            self.slow_queries.inc()
+            # Statement text only: parameters can hold emails, phone numbers, addresses
+            count = len(params) if isinstance(params, (list, tuple)) else (0 if params is None else 1)
+            log.warning("Slow query", extra={"fields": {"ms": round(seconds * 1000, 1), "sql": redact(sql),
+                                                        "params": f"{count} redacted"}})
@@ -0,0 +1,302 @@
+"""Versioned schema migrations, and an EXPLAIN check of the app's queries.
+
+    python migrate.py status
+    python migrate.py up [--to VERSION]
+    python migrate.py down [--to VERSION]
+    python migrate.py check [--show]
+
+Migrations are migrations/NNNN_name.sql files with a ``-- migrate:up``
+and a ``-- migrate:down`` section of ;-terminated statements. Applied
+versions are recorded in the schema_migrations table, and a named lock
+keeps two deploys from migrating at once. MySQL commits DDL implicitly,
+so a migration is not atomic: it is recorded only after all of its
+statements succeed, and a failed one is re-run from the start.
+
+``down`` without --to reverts only the latest migration.
+
+``check`` parses app.py and queries.py for the SQL they execute, runs
+EXPLAIN on each SELECT/UPDATE/DELETE with placeholder values, and exits
+1 if any of them reads a whole table that has no usable index. Run it
+against a database with realistic data: on near-empty tables MySQL may
+prefer a scan even where an index exists, which is reported as a warning.
+"""
+import argparse
+import ast
+import os
+import re
+import sys
+from datetime import datetime
+
+import mysql.connector
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(BASE_DIR, 'migrations')
+QUERY_SOURCES = ('app.py', 'queries.py')
+LOCK_NAME = 'mirch_masala_migrations'
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME')
+}
+
+# Queries that read a whole table on purpose
+FULL_SCAN_OK = {
+    "SELECT * FROM menu ORDER BY item_id": "the menu cache loads the whole menu",
+}
+
+
+class MigrationError(Exception):
+    pass
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """[(version, name, up_statements, down_statements)] sorted by version."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = re.match(r'(\d+)_(\w+)\.sql$', filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            text = f.read()
+        _, up_marker, rest = text.partition('-- migrate:up')
+        up, down_marker, down = rest.partition('-- migrate:down')
+        if not up_marker or not down_marker:
+            raise MigrationError(f"{filename}: needs '-- migrate:up' and '-- migrate:down' sections")
+        migrations.append((int(match.group(1)), match.group(2), split_statements(up), split_statements(down)))
+    versions = [m[0] for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError(f"duplicate migration versions in {directory}")
+    return migrations
+
+
+def split_statements(sql):
+    statements = []
+    for chunk in re.split(r';\s*$', sql, flags=re.MULTILINE):
+        lines = [line for line in chunk.splitlines() if not line.strip().startswith('--')]
+        statement = '\n'.join(lines).strip()
+        if statement:
+            statements.append(statement)
+    return statements
+
+
+def ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        ) ENGINE=InnoDB
+    """)
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def run_statements(conn, cursor, version, name, statements):
+    for n, statement in enumerate(statements, 1):
+        try:
+            cursor.execute(statement)
+        except mysql.connector.Error as err:
+            conn.rollback()
+            raise MigrationError(f"{version:04d}_{name}: statement {n} failed: {err}\n{statement}")
+    conn.commit()
+
+
+def migrate_up(conn, migrations, target=None):
+    cursor = conn.cursor()
+    done = set(applied_versions(cursor))
+    for version, name, up, _ in migrations:
+        if version in done or (target is not None and version > target):
+            continue
+        print(f"Applying {version:04d}_{name}")
+        run_statements(conn, cursor, version, name, up)
+        cursor.execute("INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                       (version, name, datetime.now()))
+        conn.commit()
+    cursor.close()
+
+
+def migrate_down(conn, migrations, target=None):
+    cursor = conn.cursor()
+    done = applied_versions(cursor)
+    if target is None:
+        target = done[-2] if len(done) > 1 else 0
+    by_version = {m[0]: m for m in migrations}
+    for version in reversed(done):
+        if version <= target:
+            break
+        if version not in by_version:
+            raise MigrationError(f"version {version} is applied but migrations/ has no file for it")
+        _, name, _, down = by_version[version]
+        print(f"Reverting {version:04d}_{name}")
+        run_statements(conn, cursor, version, name, down)
+        cursor.execute("DELETE FROM schema_migrations WHERE version = %s", (version,))
+        conn.commit()
+    cursor.close()
+
+
+def print_status(conn, migrations):
+    cursor = conn.cursor()
+    done = set(applied_versions(cursor))
+    cursor.close()
+    for version, name, _, _ in migrations:
+        print(f"{'applied' if version in done else 'pending':8} {version:04d}_{name}")
+    for version in sorted(done - {m[0] for m in migrations}):
+        print(f"{'unknown':8} {version:04d} (applied, no file)")
+
+
+# --- EXPLAIN check ---
+
+def _static_sql(node, constants):
+    """The SQL text of an execute() argument, with f-string parts as a two-value IN list."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        return constants.get(node.id)
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            else:
+                parts.append('%s, %s')
+        return ''.join(parts)
+    return None
+
+
+def source_queries(path):
+    """[(lineno, sql)] for SQL passed to execute()/executemany() or yielded by a query plan."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    constants = {}
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)):
+            constants[node.targets[0].id] = node.value.value
+
+    found = []
+    for node in ast.walk(tree):
+        arg = None
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr in ('execute', 'executemany') and node.args):
+            arg = node.args[0]
+        elif isinstance(node, ast.Yield) and isinstance(node.value, ast.Tuple) and node.value.elts:
+            arg = node.value.elts[0]
+        sql = _static_sql(arg, constants) if arg is not None else None
+        if sql:
+            found.append((node.lineno, ' '.join(sql.split())))
+    return sorted(found)
+
+
+def sample_params(sql):
+    """Plausibly typed values for each %s, judged by the column it is compared with."""
+    params = []
+    pieces = sql.split('%s')
+    for before in pieces[:-1]:
+        column = re.search(r'(\w+)\s*(?:=|<|>|<=|>=)\s*$', before)
+        name = column.group(1).lower() if column else ''
+        if 'date' in name or 'time' in name or name.endswith('_at'):
+            params.append(datetime(2026, 1, 1))
+        elif re.search(r'LIMIT\s*$', before, re.IGNORECASE) or not name or name.endswith('id') \
+                or name in ('quantity', 'price'):
+            params.append(1)
+        else:
+            params.append('x')
+    return tuple(params)
+
+
+def explain_problems(rows):
+    """(failures, warnings) for the rows of one EXPLAIN."""
+    failures, warnings = [], []
+    for row in rows:
+        if not row.get('table') or row.get('type') not in ('ALL', 'index'):
+            continue
+        scan = 'full table scan' if row['type'] == 'ALL' else 'full index scan'
+        if row.get('possible_keys'):
+            warnings.append(f"{row['table']}: {scan} chosen over {row['possible_keys']} (table too small?)")
+        else:
+            failures.append(f"{row['table']}: {scan}, no usable index")
+    return failures, warnings
+
+
+def check_queries(conn, show=False):
+    queries = []
+    for source in QUERY_SOURCES:
+        for lineno, sql in source_queries(os.path.join(BASE_DIR, source)):
+            if re.match(r'(SELECT|UPDATE|DELETE)\b', sql, re.IGNORECASE):
+                queries.append((f"{source}:{lineno}", sql))
+
+    cursor = conn.cursor(dictionary=True)
+    failed = 0
+    for where, sql in queries:
+        cursor.execute("EXPLAIN " + sql, sample_params(sql))
+        rows = cursor.fetchall()
+        failures, warnings = explain_problems(rows)
+        if sql in FULL_SCAN_OK:
+            warnings, failures = [f"expected: {FULL_SCAN_OK[sql]}"], []
+        status = 'FAIL' if failures else 'warn' if warnings else 'ok'
+        failed += bool(failures)
+        if show or failures or warnings:
+            print(f"{status:4} {where}  {sql[:100]}")
+            for line in failures + warnings:
+                print(f"       {line}")
+            if show:
+                for row in rows:
+                    print(f"       {row.get('table')}: type={row.get('type')} key={row.get('key')} "
+                          f"rows={row.get('rows')} {row.get('Extra') or ''}")
+    conn.rollback()
+    cursor.close()
+    print(f"{len(queries)} queries explained, {failed} without a usable index")
+    return failed == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help='list migrations and whether they are applied')
+    up = commands.add_parser('up', help='apply pending migrations')
+    up.add_argument('--to', type=int, help='stop after this version')
+    down = commands.add_parser('down', help='revert the latest migration')
+    down.add_argument('--to', type=int, help='revert everything after this version (0 for all)')
+    check = commands.add_parser('check', help="EXPLAIN the app's queries and fail on unindexed scans")
+    check.add_argument('--show', action='store_true', help='print every plan, not only problems')
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    try:
+        if args.command == 'check':
+            sys.exit(0 if check_queries(conn, show=args.show) else 1)
+
+        migrations = load_migrations()
+        cursor.execute("SELECT GET_LOCK(%s, 30)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            raise MigrationError("another migration run holds the lock")
+        try:
+            ensure_version_table(cursor)
+            if args.command == 'status':
+                print_status(conn, migrations)
+            elif args.command == 'up':
+                migrate_up(conn, migrations, args.to)
+            elif args.command == 'down':
+                migrate_down(conn, migrations, args.to)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchall()
+    except MigrationError as err:
+        print(f"Migration error: {err}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
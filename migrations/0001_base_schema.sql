@@ -0,0 +1,91 @@
+-- Tables the app reads and writes. IF NOT EXISTS so an existing database
+-- (created by hand before migrations) can run this as its baseline; the
+-- indexes live in 0002 so they are added to such a database too.
+
+-- migrate:up
+CREATE TABLE IF NOT EXISTS users (
+    user_id INT NOT NULL AUTO_INCREMENT,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    phone_number VARCHAR(20),
+    password VARCHAR(255) NOT NULL,
+    address TEXT,
+    user_type VARCHAR(20) NOT NULL DEFAULT 'customer',
+    PRIMARY KEY (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS menu (
+    item_id INT NOT NULL AUTO_INCREMENT,
+    item_name VARCHAR(150) NOT NULL,
+    description TEXT,
+    category VARCHAR(100),
+    price DECIMAL(10, 2) NOT NULL,
+    availability TINYINT(1) NOT NULL DEFAULT 1,
+    image VARCHAR(255),
+    PRIMARY KEY (item_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS cart (
+    cart_id INT NOT NULL AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    item_id INT NOT NULL,
+    quantity INT NOT NULL DEFAULT 1,
+    PRIMARY KEY (cart_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INT NOT NULL AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    order_date DATETIME NOT NULL,
+    total_price DECIMAL(10, 2) NOT NULL,
+    payment_mode VARCHAR(50),
+    status VARCHAR(30) NOT NULL DEFAULT 'pending',
+    PRIMARY KEY (order_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS order_items (
+    order_item_id INT NOT NULL AUTO_INCREMENT,
+    order_id INT NOT NULL,
+    item_id INT NOT NULL,
+    quantity INT NOT NULL,
+    subtotal DECIMAL(10, 2) NOT NULL,
+    PRIMARY KEY (order_item_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS payments (
+    payment_id INT NOT NULL AUTO_INCREMENT,
+    order_id INT NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    payment_method VARCHAR(50),
+    transaction_status VARCHAR(30),
+    payment_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (payment_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS delivery_info (
+    delivery_id INT NOT NULL AUTO_INCREMENT,
+    order_id INT NOT NULL,
+    delivery_address TEXT,
+    delivery_status VARCHAR(30),
+    estimated_time DATETIME,
+    PRIMARY KEY (delivery_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Idempotency keys for POST /api/orders; the primary key is what makes a retry collide
+CREATE TABLE IF NOT EXISTS order_requests (
+    user_id INT NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL,
+    order_id INT,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, idempotency_key)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- migrate:down
+DROP TABLE IF EXISTS order_requests;
+DROP TABLE IF EXISTS delivery_info;
+DROP TABLE IF EXISTS payments;
+DROP TABLE IF EXISTS order_items;
+DROP TABLE IF EXISTS orders;
+DROP TABLE IF EXISTS cart;
+DROP TABLE IF EXISTS menu;
+DROP TABLE IF EXISTS users;
@@ -0,0 +1,49 @@
+-- Secondary indexes for the queries on the request path (see `migrate.py check`).
+-- No foreign keys: InnoDB may silently drop an index it created for one when
+-- a covering index is added, which makes these indexes impossible to drop again,
+-- and deleting a menu item must not be blocked by old order lines.
+
+-- migrate:up
+-- login and signup look users up by email; unique so a signup race can't create two accounts
+ALTER TABLE users
+    MODIFY password VARCHAR(255) NOT NULL,
+    ADD UNIQUE INDEX uq_users_email (email);
+
+-- Older databases may hold duplicate cart rows from before the upsert; fold them
+-- into the oldest row so the unique index the upsert depends on can be built
+UPDATE cart c
+JOIN (
+    SELECT user_id, item_id, MIN(cart_id) AS keep_id, SUM(quantity) AS quantity
+    FROM cart
+    GROUP BY user_id, item_id
+    HAVING COUNT(*) > 1
+) d ON c.cart_id = d.keep_id
+SET c.quantity = d.quantity;
+
+DELETE c FROM cart c
+JOIN cart k ON c.user_id = k.user_id AND c.item_id = k.item_id AND c.cart_id > k.cart_id;
+
+-- ON DUPLICATE KEY UPDATE in the cart upsert needs this key; user_id alone is its prefix
+ALTER TABLE cart ADD UNIQUE INDEX uq_cart_user_item (user_id, item_id);
+
+-- Order history: newest first per user, keyset on (order_date, order_id);
+-- InnoDB appends the primary key to secondary indexes, so order_id is covered
+ALTER TABLE orders ADD INDEX idx_orders_user_date (user_id, order_date);
+
+ALTER TABLE order_items ADD INDEX idx_order_items_order (order_id);
+
+ALTER TABLE payments ADD INDEX idx_payments_order (order_id);
+
+ALTER TABLE delivery_info ADD INDEX idx_delivery_info_order (order_id);
+
+ALTER TABLE menu ADD INDEX idx_menu_category (category);
+
+-- migrate:down
+-- password stays VARCHAR(255): hashed rows would not fit a narrower column
+ALTER TABLE menu DROP INDEX idx_menu_category;
+ALTER TABLE delivery_info DROP INDEX idx_delivery_info_order;
+ALTER TABLE payments DROP INDEX idx_payments_order;
+ALTER TABLE order_items DROP INDEX idx_order_items_order;
+ALTER TABLE orders DROP INDEX idx_orders_user_date;
+ALTER TABLE cart DROP INDEX uq_cart_user_item;
+ALTER TABLE users DROP INDEX uq_users_email;
@@ -0,0 +1,15 @@
+-- Activity log written by the order_placed background job (jobs.py)
+
+-- migrate:up
+CREATE TABLE IF NOT EXISTS logs (
+    log_id INT NOT NULL AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    action VARCHAR(100) NOT NULL,
+    order_id INT,
+    timestamp DATETIME NOT NULL,
+    PRIMARY KEY (log_id),
+    INDEX idx_logs_user (user_id, timestamp)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- migrate:down
+DROP TABLE IF EXISTS logs;
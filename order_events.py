@@ -0,0 +1,184 @@
+"""In-process pub/sub of order status changes, for Server-Sent Event streams.
+
+Writers call ``publish(event)`` after committing a change. The event
+goes to the subscriptions for its ``user_id`` and to the all-orders
+subscriptions (``user_id=None``, the kitchen/admin view), immediately
+in this process. With a ``path``, events are also appended to a shared
+file that other worker processes with open streams tail (at most every
+``check_interval`` seconds), the way revoked tokens are shared. The file
+is rotated to ``<path>.1`` past ``max_file_bytes``.
+
+Each subscription buffers at most ``max_queued`` events. A consumer that
+falls that far behind is marked ``overflowed`` instead of slowing the
+publisher; its stream should tell the client to refetch and close.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, user_id, max_queued, notify=None):
+        self.user_id = user_id
+        self.max_queued = max_queued
+        self.overflowed = False
+        self._events = deque()
+        self._notify = notify
+
+    def push(self, event):
+        # Called from publisher threads; deque append/popleft are thread-safe
+        if len(self._events) >= self.max_queued:
+            self.overflowed = True
+        else:
+            self._events.append(event)
+        if self._notify is not None:
+            self._notify()
+
+    def drain(self):
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+
+class OrderEvents:
+    def __init__(self, path=None, max_queued=100, check_interval=0.5, max_file_bytes=1 << 20):
+        self.path = path
+        self.max_queued = max_queued
+        self.check_interval = check_interval
+        self.max_file_bytes = max_file_bytes
+        self._subscriptions = {}  # user_id (None for all orders) -> set of Subscription
+        self._lock = threading.Lock()
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+        self.published = 0
+        self.overflows = 0
+
+    def _reset(self):
+        # The tail thread doesn't survive fork; a child starts its own on first subscribe
+        self._tail_thread = None
+        self._inode = None
+        self._offset = 0
+
+    def subscribe(self, user_id=None, notify=None):
+        """A new Subscription; ``notify()`` is called from the publishing thread after each push."""
+        sub = Subscription(user_id, self.max_queued, notify)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(sub)
+            if self.path and self._tail_thread is None:
+                self._start_tail()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscriptions.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscriptions[sub.user_id]
+        if sub.overflowed:
+            self.overflows += 1
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscriptions.values())
+
+    def publish(self, event):
+        """Deliver ``event`` (a dict with at least ``user_id``) here and, via the file, to other workers."""
+        self.published += 1
+        self._deliver(event)
+        if self.path:
+            try:
+                self._append(dict(event, pid=os.getpid()))
+            except OSError as e:
+                log.warning("Could not share order event", extra={"fields": {"error": str(e)}})
+
+    def _deliver(self, event):
+        with self._lock:
+            targets = list(self._subscriptions.get(event.get('user_id'), ())) + \
+                list(self._subscriptions.get(None, ()))
+        for sub in targets:
+            sub.push(event)
+
+    def _append(self, event):
+        line = (json.dumps(event, default=str, separators=(',', ':')) + '\n').encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line)
+            stat = os.fstat(fd)
+        finally:
+            os.close(fd)
+        if stat.st_size > self.max_file_bytes:
+            try:
+                if os.stat(self.path).st_ino == stat.st_ino:  # not already rotated by another writer
+                    os.replace(self.path, self.path + '.1')
+            except OSError:
+                pass
+
+    # --- tailing other workers' events ---
+
+    def _start_tail(self):
+        try:
+            stat = os.stat(self.path)
+            self._inode, self._offset = stat.st_ino, stat.st_size  # only events from now on
+        except OSError:
+            self._inode, self._offset = None, 0
+        self._tail_thread = threading.Thread(target=self._tail, name='order-events', daemon=True)
+        self._tail_thread.start()
+
+    def _tail(self):
+        while True:
+            time.sleep(self.check_interval)
+            try:
+                self._sync()
+            except Exception:
+                log.exception("Order event relay error")
+
+    def _read(self, path):
+        """New whole lines of ``path`` if it is still the file we were reading."""
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_ino != self._inode:
+                    return b''
+                f.seek(self._offset)
+                chunk = f.read()
+        except OSError:
+            return b''
+        end = chunk.rfind(b'\n') + 1
+        self._offset += end
+        return chunk[:end]
+
+    def _sync(self):
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            inode = None
+        if self._inode is None:
+            if inode is None:
+                return
+            self._inode, self._offset = inode, 0
+        lines = self._read(self.path)
+        if inode != self._inode:
+            # Rotated: finish the old file, now at <path>.1, then follow the new one from the start
+            lines += self._read(self.path + '.1')
+            self._inode, self._offset = inode, 0
+            if inode is not None:
+                lines += self._read(self.path)
+        pid = os.getpid()
+        for line in lines.decode(errors='replace').splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.pop('pid', None) != pid:
+                self._deliver(event)
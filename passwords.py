@@ -0,0 +1,139 @@
+"""Password hashing with scrypt, verified on a bounded worker pool.
+
+Hashes are stored as ``scrypt$<log2 n>$<r>$<p>$<salt>$<hash>`` (base64
+salt/hash). hashlib.scrypt releases the GIL, so a thread pool runs one
+KDF per core in parallel without blocking the other request threads; the
+pool and its queue are bounded, so a login spike gets fast "busy" errors
+instead of an unbounded CPU backlog.
+
+Rows still holding a plaintext password (from before hashing) verify by
+constant-time comparison and report ``needs_rehash``, as do hashes made
+with other parameters than the current ones, so callers can migrate
+them on the next successful login.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PREFIX = 'scrypt'
+
+
+class HasherBusy(Exception):
+    """Too many hash/verify operations already queued."""
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii')
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(PREFIX + '$')
+
+
+class VerifyCache:
+    """Remembers recent successful verifications, keyed by an HMAC of (stored hash, password).
+
+    The key is derived with a per-process random secret, so the cache holds
+    nothing that helps recover a password, and changing the password (a
+    new stored hash) misses it naturally.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, password, stored):
+        return hmac.new(self._secret, stored.encode() + b'\0' + password.encode(), hashlib.sha256).digest()
+
+    def check(self, password, stored):
+        key = self._key(password, stored)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None and expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self._entries.pop(key, None)
+            self.misses += 1
+            return False
+
+    def remember(self, password, stored):
+        key = self._key(password, stored)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class PasswordHasher:
+    def __init__(self, log2_n=14, r=8, p=1, workers=None, max_pending=None, wait_timeout=5.0,
+                 cache=None):
+        self.log2_n = log2_n
+        self.r = r
+        self.p = p
+        self.workers = workers or os.cpu_count() or 1
+        self.wait_timeout = wait_timeout
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='kdf')
+        self._slots = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        self._dummy = None
+
+    def _kdf(self, password, salt, log2_n, r, p):
+        n = 1 << log2_n
+        # OpenSSL needs maxmem above 128 * n * r bytes
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=129 * n * r * p + (1 << 20))
+
+    def _hash(self, password):
+        salt = os.urandom(16)
+        digest = self._kdf(password, salt, self.log2_n, self.r, self.p)
+        return f"{PREFIX}${self.log2_n}${self.r}${self.p}${_b64(salt)}${_b64(digest)}"
+
+    def _verify(self, password, stored):
+        try:
+            _, log2_n, r, p, salt, digest = stored.split('$')
+            log2_n, r, p = int(log2_n), int(r), int(p)
+            salt, digest = base64.b64decode(salt), base64.b64decode(digest)
+        except ValueError:
+            return False, False
+        ok = hmac.compare_digest(self._kdf(password, salt, log2_n, r, p), digest)
+        return ok, ok and (log2_n, r, p) != (self.log2_n, self.r, self.p)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise HasherBusy("password hashing queue is full")
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    def verify(self, password, stored):
+        """Return ``(ok, needs_rehash)`` for ``password`` against a stored value."""
+        if not stored:
+            # Unknown account: burn a KDF anyway so timing doesn't reveal which emails exist
+            if self._dummy is None:
+                self._dummy = self._run(self._hash, os.urandom(16).hex())
+            self._run(self._verify, password, self._dummy)
+            return False, False
+        if not is_hashed(stored):
+            ok = hmac.compare_digest(password.encode(), stored.encode())
+            return ok, ok
+        if self.cache is not None and self.cache.check(password, stored):
+            return True, False
+        ok, needs_rehash = self._run(self._verify, password, stored)
+        if ok and self.cache is not None:
+            self.cache.remember(password, stored)
+        return ok, needs_rehash
@@ -0,0 +1,94 @@
+"""Driver-agnostic read queries shared by the WSGI app and the ASGI routes.
+
+A plan is a generator that yields ``(sql, params)`` and is sent back the
+fetched rows (as dicts); its return value is the result. ``run_plan``
+drives one with a blocking DB-API cursor, ``asgi.run_plan_async`` with
+an aiomysql one, so the SQL and the Python-side assembly live in one place.
+"""
+from datetime import datetime
+
+
+def run_plan(plan, cursor):
+    try:
+        query = next(plan)
+        while True:
+            cursor.execute(*query)
+            query = plan.send(cursor.fetchall())
+    except StopIteration as done:
+        return done.value
+
+
+def cart_items_plan(user_id):
+    return (yield ("""
+        SELECT c.cart_id, c.item_id, m.item_name as name, m.description, m.category, m.price, c.quantity,
+               (m.price * c.quantity) as subtotal
+        FROM cart c
+        JOIN menu m ON c.item_id = m.item_id
+        WHERE c.user_id = %s
+    """, (user_id,)))
+
+
+def encode_order_cursor(order):
+    return f"{order['order_date'].isoformat()}|{order['order_id']}"
+
+
+def decode_order_cursor(value):
+    order_date, order_id = value.rsplit('|', 1)
+    return datetime.fromisoformat(order_date), int(order_id)
+
+
+def order_history_plan(user_id, limit, before=None):
+    """One page of a user's orders with items and payment; returns (orders, next_cursor)."""
+    # Newest first; keyset pagination on (order_date, order_id)
+    if before:
+        orders = yield ("""
+            SELECT order_id, order_date, total_price, payment_mode, status
+            FROM orders
+            WHERE user_id = %s
+              AND (order_date < %s OR (order_date = %s AND order_id < %s))
+            ORDER BY order_date DESC, order_id DESC
+            LIMIT %s
+        """, (user_id, before[0], before[0], before[1], limit + 1))
+    else:
+        orders = yield ("""
+            SELECT order_id, order_date, total_price, payment_mode, status
+            FROM orders
+            WHERE user_id = %s
+            ORDER BY order_date DESC, order_id DESC
+            LIMIT %s
+        """, (user_id, limit + 1))
+
+    orders = list(orders)
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_order_cursor(orders[-1])
+
+    by_id = {}
+    for order in orders:
+        order['items'] = []
+        by_id[order['order_id']] = order
+
+    # Items and payments for the whole page in one query each
+    if by_id:
+        placeholders = ', '.join(['%s'] * len(by_id))
+        order_ids = tuple(by_id)
+
+        items = yield (f"""
+            SELECT oi.order_id, oi.item_id, m.item_name, oi.quantity, oi.subtotal
+            FROM order_items oi
+            JOIN menu m ON oi.item_id = m.item_id
+            WHERE oi.order_id IN ({placeholders})
+        """, order_ids)
+        for item in items:
+            by_id[item.pop('order_id')]['items'].append(item)
+
+        payments = yield (f"""
+            SELECT order_id, payment_method, transaction_status
+            FROM payments
+            WHERE order_id IN ({placeholders})
+        """, order_ids)
+        for payment in payments:
+            by_id[payment.pop('order_id')].setdefault('payment', payment)
+
+    return orders, next_cursor
@@ -0,0 +1,120 @@
+"""Token-bucket rate limits per route and client.
+
+A bucket holds up to ``burst`` tokens and refills at ``rate`` tokens per
+second; each request takes one. A request that finds the bucket empty is
+refused with the seconds until a token is available, for Retry-After.
+
+LocalBuckets keeps buckets in this process, LRU-bounded, so with several
+worker processes each enforces the limit separately (the effective limit
+is workers x rate). RedisBuckets shares them between processes and
+hosts: a Lua script refills and takes atomically in one round trip,
+using the Redis server's clock.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+log = logging.getLogger(__name__)
+
+Limit = namedtuple('Limit', 'rate burst')
+
+
+def parse_limit(spec):
+    """``"<count>/<seconds>[:<burst>]"`` (e.g. ``"10/60"``) -> Limit; None for ``""``, ``"0"`` or ``"off"``."""
+    spec = (spec or '').strip().lower()
+    if spec in ('', '0', 'off'):
+        return None
+    try:
+        window, _, burst = spec.partition(':')
+        count, _, seconds = window.partition('/')
+        count, seconds = float(count), float(seconds or 1)
+        burst = float(burst) if burst else count
+    except ValueError:
+        raise ValueError(f"bad rate limit {spec!r}; expected <count>/<seconds>[:<burst>]")
+    if count <= 0 or seconds <= 0 or burst < 1:
+        raise ValueError(f"bad rate limit {spec!r}")
+    return Limit(count / seconds, burst)
+
+
+class LocalBuckets:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic time of last update)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """Take ``cost`` tokens; returns 0 if allowed, else seconds until it would be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Least recently seen first: those have mostly refilled, and a dropped bucket comes back full
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisBuckets:
+    """Buckets shared by all workers, on a redis-py client."""
+
+    SCRIPT = """
+    local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+    local wait = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        wait = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return tostring(wait)
+    """
+
+    def __init__(self, client, prefix='ratelimit'):
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst, cost=1):
+        return float(self._script(keys=[f"{self.prefix}:{key}"], args=[rate, burst, cost]))
+
+
+class RateLimiter:
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else LocalBuckets()
+        self.limits = {}
+        self.limited = {}
+        self.errors = 0
+
+    def configure(self, name, spec):
+        self.limits[name] = parse_limit(spec)
+        self.limited.setdefault(name, 0)
+
+    def check(self, name, client):
+        """Seconds ``client`` must wait before using ``name`` again; 0 means go ahead."""
+        limit = self.limits.get(name)
+        if limit is None:
+            return 0.0
+        try:
+            wait = self.backend.take(f"{name}:{client}", limit.rate, limit.burst)
+        except Exception as e:
+            # A broken shared store shouldn't take the routes down with it; fail open
+            self.errors += 1
+            log.warning("Rate limit backend error; allowing request", extra={"fields": {"error": str(e)}})
+            return 0.0
+        if wait:
+            self.limited[name] += 1
+        return wait
@@ -0,0 +1,22 @@
+"""Production server without gunicorn (e.g. on Windows): waitress, one process.
+
+    python serve.py
+
+Uses PORT, WEB_THREADS (default 8) and DB_POOL_SIZE (default WEB_THREADS).
+For several processes on Linux, use gunicorn.conf.py instead.
+"""
+import os
+
+threads = int(os.getenv('WEB_THREADS', '8'))
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+
+import waitress  # noqa: E402
+
+import app  # noqa: E402
+
+
+if __name__ == '__main__':
+    application = app.create_app(warm=False)
+    app.warm_up(pool_connections=app.db_pool.size)
+    waitress.serve(application, host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', '5000')),
+                   threads=threads, connection_limit=int(os.getenv('WEB_CONNECTION_LIMIT', '1000')))
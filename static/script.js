@@ -3,12 +3,14 @@ const API_URL = 'http://13.234.202.97:5000';
 let cart = [];
 let currentUser = null;
 let currentPage = 'home';
+let pendingOrderKey = null;
 
 // Sanitize localStorage user
 const storedUser = localStorage.getItem('currentUser');
 try {
     const parsedUser = JSON.parse(storedUser);
-    if (parsedUser && parsedUser.user_id) {
+    // Sessions saved before tokens were issued have no token; make those log in again
+    if (parsedUser && parsedUser.user_id && parsedUser.token) {
         currentUser = parsedUser;
     } else {
         localStorage.removeItem('currentUser');
@@ -17,6 +19,22 @@ try {
     localStorage.removeItem('currentUser');
 }
 
+// fetch() for routes that need the session token; a rejected token logs the user out
+async function authFetch(url, options = {}) {
+    const headers = { ...(options.headers || {}) };
+    if (currentUser && currentUser.token) {
+        headers['Authorization'] = `Bearer ${currentUser.token}`;
+    }
+    const response = await fetch(url, { ...options, headers });
+    if (response.status === 401 && currentUser) {
+        localStorage.removeItem('currentUser');
+        currentUser = null;
+        updateAuthUI();
+        loadPage('login');
+    }
+    return response;
+}
+
 // DOM Elements
 const menuGrid = document.getElementById('menu-grid');
 const filterButtons = document.querySelectorAll('.filter-btn');
@@ -142,6 +160,8 @@ function loadPage(page) {
         page = 'home';
     }
     
+    stopWatchingOrderStatus();
+    
     // Hide all pages
     document.querySelectorAll('section').forEach(section => {
         section.classList.add('hidden');
@@ -169,7 +189,7 @@ function loadPage(page) {
             break;
         case 'profile':
             fetchUserProfile();
-            fetchUserOrders();
+            fetchUserOrders();  // also starts the live status stream if an order is in progress
             break;
     }
     
@@ -205,9 +225,9 @@ async function handleLogin(e) {
         const data = await response.json();
         
         if (data.status === 'success') {
-            // Save user data to localStorage
-            localStorage.setItem('currentUser', JSON.stringify(data.user));
-            currentUser = data.user;
+            // Save user data and session token to localStorage
+            currentUser = { ...data.user, token: data.token };
+            localStorage.setItem('currentUser', JSON.stringify(currentUser));
             
             // Update UI
             updateAuthUI();
@@ -235,7 +255,6 @@ async function handleSignup(e) {
     const phone = document.getElementById('signup-phone').value;
     const password = document.getElementById('signup-password').value;
     const address = document.getElementById('signup-address').value;
-    const userType = document.getElementById('signup-user-type').value;
     
     try {
         const response = await fetch(`${API_URL}/api/signup`, {
@@ -243,7 +262,7 @@ async function handleSignup(e) {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ name, email, phone, password, address, userType })
+            body: JSON.stringify({ name, email, phone, password, address })
         });
         
         const data = await response.json();
@@ -262,6 +281,10 @@ async function handleSignup(e) {
 
 // Handle logout
 function handleLogout() {
+    if (currentUser && currentUser.token) {
+        // Revoke the token server-side; the UI logs out either way
+        authFetch(`${API_URL}/api/logout`, { method: 'POST' }).catch(() => {});
+    }
     // Clear user data from localStorage
     localStorage.removeItem('currentUser');
     currentUser = null;
@@ -301,7 +324,7 @@ async function fetchMenuItems(category = 'all') {
                 const menuItem = document.createElement('div');
                 menuItem.className = 'food-card bg-white rounded-lg shadow-md overflow-hidden transition duration-300';
                 menuItem.innerHTML = `
-                    <img src="/static/images/menu/${item.image}" alt="${item.item_name}" class="w-full menu-item-image">
+                    ${menuImageHtml(item)}
 
                     <div class="p-4">
                         <h3 class="font-bold text-lg mb-1">${item.item_name}</h3>
@@ -325,6 +348,21 @@ async function fetchMenuItems(category = 'all') {
     }
 }
 
+// Menu grid image: responsive <picture> when the server has built variants, else the original
+function menuImageHtml(item) {
+    const original = `/static/images/menu/${item.image}`;
+    if (!item.images) {
+        return `<img src="${original}" alt="${item.item_name}" class="w-full menu-item-image" loading="lazy">`;
+    }
+    // Matches the grid: 1 column on phones, 2 on sm, 3 on md, 4 on lg
+    const sizes = '(min-width: 1024px) 25vw, (min-width: 768px) 33vw, (min-width: 640px) 50vw, 100vw';
+    const sources = ['avif', 'webp', 'jpeg']
+        .filter(format => item.images.srcset[format])
+        .map(format => `<source type="image/${format}" srcset="${item.images.srcset[format]}" sizes="${sizes}">`)
+        .join('');
+    return `<picture>${sources}<img src="${item.images.src || original}" alt="${item.item_name}" width="${item.images.width}" height="${item.images.height}" class="w-full menu-item-image" loading="lazy" decoding="async"></picture>`;
+}
+
 // Filter menu by category
 function filterMenu(category) {
     // Update active button
@@ -339,6 +377,7 @@ function filterMenu(category) {
 
 // Add item to cart
 async function addToCart(itemId) {
+    pendingOrderKey = null; // cart changed, so the next checkout is a new order
     if (!currentUser) {
         alert('Please login to add items to cart');
         loadPage('login');
@@ -346,7 +385,7 @@ async function addToCart(itemId) {
     }
     
     try {
-        const response = await fetch(`${API_URL}/api/cart`, {
+        const response = await authFetch(`${API_URL}/api/cart`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -386,7 +425,7 @@ async function fetchCartItems() {
     if (!cartItemsContainer) return;
     
     try {
-        const response = await fetch(`${API_URL}/api/cart/${currentUser.user_id}`);
+        const response = await authFetch(`${API_URL}/api/cart/${currentUser.user_id}`);
         const data = await response.json();
         
         if (data.status === 'success') {
@@ -453,10 +492,11 @@ async function fetchCartItems() {
 
 // Update cart item quantity
 async function updateCartItem(itemId, quantity) {
+    pendingOrderKey = null; // cart changed, so the next checkout is a new order
     if (!currentUser) return;
     
     try {
-        const response = await fetch(`${API_URL}/api/cart/${currentUser.user_id}/update`, {
+        const response = await authFetch(`${API_URL}/api/cart/${currentUser.user_id}/update`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -559,6 +599,9 @@ async function placeOrder() {
     // Get delivery address
     const deliveryAddress = currentUser.address;
     
+    // Reused if this checkout is retried, so the server returns the same order
+    pendingOrderKey = pendingOrderKey || crypto.randomUUID();
+    
     try {
         console.log("Placing order... 🚀");
         console.log("Request payload:", JSON.stringify({
@@ -568,10 +611,11 @@ async function placeOrder() {
         }));
 
         
-        const response = await fetch(`${API_URL}/api/orders`, {
+        const response = await authFetch(`${API_URL}/api/orders`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Idempotency-Key': pendingOrderKey
             },
             body: JSON.stringify({
                 user_id: currentUser.user_id,
@@ -616,6 +660,7 @@ async function placeOrder() {
             
             // Clear cart
             cart = [];
+            pendingOrderKey = null;
             
             // Update cart badge
             updateCartBadge();
@@ -636,7 +681,7 @@ async function fetchUserProfile() {
     if (!currentUser) return;
     
     try {
-        const response = await fetch(`${API_URL}/api/user/${currentUser.user_id}`);
+        const response = await authFetch(`${API_URL}/api/user/${currentUser.user_id}`);
         const data = await response.json();
         
         if (data.status === 'success') {
@@ -654,8 +699,8 @@ async function fetchUserProfile() {
     }
 }
 
-// Fetch user orders
-async function fetchUserOrders() {
+// Fetch user orders (pass the previous page's next_cursor to append the next page)
+async function fetchUserOrders(cursor = null) {
     if (!currentUser) return;
     
     const orderHistoryContainer = document.getElementById('order-history-container');
@@ -664,15 +709,31 @@ async function fetchUserOrders() {
     
     try {
         // Show loading state
-        orderHistoryContainer.innerHTML = '<div class="text-center py-8">Loading order history...</div>';
+        if (!cursor) {
+            orderHistoryContainer.innerHTML = '<div class="text-center py-8">Loading order history...</div>';
+        }
         
-        const response = await fetch(`${API_URL}/api/orders/${currentUser.user_id}`);
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const response = await authFetch(`${API_URL}/api/orders/${currentUser.user_id}${query}`);
         const data = await response.json();
         
         if (data.status === 'success') {
-            orderHistoryContainer.innerHTML = '';
+            if (cursor) {
+                document.getElementById('load-more-orders')?.remove();
+            } else {
+                orderHistoryContainer.innerHTML = '';
+            }
             
-            if (data.orders.length === 0) {
+            if (!cursor && currentPage === 'profile') {
+                // A stream holds a server thread, so only keep one open while there's something to watch
+                if (data.orders.some(order => isActiveOrderStatus(order.status))) {
+                    watchOrderStatus();
+                } else {
+                    stopWatchingOrderStatus();
+                }
+            }
+            
+            if (!cursor && data.orders.length === 0) {
                 orderHistoryContainer.innerHTML = '<div class="text-center py-8">No orders found.</div>';
                 return;
             }
@@ -700,9 +761,6 @@ async function fetchUserOrders() {
                 }
                 
                 const paymentMethod = order.payment ? order.payment.payment_method : order.payment_mode;
-                const statusClass = 
-                    order.status === 'delivered' ? 'status-delivered' : 
-                    order.status === 'cancelled' ? 'status-cancelled' : 'status-pending';
                 
                 orderElement.innerHTML = `
                     <div class="flex justify-between items-center mb-3">
@@ -715,13 +773,22 @@ async function fetchUserOrders() {
                         <span>${paymentMethod}</span>
                     </div>
                     <div class="flex justify-between items-center">
-                        <span class="order-status ${statusClass}">${order.status.charAt(0).toUpperCase() + order.status.slice(1)}</span>
+                        <span class="order-status ${orderStatusClass(order.status)}" data-order-id="${order.order_id}">${orderStatusLabel(order.status)}</span>
                         <span class="font-bold">₹${order.total_price}</span>
                     </div>
                 `;
                 
                 orderHistoryContainer.appendChild(orderElement);
             });
+            
+            if (data.next_cursor) {
+                const loadMoreButton = document.createElement('button');
+                loadMoreButton.id = 'load-more-orders';
+                loadMoreButton.className = 'w-full py-2 text-center text-gray-600 hover:text-gray-900';
+                loadMoreButton.textContent = 'Load more orders';
+                loadMoreButton.addEventListener('click', () => fetchUserOrders(data.next_cursor));
+                orderHistoryContainer.appendChild(loadMoreButton);
+            }
         } else {
             orderHistoryContainer.innerHTML = '<div class="text-center py-8">Failed to load order history. Please try again.</div>';
         }
@@ -731,6 +798,75 @@ async function fetchUserOrders() {
     }
 }
 
+function orderStatusClass(status) {
+    return status === 'delivered' ? 'status-delivered' :
+        status === 'cancelled' ? 'status-cancelled' : 'status-pending';
+}
+
+function orderStatusLabel(status) {
+    return status.charAt(0).toUpperCase() + status.slice(1);
+}
+
+function isActiveOrderStatus(status) {
+    return status !== 'delivered' && status !== 'cancelled';
+}
+
+// Live order status while the profile page shows an order in progress, pushed by the server instead of re-fetching
+let orderEvents = null;
+let orderEventsRetry = null;
+let orderEventsRetryDelay = 5000;
+
+function watchOrderStatus() {
+    if (!currentUser || orderEvents || orderEventsRetry) return;
+    // EventSource can't send an Authorization header, so the token goes in the query string
+    const source = new EventSource(`${API_URL}/api/orders/${currentUser.user_id}/events?access_token=${encodeURIComponent(currentUser.token)}`);
+    orderEvents = source;
+    source.addEventListener('open', () => {
+        orderEventsRetryDelay = 5000;
+    });
+    // EventSource reconnects by itself after a dropped stream, but gives up for good on a
+    // non-200 answer (e.g. 503 when the server's stream slots are full): refresh the list
+    // instead, and try the stream again later, backing off up to a minute
+    source.addEventListener('error', () => {
+        if (source.readyState !== EventSource.CLOSED || orderEvents !== source) return;
+        stopWatchingOrderStatus();
+        const delay = orderEventsRetryDelay * (0.5 + Math.random() / 2);
+        orderEventsRetryDelay = Math.min(orderEventsRetryDelay * 2, 60000);
+        orderEventsRetry = setTimeout(() => {
+            orderEventsRetry = null;
+            if (currentPage === 'profile') fetchUserOrders();
+        }, delay);
+    });
+    source.addEventListener('order_status', event => {
+        const update = JSON.parse(event.data);
+        const badge = document.querySelector(`.order-status[data-order-id="${update.order_id}"]`);
+        if (badge) {
+            badge.className = `order-status ${orderStatusClass(update.status)}`;
+            badge.textContent = orderStatusLabel(update.status);
+            // Last order in progress is done: give the server its stream slot back
+            if (!document.querySelector('.order-status.status-pending')) stopWatchingOrderStatus();
+        } else {
+            fetchUserOrders();  // an order this page hasn't shown yet
+        }
+    });
+    // The server dropped updates for this connection; start over from a fresh list
+    source.addEventListener('reset', () => {
+        stopWatchingOrderStatus();
+        fetchUserOrders();  // reopens the stream if an order is still in progress
+    });
+}
+
+function stopWatchingOrderStatus() {
+    if (orderEvents) {
+        orderEvents.close();
+        orderEvents = null;
+    }
+    if (orderEventsRetry) {
+        clearTimeout(orderEventsRetry);
+        orderEventsRetry = null;
+    }
+}
+
 // Switch profile tab
 function switchProfileTab(tab) {
     const ordersTab = document.getElementById('orders-tab');
@@ -830,7 +966,7 @@ async function handleAddMenuItem(e) {
     }
     
     try {
-        const response = await fetch(`${API_URL}/api/admin/menu`, {
+        const response = await authFetch(`${API_URL}/api/admin/menu`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -879,7 +1015,7 @@ async function deleteMenuItem(itemId) {
     }
     
     try {
-        const response = await fetch(`${API_URL}/api/admin/menu/${itemId}`, {
+        const response = await authFetch(`${API_URL}/api/admin/menu/${itemId}`, {
             method: 'DELETE'
         });
         
@@ -901,7 +1037,7 @@ async function deleteMenuItem(itemId) {
 
 async function showEditModal(itemId) {
     try {
-        const response = await fetch(`${API_URL}/api/admin/menu/${itemId}`);
+        const response = await authFetch(`${API_URL}/api/admin/menu/${itemId}`);
         const data = await response.json();
 
         if (data.status === 'success') {
@@ -940,7 +1076,7 @@ async function handleUpdateMenuItem(e) {
     };
 
     try {
-        const response = await fetch(`${API_URL}/api/admin/menu/${itemId}`, {
+        const response = await authFetch(`${API_URL}/api/admin/menu/${itemId}`, {
             method: 'PUT',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(itemData)
@@ -0,0 +1,132 @@
+"""Static file serving with fingerprinted URLs and precompressed siblings.
+
+    python static_assets.py compress   # write .gz/.br next to css/js/svg/json files
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional; .gz siblings still work
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.html', '.txt')
+ONE_YEAR = 365 * 24 * 3600
+
+
+class StaticAssets:
+    """Serves files under ``root`` only.
+
+    URLs built through ``url_for('static', ...)`` carry ``?v=<content hash>``;
+    requests whose ``v`` matches the file's current hash (and anything under
+    ``immutable_prefixes``, whose names already embed a hash) are sent with
+    ``Cache-Control: immutable``, everything else must revalidate via ETag.
+    If ``accel_redirect_prefix`` is set, the byte pushing is handed to the
+    front proxy with ``X-Accel-Redirect`` instead of read through Python.
+    """
+
+    def __init__(self, root, immutable_prefixes=(), accel_redirect_prefix=None):
+        self.root = os.path.abspath(root)
+        self.immutable_prefixes = tuple(immutable_prefixes)
+        self.accel_redirect_prefix = accel_redirect_prefix
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, filename):
+        path = safe_join(self.root, filename)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._hashes.get(filename)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self._lock:
+            self._hashes[filename] = (signature, digest)
+        return digest
+
+    def _negotiate(self, path):
+        # Prefer a precompressed sibling the client accepts
+        accepted = request.accept_encodings
+        mtime = os.path.getmtime(path)
+        for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+            if not accepted[encoding]:
+                continue
+            try:
+                # A sibling older than the source is stale; skip it
+                if os.path.getmtime(path + ext) >= mtime:
+                    return path + ext, encoding
+            except OSError:
+                pass
+        return path, None
+
+    def serve(self, filename):
+        path = safe_join(self.root, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        send_path, encoding = self._negotiate(path)
+
+        if self.accel_redirect_prefix:
+            response = Response(mimetype=mimetype)
+            rel = os.path.relpath(send_path, self.root).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = self.accel_redirect_prefix.rstrip('/') + '/' + rel
+        else:
+            # send_file handles ETag/If-None-Match and Range requests (and X-Sendfile when enabled)
+            response = send_file(send_path, mimetype=mimetype, conditional=True, etag=True, max_age=None)
+
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if os.path.isfile(path + '.gz') or os.path.isfile(path + '.br'):
+            response.vary.add('Accept-Encoding')
+
+        version = request.args.get('v')
+        if (version and version == self.fingerprint(filename)) or filename.startswith(self.immutable_prefixes):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = ONE_YEAR
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+
+def compress_tree(root):
+    """Write .gz (and .br when brotli is installed) siblings for text assets."""
+    written = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            outputs = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli:
+                outputs['.br'] = brotli.compress(data, quality=11)
+            for ext, body in outputs.items():
+                if len(body) < len(data):
+                    with open(path + ext, 'wb') as f:
+                        f.write(body)
+                    written += 1
+    return written
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['compress']:
+        sys.exit(__doc__)
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    print(f"Wrote {compress_tree(root)} precompressed files under {root}")
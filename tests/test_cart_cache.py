@@ -0,0 +1,64 @@
+"""Cart cache patches against loads that overlap a cart write.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cart_cache import CartCache  # noqa: E402
+
+USER_ID = 1
+ITEM = {"item_id": 7, "item_name": "Dosa", "price": 50}
+
+
+def make_cache(rows):
+    def loader(user_id):
+        return [dict(row) for row in rows]
+    return CartCache(loader, menu_version=lambda: 1)
+
+
+def row(quantity):
+    return {"cart_id": 1, "item_id": 7, "name": "Dosa", "price": 50, "quantity": quantity, "subtotal": 50 * quantity}
+
+
+def test_load_reading_the_committed_add_is_not_patched_again():
+    rows = [row(1)]
+    cache = make_cache(rows)
+    with cache.write(USER_ID) as cart_write:
+        # A miss starts mid-write and reads the row after the add committed
+        cart, version, token = cache.lookup(USER_ID)
+        rows[0] = row(3)
+        cache.fill(USER_ID, version, token, [dict(r) for r in rows])
+        cart_write.add(ITEM, 2, 1)
+
+    cart = cache.get(USER_ID)
+    assert cart['items'][0]['quantity'] == 3
+    assert cart['total'] == 150
+
+
+def test_cached_cart_is_patched_after_the_write():
+    rows = [row(1)]
+    cache = make_cache(rows)
+    cache.get(USER_ID)
+    misses = cache.misses
+    with cache.write(USER_ID) as cart_write:
+        rows[0] = row(3)
+        cart_write.add(ITEM, 2, 1)
+
+    cart = cache.get(USER_ID)
+    assert cache.misses == misses
+    assert (cart['items'][0]['quantity'], cart['total']) == (3, 150)
+
+
+def test_failed_write_drops_the_cached_cart():
+    cache = make_cache([row(1)])
+    cache.get(USER_ID)
+    try:
+        with cache.write(USER_ID) as cart_write:
+            cart_write.add(ITEM, 2, 1)
+            raise RuntimeError("commit failed")
+    except RuntimeError:
+        pass
+    assert cache.backend.get(USER_ID) is None
@@ -0,0 +1,99 @@
+"""Simultaneous checkouts for one user, against the SQLite stand-in for MySQL.
+
+    python -m pytest tests
+"""
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_ID = 1
+CLIENTS = 20
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('orders')
+    os.environ.update({
+        "LOG_LEVEL": "ERROR",
+        "SESSION_SECRETS": "test-secret",
+        "MENU_CACHE_VERSION_FILE": str(workdir / 'menu.version'),
+        "IMAGE_CACHE_DIR": str(workdir / 'image_cache'),
+        "JOB_JOURNAL": str(workdir / 'jobs.db'),
+        "ORDER_EVENTS_FILE": str(workdir / 'order_events'),
+        "RATE_LIMIT_ORDERS": "off",
+    })
+    sys.path.insert(0, ROOT)
+    from benchmarks import seed, sqlite_shim
+    import app
+
+    db_path = str(workdir / 'orders.db')
+    seed.seed(db_path, users=3, menu_items=20, orders_per_user=1)
+    app.db_pool._factory = lambda: app.db_metrics.instrument(sqlite_shim.connect(db_path))
+    app.job_queue.workers = 0  # follow-up jobs stay in the journal; only the order rows are checked here
+    app.db_path = db_path
+    return app
+
+
+def checkout_all_at_once(app, idempotency_key=None):
+    token, _ = app.session_tokens.issue(USER_ID, 'customer')
+    headers = {"Authorization": f"Bearer {token}"}
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    body = {"user_id": USER_ID, "deliveryAddress": "1 Test Street", "paymentMethod": "cod"}
+    start = threading.Barrier(CLIENTS)
+    responses = [None] * CLIENTS
+
+    def place(n):
+        client = app.app.test_client()
+        start.wait()
+        response = client.post('/api/orders', json=body, headers=headers)
+        responses[n] = (response.status_code, response.get_json())
+
+    threads = [threading.Thread(target=place, args=(n,)) for n in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def order_rows(app):
+    with sqlite3.connect(app.db_path) as conn:
+        orders = conn.execute("SELECT COUNT(*) FROM orders WHERE user_id = ?", (USER_ID,)).fetchone()[0]
+        cart = conn.execute("SELECT COUNT(*) FROM cart WHERE user_id = ?", (USER_ID,)).fetchone()[0]
+        undelivered = conn.execute("""
+            SELECT COUNT(*) FROM orders o LEFT JOIN delivery_info d ON d.order_id = o.order_id
+            WHERE o.user_id = ? AND d.delivery_id IS NULL
+        """, (USER_ID,)).fetchone()[0]
+    return orders, cart, undelivered
+
+
+def test_simultaneous_checkouts_place_one_order(app_module):
+    from benchmarks import seed
+    seed.refill_carts(app_module.db_path, [USER_ID])
+    orders_before, _, _ = order_rows(app_module)
+
+    responses = checkout_all_at_once(app_module)
+
+    placed = [body for status, body in responses if status == 200]
+    assert len(placed) == 1
+    assert all(status == 400 and body['message'] == 'Cart is empty'
+               for status, body in responses if status != 200)
+    assert order_rows(app_module) == (orders_before + 1, 0, 0)
+
+
+def test_simultaneous_retries_with_one_key_replay_the_order(app_module):
+    from benchmarks import seed
+    seed.refill_carts(app_module.db_path, [USER_ID])
+    orders_before, _, _ = order_rows(app_module)
+
+    responses = checkout_all_at_once(app_module, idempotency_key='checkout-1')
+
+    assert all(status == 200 for status, _ in responses)
+    assert len({body['order_id'] for _, body in responses}) == 1
+    assert sum(1 for _, body in responses if not body.get('replayed')) == 1
+    assert order_rows(app_module) == (orders_before + 1, 0, 0)
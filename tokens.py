@@ -0,0 +1,203 @@
+"""Stateless signed session tokens.
+
+A token is ``<payload>.<signature>``: the payload is base64url JSON with
+the user id (``sub``), user type, expiry and a random token id (``jti``),
+and the signature is HMAC-SHA256 over it. Verifying is one HMAC and a
+JSON parse in-process, with no DB round trip.
+
+Several secrets may be configured: the first signs, all verify, so a
+secret can be rotated without logging everyone out.
+
+Revocation (logout) keeps token ids in memory until the token would
+have expired anyway; none is dropped earlier. With a ``path``, revocations
+are also appended to a shared file that other worker processes pick up on
+their next check (at most every ``check_interval`` seconds), the same way
+the menu cache shares its version. Past ``max_file_bytes`` the file is
+rotated to ``<path>.1``, but only once every revocation already in
+``<path>.1`` has expired; a process starting up reads both, so the pair
+holds every revocation that still matters.
+"""
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class TokenError(Exception):
+    pass
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class RevocationList:
+    def __init__(self, path=None, check_interval=1.0, max_file_bytes=1 << 20):
+        self.path = path
+        self.check_interval = check_interval
+        self.max_file_bytes = max_file_bytes
+        self._revoked = {}    # jti -> exp
+        self._expiry = []     # heap of (exp, jti), to drop entries once expired
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._inode = None
+        self._offset = 0
+        self._checked_at = 0.0
+        self._rotate_after = 0  # wall time before which <path>.1 still holds live revocations
+
+    def _add(self, jti, exp):
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            exp_old, old = heapq.heappop(self._expiry)
+            if self._revoked.get(old) == exp_old:
+                del self._revoked[old]
+        if self._revoked.get(jti) != exp:
+            self._revoked[jti] = exp
+            heapq.heappush(self._expiry, (exp, jti))
+
+    def revoke(self, jti, exp):
+        """Revoke in this process and, with a ``path``, in the others; False if the file couldn't be written."""
+        with self._lock:
+            self._add(jti, exp)
+        if not self.path:
+            return True
+        try:
+            # One short O_APPEND write per revocation, so concurrent writers don't interleave
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, f"{jti} {int(exp)}\n".encode())
+                stat = os.fstat(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            log.error("Could not record token revocation", extra={"fields": {"path": self.path, "error": str(e)}})
+            return False
+        if stat.st_size > self.max_file_bytes and time.time() >= self._rotate_after:
+            self._rotate(stat.st_ino)
+        return True
+
+    def _rotate(self, inode):
+        # Replacing <path>.1 would forget its revocations, so wait until the last of them has expired
+        last = 0
+        try:
+            with open(self.path + '.1', 'rb') as f:
+                for line in f:
+                    exp = line.partition(b' ')[2].strip()
+                    if exp.isdigit():
+                        last = max(last, int(exp))
+        except OSError:
+            pass
+        if last > time.time():
+            self._rotate_after = last
+            return
+        try:
+            if os.stat(self.path).st_ino == inode:  # not already rotated by another writer
+                os.replace(self.path, self.path + '.1')
+        except OSError:
+            pass
+
+    def _read(self, path):
+        """New whole lines of ``path`` if it is still the file we were reading."""
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_ino != self._inode:
+                    return b''
+                f.seek(self._offset)
+                chunk = f.read()
+        except OSError:
+            return b''
+        # Only consume whole lines; a partial last line is read next time
+        end = chunk.rfind(b'\n') + 1
+        self._offset += end
+        return chunk[:end]
+
+    def _sync(self):
+        now = time.monotonic()
+        if not self.path or now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            lines = b''
+            if not self._loaded:
+                # First look in this process: revocations from before the last rotation too
+                self._loaded = True
+                try:
+                    with open(self.path + '.1', 'rb') as f:
+                        lines = f.read()
+                except OSError:
+                    pass
+            try:
+                inode = os.stat(self.path).st_ino
+            except OSError:
+                inode = None
+            if inode != self._inode:
+                if self._inode is not None:
+                    # Rotated: finish the old file, now at <path>.1, then read the new one from the start
+                    lines += self._read(self.path + '.1')
+                self._inode, self._offset = inode, 0
+            if inode is not None:
+                lines += self._read(self.path)
+            wall = time.time()
+            for line in lines.decode(errors='replace').splitlines():
+                jti, _, exp = line.partition(' ')
+                if exp.isdigit() and int(exp) > wall:
+                    self._add(jti, int(exp))
+
+    def is_revoked(self, jti):
+        self._sync()
+        exp = self._revoked.get(jti)
+        return exp is not None and exp > time.time()
+
+
+class TokenSigner:
+    def __init__(self, secrets, ttl=86400, revocations=None):
+        if not secrets:
+            raise ValueError("at least one signing secret is required")
+        self._keys = [s.encode() if isinstance(s, str) else s for s in secrets]
+        self.ttl = ttl
+        self.revocations = revocations if revocations is not None else RevocationList()
+
+    def _sign(self, payload, key):
+        return _b64encode(hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def issue(self, user_id, user_type='customer'):
+        now = int(time.time())
+        claims = {"sub": user_id, "typ": user_type, "iat": now, "exp": now + self.ttl,
+                  "jti": _b64encode(os.urandom(12))}
+        payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+        return f"{payload}.{self._sign(payload, self._keys[0])}", claims
+
+    def verify(self, token):
+        """Return the claims of a valid token, else raise TokenError."""
+        token = token or ''
+        if not token.isascii():
+            raise TokenError("malformed token")
+        payload, _, signature = token.partition('.')
+        if not payload or not signature:
+            raise TokenError("malformed token")
+        if not any(hmac.compare_digest(signature, self._sign(payload, key)) for key in self._keys):
+            raise TokenError("bad signature")
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            raise TokenError("malformed token")
+        if claims.get("exp", 0) <= time.time():
+            raise TokenError("token expired")
+        if self.revocations.is_revoked(claims.get("jti")):
+            raise TokenError("token revoked")
+        return claims
+
+    def revoke(self, claims):
+        """False if the revocation only reached this process (see RevocationList.revoke)."""
+        return self.revocations.revoke(claims["jti"], claims["exp"])